@@ -0,0 +1,2 @@
+from .corpus import ( make_corpus, load_corpus )
+from .runner import ( run_benchmarks, compare )
@@ -0,0 +1,133 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A synthetic corpus is a folder of valid SIF images, written with a
+# SIFWriter from a seeded random generator, so the same corpus (and the same
+# bytes) can be made again to compare versions. Each profile is a kind of
+# image: the size of the partition, the number of (labels) descriptors,
+# if it is signed, and the size of the definition file. A few files that
+# aren't SIF are added too, as a scan of a real folder would find.
+
+from sif.logger import bot
+from sif.main.writer import SIFWriter
+from sif.utils import ( mkdir_p, read_json, write_json )
+import hashlib
+import json
+import os
+import random
+
+# The (partition, deffile) sizes are multiplied by the scale of the corpus
+PROFILES = [
+    {'name': 'small', 'partition': 64 * 1024, 'descriptors': 0,
+     'signed': False, 'deffile': 256},
+    {'name': 'signed', 'partition': 4 * 1024 * 1024, 'descriptors': 0,
+     'signed': True, 'deffile': 256},
+    {'name': 'descriptors', 'partition': 1024 * 1024, 'descriptors': 40,
+     'signed': True, 'deffile': 256},
+    {'name': 'deffile', 'partition': 1024 * 1024, 'descriptors': 0,
+     'signed': False, 'deffile': 1024 * 1024},
+    {'name': 'large', 'partition': 16 * 1024 * 1024, 'descriptors': 2,
+     'signed': True, 'deffile': 1024},
+]
+
+# Images of each profile, and files that aren't SIF, in a corpus
+COUNT = 8
+OTHERS = 8
+
+
+def make_corpus(folder, count=COUNT, scale=1.0, seed=0, profiles=None):
+    '''write a synthetic corpus of images to a folder: count images of each
+       profile (see PROFILES), and a few files that aren't SIF. The corpus
+       (with the same seed and scale) is the same every time. Returns a
+       dictionary with the names of the images and other files, and the
+       settings, which is also written to corpus.json in the folder.
+
+       Parameters
+       ==========
+       folder: the folder to write the corpus to
+       count: the number of images of each profile
+       scale: a factor for the size of the partitions and deffiles
+       seed: the seed of the random generator
+       profiles: a list of profiles, defaults to PROFILES
+    '''
+    mkdir_p(folder)
+    profiles = profiles or PROFILES
+    generator = random.Random(seed)
+    corpus = {'seed': seed, 'scale': scale, 'count': count,
+              'profiles': profiles, 'images': [], 'others': []}
+
+    for profile in profiles:
+        for index in range(count):
+            image = os.path.join(folder, '%s-%s.sif' % (profile['name'], index))
+            make_image(image, profile, generator, scale)
+            corpus['images'].append(os.path.basename(image))
+
+    for index in range(OTHERS):
+        other = os.path.join(folder, 'other-%s.img' % index)
+        with open(other, 'wb') as filey:
+            filey.write(_get_bytes(generator, 4096 * (index + 1)))
+        corpus['others'].append(os.path.basename(other))
+
+    write_json(corpus, os.path.join(folder, 'corpus.json'))
+    bot.debug('Wrote a corpus of %s images to %s', len(corpus['images']),
+              folder)
+    return corpus
+
+
+def make_image(image, profile, generator=None, scale=1.0):
+    '''write a synthetic image for a profile (see PROFILES). The partition
+       is random bytes, so it has the raw data fstype (and isn't read as a
+       squashfs, e.g., by diff or manifest), and a signature block has
+       the real SHA384 SIFHASH of the partition, with a placeholder for
+       the OpenPGP signature, so the hash (but not the signer) verifies.
+
+       Parameters
+       ==========
+       image: the path of the image to write
+       profile: the profile, a dictionary like those of PROFILES
+       generator: a random.Random, defaults to one with seed 0
+       scale: a factor for the size of the partition and deffile
+    '''
+    generator = generator or random.Random(0)
+    writer = SIFWriter(image, arch='02')
+
+    deffile = b'Bootstrap: docker\nFrom: busybox\n\n%post\n'
+    size = int(profile['deffile'] * scale)
+    while len(deffile) < size:
+        deffile += b'    echo %s\n' % _get_bytes(generator, 24).hex().encode()
+    writer.add_deffile(deffile[:max(size, 1)])
+
+    partition = _get_bytes(generator, int(profile['partition'] * scale))
+    partition_id = writer.add_partition(partition, fstype=4, name='raw.img')
+
+    for index in range(profile['descriptors']):
+        labels = {'org.label-schema.index': str(index),
+                  'org.label-schema.value': _get_bytes(generator, 16).hex()}
+        writer.add(0x4003, json.dumps(labels).encode('utf-8'),
+                   name='labels-%s' % index)
+
+    if profile['signed'] is True:
+        sifhash = hashlib.sha384(partition).hexdigest()
+        signature = ('-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA256\n\n'
+                     'SIFHASH:\n%s\n-----BEGIN PGP SIGNATURE-----\n\n%s\n'
+                     '-----END PGP SIGNATURE-----\n' % (sifhash, 'A' * 64))
+        writer.add_signature(signature.encode('utf-8'), partition_id)
+
+    return writer.write()
+
+
+def _get_bytes(generator, size):
+    return generator.getrandbits(size * 8).to_bytes(size, 'little') \
+           if size > 0 else b''
+
+
+def load_corpus(folder):
+    '''load the description of a corpus (see make_corpus) from a folder, or
+       return None if the folder doesn't have one.
+    '''
+    path = os.path.join(folder, 'corpus.json')
+    if os.path.exists(path):
+        return read_json(path)
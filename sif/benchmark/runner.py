@@ -0,0 +1,270 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Each benchmark runs one operation over a corpus (see sif.benchmark.corpus),
+# and is timed a few times, keeping the fastest (the page cache is warm
+# after the first). One more run counts the read and write system calls
+# (from /proc/self/io, on Linux) and the peak memory (with tracemalloc),
+# which slows it down, so it isn't timed. The system calls of threads (and
+# of child processes, once they are reaped) are in /proc/self/io, but the
+# peak memory is of this process only, so the workers of a scan are
+# threads. The results are JSON, so the results of two versions can be
+# compared (see compare).
+
+from sif.logger import bot
+from sif.version import __version__
+from sif.benchmark.corpus import ( COUNT, load_corpus, make_corpus )
+from collections import OrderedDict
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The modules to time the import of, each in a new interpreter
+IMPORTS = ['sif.main', 'sif.client']
+
+
+def bench_is_sif(folder, corpus, tmpdir):
+    '''check the magic of every file, SIF or not
+    '''
+    from sif.main import SIFHeader
+    files = corpus['images'] + corpus['others']
+    for name in files:
+        SIFHeader(os.path.join(folder, name), lazy=True, cache=False).is_sif()
+    return len(files), 0
+
+
+def bench_load_header(folder, corpus, tmpdir):
+    '''parse the global header and descriptors of every image, uncached
+    '''
+    from sif.main import SIFHeader
+    for name in corpus['images']:
+        SIFHeader(os.path.join(folder, name), cache=False).descriptors
+    return len(corpus['images']), 0
+
+
+def bench_get_image_hash(folder, corpus, tmpdir):
+    '''compute the (md5) hash of every image
+    '''
+    from sif.utils.names import get_image_hash
+    size = 0
+    for name in corpus['images']:
+        get_image_hash(os.path.join(folder, name))
+        size += os.path.getsize(os.path.join(folder, name))
+    return len(corpus['images']), size
+
+
+def bench_extract(folder, corpus, tmpdir):
+    '''extract the partition of every image to a file
+    '''
+    from sif.main import SIFHeader
+    output = os.path.join(tmpdir, 'partition')
+    size = 0
+    for name in corpus['images']:
+        header = SIFHeader(os.path.join(folder, name), cache=False)
+        size += header.extract('partition', output)
+        os.remove(output)
+    return len(corpus['images']), size
+
+
+def bench_verify(folder, corpus, tmpdir):
+    '''check the SIFHASH of every signed image (without a keyring)
+    '''
+    from sif.main import SIFHeader
+    count = size = 0
+    for name in corpus['images']:
+        header = SIFHeader(os.path.join(folder, name), cache=False)
+        if header.get_signatures():
+            header.verify(cache=False)
+            count += 1
+            size += header.get_partition()['Filelen']
+    return count, size
+
+
+def bench_scan(folder, corpus, tmpdir):
+    '''scan the corpus folder, with the default (thread) workers, uncached
+    '''
+    from sif.main.scan import scan
+    return len(list(scan(folder, processes=False, cache=False))), 0
+
+
+BENCHMARKS = OrderedDict([
+    ('is_sif', bench_is_sif),
+    ('load_header', bench_load_header),
+    ('get_image_hash', bench_get_image_hash),
+    ('extract', bench_extract),
+    ('verify', bench_verify),
+    ('scan', bench_scan),
+])
+
+
+def read_io():
+    '''read the counts of read and write system calls, and the bytes read
+       and written, of this process (from /proc/self/io), or None.
+    '''
+    try:
+        with open('/proc/self/io') as filey:
+            lines = [line.split(':') for line in filey]
+    except OSError:
+        return None
+    return dict((key.strip(), int(value)) for key, value in lines)
+
+
+def measure(function, folder, corpus, tmpdir, repeat=5):
+    '''run a benchmark function repeat times, and then once more to count
+       system calls and the peak memory. Returns a dictionary with the
+       fastest and mean time, the items (e.g., images) and bytes handled,
+       the rates, and the counts.
+
+       Parameters
+       ==========
+       function: the benchmark, called with (folder, corpus, tmpdir)
+       folder: the folder of the corpus
+       corpus: the corpus, from make_corpus or load_corpus
+       tmpdir: a folder for any output
+       repeat: the number of timed runs
+    '''
+    times = []
+    for run in range(max(repeat, 1)):
+        start = time.perf_counter()
+        items, size = function(folder, corpus, tmpdir)
+        times.append(time.perf_counter() - start)
+
+    before = read_io()
+    tracemalloc.start()
+    try:
+        function(folder, corpus, tmpdir)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    after = read_io()
+
+    seconds = min(times)
+    result = {'seconds': seconds, 'mean': sum(times) / len(times),
+              'items': items, 'bytes': size,
+              'items_per_second': items / seconds if seconds else None,
+              'bytes_per_second': size / seconds if seconds else None,
+              'syscalls': None, 'peak_memory': peak}
+
+    if before is not None and after is not None:
+        result['syscalls'] = {'read': after['syscr'] - before['syscr'],
+                              'write': after['syscw'] - before['syscw'],
+                              'read_bytes': after['rchar'] - before['rchar'],
+                              'write_bytes': after['wchar'] - before['wchar']}
+    return result
+
+
+def get_import_time(module, repeat=5):
+    '''time the import of a module in a new interpreter (the fastest of
+       repeat), in seconds.
+    '''
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = [os.path.dirname(package)]
+    env = dict(os.environ)
+    if env.get('PYTHONPATH'):
+        paths.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    code = ('import time; start = time.perf_counter(); import %s; '
+            'print(time.perf_counter() - start)' % module)
+
+    times = []
+    for run in range(max(repeat, 1)):
+        output = subprocess.check_output([sys.executable, '-c', code], env=env,
+                                         stderr=subprocess.DEVNULL)
+        times.append(float(output.decode('utf-8').strip()))
+    return min(times)
+
+
+def run_benchmarks(folder=None, names=None, repeat=5, count=None, scale=1.0,
+                   seed=0):
+    '''run the benchmarks over a corpus, and return the results: the
+       version, the python and platform, the corpus, the import times, and
+       a result (see measure) for each benchmark.
+
+       Parameters
+       ==========
+       folder: the folder of a corpus (see make_corpus), which is made if
+               it doesn't have one. Defaults to a temporary corpus.
+       names: the benchmarks to run (see BENCHMARKS), defaults to all
+       repeat: the number of timed runs of each benchmark
+       count: the number of images of each profile, for a new corpus
+       scale: a factor for the size of the images, for a new corpus
+       seed: the seed of a new corpus
+    '''
+    names = names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            bot.exit('%s is not a benchmark, choices are %s' %
+                     (name, ', '.join(BENCHMARKS)))
+
+    tmpdir = tempfile.mkdtemp(prefix='sif-benchmark-')
+    try:
+        if folder is None:
+            folder = os.path.join(tmpdir, 'corpus')
+        corpus = load_corpus(folder)
+        if corpus is None:
+            bot.info('Writing a corpus to %s' % folder)
+            corpus = make_corpus(folder, count or COUNT, scale, seed)
+
+        size = sum(os.path.getsize(os.path.join(folder, name))
+                   for name in corpus['images'])
+        results = {'version': __version__,
+                   'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'cpus': os.cpu_count(),
+                   'created': time.time(),
+                   'repeat': repeat,
+                   'syscalls': 'this process, its threads and reaped children '
+                               '(/proc/self/io)',
+                   'corpus': {'images': len(corpus['images']),
+                              'others': len(corpus['others']),
+                              'bytes': size, 'seed': corpus['seed'],
+                              'scale': corpus['scale'],
+                              'count': corpus['count']},
+                   'imports': dict((module, get_import_time(module, repeat))
+                                   for module in IMPORTS),
+                   'benchmarks': OrderedDict()}
+
+        for name in names:
+            bot.debug('Running benchmark %s', name)
+            results['benchmarks'][name] = measure(BENCHMARKS[name], folder,
+                                                  corpus, tmpdir, repeat)
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def compare(old, new, threshold=0.1):
+    '''compare the results of two runs (e.g., two versions), and return a
+       list with the old and new time of each benchmark (and import) in
+       both, the change (new / old - 1), and if it is a regression (slower
+       by more than threshold).
+
+       Parameters
+       ==========
+       old: the results of the first run (e.g., the last release)
+       new: the results of the second run
+       threshold: the change (e.g., 0.1 for 10%) that is a regression
+    '''
+    pairs = []
+    for name, result in new['benchmarks'].items():
+        if name in old['benchmarks']:
+            pairs.append((name, old['benchmarks'][name]['seconds'],
+                          result['seconds']))
+    for module, seconds in new['imports'].items():
+        if module in old['imports']:
+            pairs.append(('import %s' % module, old['imports'][module], seconds))
+
+    changes = []
+    for name, before, after in pairs:
+        change = after / before - 1 if before else 0
+        changes.append({'name': name, 'old': before, 'new': after,
+                        'change': change, 'regression': change > threshold})
+    return changes
@@ -8,6 +8,7 @@
 
 import sif
 import argparse
+import atexit
 import sys
 import os
 
@@ -28,6 +29,10 @@ def get_parser():
                         help="suppress additional output.", 
                         default=False, action='store_true')
 
+    parser.add_argument('--stats', dest="stats", 
+                        help="count the opens, seeks and reads of images, and print them at exit.", 
+                        default=False, action='store_true')
+
     description = 'actions for SIF Python'
     subparsers = parser.add_subparsers(help='sif python actions',
                                        title='actions',
@@ -43,6 +48,218 @@ def get_parser():
                        help="the image to load into the client", 
                        type=str, default=None)
 
+    # Extract a data object from an image
+    extract = subparsers.add_parser("extract",
+                                    help="extract a data object from an image.")
+
+    extract.add_argument("image", nargs=1,
+                         help="the image to extract from", 
+                         type=str, default=None)
+
+    extract.add_argument('--descriptor', dest="descriptor", 
+                         help="descriptor ID, or deffile, partition (default) or signature", 
+                         type=str, default="partition")
+
+    extract.add_argument('--output', '-o', dest="output", 
+                         help="file to write to (defaults to stdout)", 
+                         type=str, default=None)
+
+    extract.add_argument('--rootfs', dest="rootfs", 
+                         help="extract the files of the squashfs partition to this directory", 
+                         type=str, default=None)
+
+    extract.add_argument('--workers', dest="workers", 
+                         help="number of processes for --rootfs (defaults to number of cpus)", 
+                         type=int, default=None)
+
+    # Scan directories for SIF images
+    scan = subparsers.add_parser("scan",
+                                 help="scan paths for SIF images, write JSON lines.")
+
+    scan.add_argument("paths", nargs="+",
+                      help="files or directories to scan", 
+                      type=str)
+
+    scan.add_argument('--workers', dest="workers", 
+                      help="number of workers (defaults to number of cpus)", 
+                      type=int, default=None)
+
+    scan.add_argument('--processes', dest="processes", 
+                      help="use a pool of processes instead of threads", 
+                      default=False, action='store_true')
+
+    scan.add_argument('--follow-symlinks', dest="follow_symlinks", 
+                      help="follow symbolic links to files and directories", 
+                      default=False, action='store_true')
+
+    scan.add_argument('--output', '-o', dest="output", 
+                      help="write JSON lines to this file instead of stdout", 
+                      type=str, default=None)
+
+    # Create an image from a partition and definition file
+    create = subparsers.add_parser("create",
+                                   help="create an image from a squashfs partition.")
+
+    create.add_argument("image", nargs=1,
+                        help="the image to create", 
+                        type=str, default=None)
+
+    create.add_argument('--partition', dest="partition", 
+                        help="the partition (e.g., a squashfs rootfs) to add", 
+                        type=str, required=True)
+
+    create.add_argument('--deffile', dest="deffile", 
+                        help="a definition file to add", 
+                        type=str, default=None)
+
+    create.add_argument('--signature', dest="signature", 
+                        help="a clear signed SIFHASH of the partition to add", 
+                        type=str, default=None)
+
+    create.add_argument('--arch', dest="arch", 
+                        help="the architecture code (defaults to this machine)", 
+                        type=str, default=None)
+
+    # Verify the signatures of an image
+    verify = subparsers.add_parser("verify",
+                                   help="verify the signatures of an image.")
+
+    verify.add_argument("image", nargs=1,
+                        help="the image to verify", 
+                        type=str, default=None)
+
+    verify.add_argument('--keyring', dest="keyring", 
+                        help="keyring file (gpg --export) to check signatures", 
+                        type=str, default=None)
+
+    # List the files in a squashfs partition
+    ls = subparsers.add_parser("ls",
+                               help="list files in the squashfs partition of an image.")
+
+    ls.add_argument("image", nargs=1,
+                    help="the image to list", 
+                    type=str, default=None)
+
+    ls.add_argument("path", nargs="?",
+                    help="the path in the partition (defaults to /)", 
+                    type=str, default="/")
+
+    ls.add_argument('--long', '-l', dest="long", 
+                    help="show the mode, owner, size and time of each file", 
+                    default=False, action='store_true')
+
+    ls.add_argument('--recursive', '-R', dest="recursive", 
+                    help="list all files under the path", 
+                    default=False, action='store_true')
+
+    ls.add_argument('--descriptor', dest="descriptor", 
+                    help="descriptor ID of the partition (defaults to the primary)", 
+                    type=str, default="partition")
+
+    # Find the images with a file, from (cached) manifests
+    query = subparsers.add_parser("query",
+                                  help="find images with files that match a path or digest.")
+
+    query.add_argument("paths", nargs="+",
+                       help="images, or directories with images", 
+                       type=str)
+
+    query.add_argument('--path', dest="path", 
+                       help="a glob of the files to find (e.g., libssl.so*)", 
+                       type=str, default=None)
+
+    query.add_argument('--digest', dest="digest", 
+                       help="the sha256 digest of the files to find", 
+                       type=str, default=None)
+
+    query.add_argument('--digests', dest="digests", action='append',
+                       help="a glob of the files to compute digests of (defaults to all with --digest)", 
+                       type=str, default=None)
+
+    query.add_argument('--workers', dest="workers", 
+                       help="number of workers (defaults to number of cpus)", 
+                       type=int, default=None)
+
+    query.add_argument('--processes', dest="processes", 
+                       help="use a pool of processes instead of threads", 
+                       default=False, action='store_true')
+
+    query.add_argument('--output', '-o', dest="output", 
+                       help="write JSON lines to this file instead of stdout", 
+                       type=str, default=None)
+
+    # Compare two images
+    diff = subparsers.add_parser("diff",
+                                 help="compare the headers and files of two images.")
+
+    diff.add_argument("images", nargs=2,
+                      help="the two images to compare", 
+                      type=str)
+
+    diff.add_argument('--no-files', dest="files", 
+                      help="only compare the headers and descriptors", 
+                      default=True, action='store_false')
+
+    diff.add_argument('--content', dest="content", 
+                      help="compare the content of files with the same blocks", 
+                      default=False, action='store_true')
+
+    diff.add_argument('--json', dest="json", 
+                      help="write the differences as JSON", 
+                      default=False, action='store_true')
+
+    # Store images as deduplicated chunks
+    store = subparsers.add_parser("store",
+                                  help="add, list, restore or remove images in the chunk store.")
+
+    store.add_argument("action", 
+                       choices=["add", "list", "restore", "remove", "gc"],
+                       help="add images, list the store, restore an image, remove an image, or remove unused chunks")
+
+    store.add_argument("names", nargs="*",
+                       help="images to add, or the image (sha256 or name) to restore (and the output) or remove", 
+                       type=str)
+
+    store.add_argument('--name', dest="name", 
+                       help="the name to add an image with (defaults to the file name)", 
+                       type=str, default=None)
+
+    # Benchmark this version over a synthetic corpus
+    benchmark = subparsers.add_parser("benchmark",
+                                      help="time operations over a synthetic corpus of images.")
+
+    benchmark.add_argument("names", nargs="*",
+                           help="the benchmarks to run (defaults to all)", 
+                           type=str)
+
+    benchmark.add_argument('--corpus', dest="corpus", 
+                           help="a folder for the corpus, made if it doesn't have one (defaults to a temporary folder)", 
+                           type=str, default=None)
+
+    benchmark.add_argument('--count', dest="count", 
+                           help="the number of images of each profile, for a new corpus", 
+                           type=int, default=None)
+
+    benchmark.add_argument('--scale', dest="scale", 
+                           help="a factor for the size of images, for a new corpus", 
+                           type=float, default=1.0)
+
+    benchmark.add_argument('--repeat', dest="repeat", 
+                           help="the number of timed runs of each benchmark", 
+                           type=int, default=5)
+
+    benchmark.add_argument('--output', '-o', dest="output", 
+                           help="write the results (JSON) to a file", 
+                           type=str, default=None)
+
+    benchmark.add_argument('--compare', dest="compare", 
+                           help="compare to the results of another run, and exit with 1 on a regression", 
+                           type=str, default=None)
+
+    benchmark.add_argument('--threshold', dest="threshold", 
+                           help="the slowdown that is a regression (default 0.1, 10%%)", 
+                           type=float, default=0.1)
+
     return parser
 
 
@@ -108,8 +325,23 @@ def main():
 
     from sif.logger import bot
 
+    # Count the reads of images, and print the counts (by phase) at exit
+    if args.stats is True:
+        from sif.main.stats import enable
+        enable()
+        atexit.register(print_stats)
+
     # Does the user want a shell?
     if args.command == "shell": from .shell import main
+    elif args.command == "extract": from .extract import main
+    elif args.command == "scan": from .scan import main
+    elif args.command == "create": from .create import main
+    elif args.command == "verify": from .verify import main
+    elif args.command == "ls": from .ls import main
+    elif args.command == "query": from .query import main
+    elif args.command == "diff": from .diff import main
+    elif args.command == "store": from .store import main
+    elif args.command == "benchmark": from .benchmark import main
 
     # Pass on to the correct parser
     return_code = 0
@@ -121,5 +353,12 @@ def main():
 
     help(return_code)
 
+def print_stats():
+    '''print the aggregate I/O counts of the command to stderr
+    '''
+    from sif.main.stats import get_stats
+    sys.stderr.write('%s\n' % get_stats().format())
+
+
 if __name__ == '__main__':
     main()
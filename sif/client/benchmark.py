@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+from sif.utils import ( read_json, write_json )
+import sys
+import os
+
+def main(args):
+
+    from sif.benchmark import ( compare, run_benchmarks )
+
+    # Read the results to compare first, in case they don't exist
+    old = None
+    if args.compare is not None:
+        if not os.path.exists(args.compare):
+            bot.exit('Cannot find %s' % args.compare)
+        old = read_json(args.compare)
+
+    results = run_benchmarks(args.corpus, names=args.names,
+                             repeat=args.repeat, count=args.count,
+                             scale=args.scale)
+    print_results(results)
+
+    if args.output is not None:
+        write_json(results, args.output)
+        bot.info('Wrote results to %s' % args.output)
+
+    if old is not None:
+        changes = compare(old, results, args.threshold)
+        print_changes(changes, old['version'], results['version'])
+        if any(change['regression'] for change in changes):
+            sys.exit(1)
+
+
+def print_results(results):
+    '''print a line for each benchmark: the (fastest) time, the rates, the
+       read system calls and the peak memory.
+    '''
+    print('%-16s %10s %10s %10s %10s %10s' % ('benchmark', 'seconds',
+          'items/s', 'MB/s', 'reads', 'peak MB'))
+    for name, result in results['benchmarks'].items():
+        syscalls = result['syscalls'] or {}
+        print('%-16s %10.4f %10s %10s %10s %10.2f' % (name, result['seconds'],
+              _format_rate(result['items_per_second']),
+              _format_rate(result['bytes_per_second'], 1024 * 1024),
+              syscalls.get('read', '-'), result['peak_memory'] / 1024 / 1024))
+    for module, seconds in results['imports'].items():
+        print('%-16s %10.4f' % ('import %s' % module, seconds))
+
+
+def _format_rate(rate, unit=1):
+    if not rate:
+        return '-'
+    return '%.1f' % (rate / unit)
+
+
+def print_changes(changes, old, new):
+    '''print the change of each time from another run, and mark regressions
+    '''
+    print('\n%-24s %10s %10s %8s' % ('%s -> %s' % (old, new), 'old', 'new',
+                                     'change'))
+    for change in changes:
+        print('%-24s %10.4f %10.4f %+7.1f%% %s' % (change['name'], change['old'],
+              change['new'], change['change'] * 100,
+              'REGRESSION' if change['regression'] else ''))
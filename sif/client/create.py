@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import os
+
+def main(args):
+
+    from sif.main import SIFWriter
+
+    image = args.image[0]
+
+    # The data objects must exist
+    for path in [args.partition, args.deffile, args.signature]:
+        if path is not None and not os.path.exists(path):
+            bot.exit('Cannot find %s' % path)
+
+    writer = SIFWriter(image, arch=args.arch)
+    if args.deffile is not None:
+        writer.add_deffile(args.deffile)
+    partition = writer.add_partition(args.partition)
+    if args.signature is not None:
+        writer.add_signature(args.signature, partition)
+    writer.write()
+    bot.info('Created %s' % image)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import json
+import sys
+import os
+
+def main(args):
+
+    from sif.main.diff import ( diff, has_changes )
+
+    # The images must exist
+    for image in args.images:
+        if not os.path.exists(image):
+            bot.exit('Cannot find %s' % image)
+
+    result = diff(args.images[0], args.images[1], files=args.files,
+                  content=args.content)
+
+    if args.json:
+        print(json.dumps(result, indent=4))
+    else:
+        print_diff(result)
+
+    # As diff, the return code is 1 if the images differ
+    if has_changes(result):
+        sys.exit(1)
+
+
+def print_diff(result):
+    '''print the differences of two images, one per line. Files are marked
+       with A (added), D (removed) or M (changed), as for git status.
+    '''
+    for key, (value1, value2) in result['meta'].items():
+        print('header %s: %s -> %s' % (key, value1, value2))
+
+    descriptors = result['descriptors']
+    for descriptor_id in descriptors['added']:
+        print('descriptor %s: added' % descriptor_id)
+    for descriptor_id in descriptors['removed']:
+        print('descriptor %s: removed' % descriptor_id)
+    for descriptor_id, values in descriptors['changed'].items():
+        for key, (value1, value2) in values.items():
+            print('descriptor %s %s: %s -> %s' % (descriptor_id, key, 
+                                                  value1, value2))
+
+    files = result['files']
+    if files is None:
+        return
+
+    for path in files['added']:
+        print('A %s' % path)
+    for path in files['removed']:
+        print('D %s' % path)
+    for changed in files['changed']:
+        values = ', '.join('%s %s -> %s' % (key, value[0], value[1])
+                           for key, value in sorted(changed.items())
+                           if key != 'path')
+        print('M %s (%s)' % (changed['path'], values))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import sys
+import os
+
+def main(args):
+
+    from sif.main import SIFHeader
+
+    image = args.image[0]
+
+    # The image must exist
+    if not os.path.exists(image):
+        bot.exit('Cannot find %s' % image)
+
+    # A descriptor can be an ID, or the name of a common descriptor
+    descriptor = args.descriptor
+    if descriptor.isdigit():
+        descriptor = int(descriptor)
+
+    header = SIFHeader(image, lazy=True)
+
+    # The files of a squashfs partition are extracted to a directory
+    if args.rootfs is not None:
+        squashfs = header.get_squashfs(descriptor)
+        try:
+            counts = squashfs.extract(args.rootfs, workers=args.workers)
+        except (OSError, ValueError) as e:
+            bot.exit('Cannot extract %s: %s' % (image, e))
+        bot.info('Extracted %s files (%s bytes) to %s' % (counts['files'],
+                                                          counts['bytes'],
+                                                          args.rootfs))
+        return
+
+    if args.output is None:
+        header.extract(descriptor, sys.stdout.buffer)
+    else:
+        header.extract(descriptor, args.output)
+        bot.info('Extracted %s to %s' % (args.descriptor, args.output))
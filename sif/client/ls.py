@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import posixpath
+import stat
+import time
+import os
+
+def main(args):
+
+    from sif.main import SIFHeader
+
+    image = args.image[0]
+
+    # The image must exist
+    if not os.path.exists(image):
+        bot.exit('Cannot find %s' % image)
+
+    # A descriptor can be an ID, or the name of a common descriptor
+    descriptor = args.descriptor
+    if descriptor.isdigit():
+        descriptor = int(descriptor)
+
+    header = SIFHeader(image, lazy=True)
+    squashfs = header.get_squashfs(descriptor)
+
+    with squashfs:
+        try:
+            inode = squashfs.lookup(args.path, follow_symlinks=False)
+
+            # A file (or link) is listed by itself
+            if not stat.S_ISDIR(inode.mode):
+                return print_entry(squashfs, args.path, inode, args.long)
+
+            if args.recursive:
+                for dirpath, dirnames, filenames in squashfs.walk(args.path):
+                    for name in sorted(dirnames + filenames):
+                        path = posixpath.join(dirpath, name)
+                        print_entry(squashfs, path, 
+                                    squashfs.lookup(path, False), args.long)
+                return
+
+            for entry in squashfs.scandir(args.path):
+                print_entry(squashfs, entry.name, entry.inode(), args.long)
+
+        except OSError as e:
+            bot.exit('%s: %s' % (image, e))
+
+
+def print_entry(squashfs, name, inode, long_format=False):
+    '''print the name of an entry, or (long format) the mode, links, owner,
+       size, modification time and name, as ls -l does.
+    '''
+    if not long_format:
+        return print(name)
+
+    if inode.target is not None:
+        name = '%s -> %s' % (name, inode.target)
+    mtime = time.strftime('%Y-%m-%d %H:%M', time.localtime(inode.mtime))
+    print('%s %3s %5s %5s %10s %s %s' % (stat.filemode(inode.mode), 
+                                         inode.nlink, inode.uid, inode.gid,
+                                         inode.size, mtime, name))
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import sys
+import os
+
+def main(args):
+
+    from sif.main.manifest import query
+    from sif.main.scan import write_jsonl
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            bot.exit('Cannot find %s' % path)
+
+    if args.path is None and args.digest is None:
+        bot.exit('Give a --path, a --digest, or both, to find.')
+
+    results = query(args.paths,
+                    path=args.path,
+                    digest=args.digest,
+                    digests=args.digests,
+                    workers=args.workers,
+                    processes=args.processes)
+
+    if args.output is None:
+        return write_jsonl(results, sys.stdout)
+
+    with open(args.output, 'w') as filey:
+        return write_jsonl(results, filey)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import sys
+import os
+
+def main(args):
+
+    from sif.main.scan import ( scan, write_jsonl )
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            bot.exit('Cannot find %s' % path)
+
+    results = scan(args.paths,
+                   workers=args.workers,
+                   processes=args.processes,
+                   follow_symlinks=args.follow_symlinks)
+
+    if args.output is None:
+        return write_jsonl(results, sys.stdout)
+
+    with open(args.output, 'w') as filey:
+        return write_jsonl(results, filey)
@@ -40,7 +40,7 @@ def ipython(image):
     '''give the user an ipython shell, optionally load image
     '''
     from sif.main import SIFHeader  
-    header = SIFHeader(image)  
+    header = SIFHeader(image, verbose=True)
     from IPython import embed
     embed()
 
@@ -48,7 +48,7 @@ def ipython(image):
 def bpython(image):
     import bpython
     from sif.main import SIFHeader  
-    header = SIFHeader(image)  
+    header = SIFHeader(image, verbose=True)
     bpython.embed(locals_={'header': header,
                            'image': image,
                            'SIFHeader': SIFHeader})
@@ -56,7 +56,7 @@ def bpython(image):
 def python(image):
     import code
     from sif.main import SIFHeader  
-    header = SIFHeader(image)  
+    header = SIFHeader(image, verbose=True)
     code.interact(local={"header": header,
                          'image': image,
                          'SIFHeader': SIFHeader})
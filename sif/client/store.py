@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import os
+
+def main(args):
+
+    from sif.main.store import ( ChunkStore, get_names )
+
+    store = ChunkStore()
+    names = args.names
+
+    if args.action == "add":
+        if not names:
+            bot.exit('Give one or more images to add.')
+        if args.name is not None and len(names) > 1:
+            bot.exit('--name can only be given with one image.')
+        for image in names:
+            if not os.path.exists(image):
+                bot.exit('Cannot find %s' % image)
+        for image in names:
+            recipe = store.add(image, name=args.name)
+            bot.info('Added %s (%s): %s of %s chunks are new, %s bytes' %
+                     (image, recipe['digest'][:12], recipe['new_chunks'],
+                      len(recipe['chunks']), recipe['new_bytes']))
+
+    elif args.action == "list":
+        for recipe in store.get_recipes():
+            print('%s %12s %s' % (recipe['digest'][:12], recipe['size'],
+                                  ' '.join(get_names(recipe))))
+        stats = store.stats()
+        bot.info('%s images (%s bytes) in %s chunks (%s bytes)' %
+                 (stats['images'], stats['size'], stats['chunks'],
+                  stats['stored']))
+
+    elif args.action == "restore":
+        if len(names) != 2:
+            bot.exit('Give the image (sha256 or name) to restore, and the output.')
+        store.restore(names[0], names[1])
+        bot.info('Restored %s' % names[1])
+
+    elif args.action == "remove":
+        if not names:
+            bot.exit('Give one or more images (sha256 or name) to remove.')
+        for name in names:
+            bot.info('Removed %s, freed %s bytes' % (name, store.remove(name)))
+
+    elif args.action == "gc":
+        bot.info('Freed %s bytes' % store.gc())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+import sys
+import os
+
+def main(args):
+
+    from sif.main import SIFHeader
+
+    image = args.image[0]
+
+    # The image and keyring must exist
+    for path in [image, args.keyring]:
+        if path is not None and not os.path.exists(path):
+            bot.exit('Cannot find %s' % path)
+
+    header = SIFHeader(image, lazy=True)
+    results = header.verify(keyring=args.keyring)
+    if not results:
+        bot.exit('%s has no signatures' % image)
+
+    passed = True
+    for result in results:
+        signed = ','.join([str(x) for x in result['signed']])
+        check = result['integrity'] if args.keyring is None else result['verified']
+        message = 'Signature %s (%s of %s)' % (result['signature'],
+                                                result['hashtype'], signed)
+        if 'fingerprint' in result and result['fingerprint']:
+            message += ' by %s' % result['fingerprint']
+        if check:
+            bot.info('%s: OK' % message)
+        else:
+            passed = False
+            bot.error('%s: FAILED (%s)' % (message, result.get('error')))
+
+    if not passed:
+        sys.exit(1)
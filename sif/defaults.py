@@ -31,5 +31,16 @@ SIF_VERSION = getenv("SIF_VERSION", "02")
 _cache = os.path.join(USERHOME, ".singularity")
 SINGULARITY_CACHE = getenv("SINGULARITY_CACHEDIR", default=_cache)
 
+# Parsed headers cache, maximum size in bytes
+SIF_HEADER_CACHE_SIZE = int(getenv("SIF_HEADER_CACHE_SIZE", 
+                                   default=64 * 1024 * 1024))
+
+# Image manifests cache, maximum size in bytes
+SIF_MANIFEST_CACHE_SIZE = int(getenv("SIF_MANIFEST_CACHE_SIZE", 
+                                     default=4 * 1024 * 1024 * 1024))
+
+# Count the reads of headers (see sif.main.stats)
+SIF_IO_STATS = convert2boolean(getenv("SIF_IO_STATS", default=False))
+
 # Temporary Storage
 SIF_TMPDIR = os.environ.get('SIF_TMPDIR', tempfile.gettempdir())
@@ -13,20 +13,34 @@ see https://github.com/sylabs/sif/blob/master/pkg/sif/sif.go
 
 from sif.logger import bot
 from sif.defaults import SIF_VERSION
+from sif.header.records import make_record
+from struct import Struct
 
 # We don't have multiple versions, but can add loading logic here, e.g.
 # We also might want (or need) to reload an image based on finding
 # a different version.
 
+# Structures are read only, so we build (and compile the formats) once
+_structures = dict()
+
 def get_structure(version=None):
     '''get_structure will return known organization based on a version.
        The versions are organized into the subdirectories here. If the user
-       doens't provide a version, we default to SIF_VERSION
+       doens't provide a version, we default to SIF_VERSION. The structure
+       is built once per version, including precompiled struct.Struct
+       objects for the global header and a full descriptor entry, and
+       must not be modified by the caller.
 
        Parameters
        ==========
        version: a version to load, should be a corresponding string (e.g., 02)
     '''
+    # If no provided version, use default
+    if version == None:
+        version = SIF_VERSION
+
+    if version in _structures:
+        return _structures[version]
 
     # Return a simple data structure with what we need
     class SIF:
@@ -34,20 +48,51 @@ def get_structure(version=None):
         arches = None
         Deffile = None
 
-    # If no provided version, use default
-    if version == None:
-        version = SIF_VERSION
-
     if version == "02":
-        from .v02 import ( HeaderBase, 
-                           arches, 
-                           Deffile, 
+        from .v02 import ( HeaderBase,
+                           arches,
+                           Descriptor,
+                           Deffile,
                            Partition,
-                           Signature )
+                           Signature,
+                           descriptors,
+                           fstypes,
+                           hashtypes,
+                           parttypes )
 
     SIF.HeaderBase = HeaderBase()
     SIF.arches = arches
     SIF.Deffile = Deffile()
     SIF.Partition = Partition()
     SIF.Signature = Signature()
+    SIF.Descriptor = Descriptor()
+    SIF.fstypes = fstypes
+    SIF.parttypes = parttypes
+    SIF.hashtypes = hashtypes
+
+    # Look up a descriptor by Datatype, with the same instances as above
+    SIF.datatypes = dict()
+    for descriptor in [SIF.Deffile, SIF.Partition, SIF.Signature]:
+        SIF.datatypes[descriptor.datatype] = descriptor
+    for DescriptorType in descriptors:
+        if DescriptorType.datatype not in SIF.datatypes:
+            SIF.datatypes[DescriptorType.datatype] = DescriptorType()
+
+    # The global header, and a descriptor with its name and extra fields
+    SIF.HeaderStruct = Struct(SIF.HeaderBase.fmt)
+    SIF.DescriptorStruct = Struct('%s%ss%ss' % (SIF.Deffile.fmt,
+                                                SIF.HeaderBase.DescrNameLen,
+                                                SIF.HeaderBase.DescrMaxPrivLen))
+    for descriptor in [SIF.Descriptor] + list(SIF.datatypes.values()):
+        descriptor.ExtraStruct = Struct(descriptor.extra_fmt)
+
+    # Parsed headers and descriptors are compact, immutable records
+    SIF.HeaderRecord = make_record('Header', [field for field in 
+                                   SIF.HeaderBase.fields 
+                                   if field not in ['launch', 'magic']])
+    for descriptor in [SIF.Descriptor] + list(SIF.datatypes.values()):
+        descriptor.Record = make_record(descriptor.name, descriptor.fields + 
+                                        ['name'] + descriptor.extra_fields)
+
+    _structures[version] = SIF
     return SIF
@@ -0,0 +1,128 @@
+'''
+
+Copyright (C) 2018-2019 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+'''
+
+from collections.abc import Mapping
+from operator import attrgetter
+
+# Record types are created once for each set of fields, and looked up
+# again by name and fields when a record is unpickled
+_records = dict()
+
+
+def make_record(name, fields):
+    '''make_record returns an immutable record type with a slot for each
+       field, e.g., from the fields of a Descriptor. A record is much smaller
+       than a dictionary (there is no per instance dictionary), but can be
+       used like one (record['ID'], dict(record)), and also has attribute
+       access (record.ID).
+
+       Parameters
+       ==========
+       name: the name of the record type
+       fields: the list of fields
+    '''
+    fields = tuple(fields)
+    key = (name, fields)
+    if key not in _records:
+        record = type(name, (Record,), {'__slots__': fields,
+                                        'fields': fields,
+                                        'keyset': frozenset(fields),
+                                        'getter': attrgetter(*fields)})
+
+        # Setting the slots directly is faster than setattr for each field
+        record.setters = tuple(record.__dict__[field].__set__ 
+                               for field in fields)
+        _records[key] = record
+    return _records[key]
+
+
+def _restore(name, fields, values):
+    '''restore a pickled record, from the name and fields of its type
+    '''
+    return make_record(name, fields)(*values)
+
+
+class Record(Mapping):
+    '''A Record is the base of the record types from make_record. Values
+       are set once, in the order of the fields, and can't be changed
+       (use _replace to get a changed copy).
+    '''
+    __slots__ = ()
+    fields = ()
+    keyset = frozenset()
+    getter = None
+    setters = ()
+
+    def __init__(self, *values):
+        if len(values) != len(self.fields):
+            raise TypeError('%s takes %s values, %s given' %
+                            (self.__class__.__name__, len(self.fields),
+                             len(values)))
+        for setter, value in zip(self.setters, values):
+            setter(self, value)
+
+    @classmethod
+    def from_dict(cls, values):
+        '''create a record from a dictionary (or other mapping) with (at
+           least) the fields of the record.
+        '''
+        return cls(*[values[field] for field in cls.fields])
+
+    def __getitem__(self, key):
+        if key in self.keyset:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, key):
+        return key in self.keyset
+
+    def __setattr__(self, key, value):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __delattr__(self, key):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self.values_tuple() == other.values_tuple()
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash(self.values_tuple())
+
+    def __reduce__(self):
+        return (_restore, (self.__class__.__name__, self.fields,
+                           self.values_tuple()))
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (field, getattr(self, field)) for field in self.fields))
+
+    def values_tuple(self):
+        '''return the values of the record, as a tuple in order of the fields
+        '''
+        if len(self.fields) == 1:
+            return (self.getter(self),)
+        return self.getter(self)
+
+    def _replace(self, **changes):
+        '''return a copy of the record with some values changed
+        '''
+        for key in changes:
+            if key not in self.keyset:
+                raise KeyError(key)
+        return self.__class__(*[changes.get(field, getattr(self, field))
+                                for field in self.fields])
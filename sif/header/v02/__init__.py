@@ -14,4 +14,11 @@ see https://github.com/sylabs/sif/blob/master/pkg/sif/sif.go
 # We will add different versions to bases
 
 from .globalHeader import ( arches, HeaderBase )
-from .descriptors import ( Deffile, Partition, Signature )
+from .descriptors import ( Descriptor,
+                           Deffile,
+                           Partition,
+                           Signature,
+                           descriptors,
+                           fstypes,
+                           hashtypes,
+                           parttypes )
@@ -11,6 +11,31 @@ see https://github.com/sylabs/sif/blob/master/pkg/sif/sif.go
 
 '''
 
+# Human friendly names for values under "extra"
+
+fstypes = {
+    1: "Squashfs",
+    2: "Ext3",
+    3: "Immutable data object archive",
+    4: "Raw data",
+    5: "Encrypted squashfs"
+}
+
+parttypes = {
+    1: "System",
+    2: "Primary System",
+    3: "Data",
+    4: "Overlay"
+}
+
+hashtypes = {
+    1: "SHA256",
+    2: "SHA384",
+    3: "SHA512",
+    4: "BLAKE2S",
+    5: "BLAKE2B"
+}
+
 class Descriptor:
     '''A SIF Descriptor is the base, from which we derive 
        a Deffile, Signature, and Partition block. We read the descriptors after 
@@ -32,13 +57,15 @@ class Descriptor:
        # UID       int64   q              
        # Gid       int64   q              
 
-       # TODO these two aren't parsed yet
        # Name  [DescrNameLen]byte    self.base.DescrNameLen
        # Extra [DescrMaxPrivLen]byte // big enough for extra data below
 
+       The start of Extra is parsed with extra_fmt into extra_fields,
+       which differ for each kind of descriptor.
     '''
 
     name = 'Descriptor'
+    datatype = None
     fields = [ "Datatype",  
                "Used",
                "ID",
@@ -55,6 +82,12 @@ class Descriptor:
     # Format string to read in above
     fmt = '<i?3I7q'
 
+    # Fields (and format string) at the start of Extra, and those that
+    # are binary (and returned as hex)
+    extra_fields = []
+    extra_fmt = '<'
+    extra_hex = []
+
     def __str__(self):
         return "SIF Descriptor version 02 %s" % self.name
 
@@ -66,35 +99,107 @@ class Deffile(Descriptor):
     '''A SIF Deffile is the first descriptor. It is essentially a Descriptor.
     '''
     name = 'Deffile'
+    datatype = 0x4001
+
+    def __init__(self):
+        Descriptor.__init__(self)
+
+
+class EnvVar(Descriptor):
+    '''A SIF EnvVar descriptor holds environment variables.
+    '''
+    name = 'EnvVar'
+    datatype = 0x4002
+
+    def __init__(self):
+        Descriptor.__init__(self)
+
+
+class Labels(Descriptor):
+    '''A SIF Labels descriptor holds a JSON object of labels.
+    '''
+    name = 'Labels'
+    datatype = 0x4003
 
     def __init__(self):
         Descriptor.__init__(self)
 
 
 class Partition(Descriptor):
-    '''A SIF Partition is the third block (id 2 at index 1). It has,
-       in addition to the same fields, a fstype, parttype, and content.
-       I'm not sure what content is, but the fstype and partype (I think)
-       are under "extra"
+    '''A SIF Partition is usually the second descriptor. It has,
+       in addition to the same fields, a fstype, parttype, and the
+       architecture under "extra". See fstypes and parttypes for
+       the values.
 
            fstype: Squashfs   int32
            parttype: System   int32
-           content: Linux     (not sure)
+           arch: 02           [HdrArchLen]byte
     '''
     name = 'Partition'
+    datatype = 0x4004
+    extra_fields = [ "fstype", "partype", "arch" ]
+    extra_fmt = '<2i3s'
 
     def __init__(self):
         Descriptor.__init__(self)
 
 
 class Signature(Descriptor):
-    '''A SIF Signature is the fourth block (third descriptor) 
-       It has the following fields under "extra"
+    '''A SIF Signature is usually the third descriptor, and links to the
+       descriptor (or group) that is signed. It has the following fields 
+       under "extra". The entity is [DescrEntityLen]byte, of which the
+       first 20 bytes are the fingerprint of the signing key.
 
-           hashtype: SHA384
-           entity: @ 
+           hashtype: SHA384   int32 (see hashtypes)
+           entity: fingerprint
     '''
     name = 'Signature'
+    datatype = 0x4005
+    extra_fields = [ "hashtype", "entity" ]
+    extra_fmt = '<i20s'
+    extra_hex = [ "entity" ]
+
+    def __init__(self):
+        Descriptor.__init__(self)
+
+
+class GenericJSON(Descriptor):
+    '''A SIF GenericJSON descriptor holds arbitrary JSON.
+    '''
+    name = 'GenericJSON'
+    datatype = 0x4006
+
+    def __init__(self):
+        Descriptor.__init__(self)
+
+
+class Generic(Descriptor):
+    '''A SIF Generic descriptor holds arbitrary data.
+    '''
+    name = 'Generic'
+    datatype = 0x4007
 
     def __init__(self):
         Descriptor.__init__(self)
+
+
+class CryptoMessage(Descriptor):
+    '''A SIF CryptoMessage descriptor holds an encrypted message, e.g.,
+       the key for an encrypted partition.
+    '''
+    name = 'CryptoMessage'
+    datatype = 0x4008
+
+    def __init__(self):
+        Descriptor.__init__(self)
+
+
+# All descriptors, to look up by Datatype
+descriptors = [ Deffile,
+                EnvVar,
+                Labels,
+                Partition,
+                Signature,
+                GenericJSON,
+                Generic,
+                CryptoMessage ]
@@ -38,6 +38,7 @@ class HeaderBase:
     HdrLaunch         = "#!/usr/bin/env run-singularity\n"
     HdrMagic          = "SIF_MAGIC"
     HdrVersion        = "02"        # SIF SPEC VERSION
+    HdrFileVersion    = "01"        # version written in images (sif.go)
     HdrArchUnknown    = "00"        # Undefined/Unsupported arch
     HdrArch386        = "01"        # 386 (i[3-6]86) arch code
     HdrArchAMD64      = "02"        # AMD64 arch code
@@ -65,6 +66,34 @@ class HeaderBase:
     DescrStartOffset  = 4096               # descriptors start after global header
     DataStartOffset   = 32768              # data object start after descriptors
 
+    # The global header is packed without padding, in this order:
+
+    # Launch    [HdrLaunchLen]byte    32s
+    # Magic     [HdrMagicLen]byte     10s
+    # Version   [HdrVersionLen]byte   3s
+    # Arch      [HdrArchLen]byte      3s
+    # ID        uuid.UUID             16s
+    # Ctime, Mtime, Dfree, Dtotal,
+    # Descroff, Descrlen, Dataoff,
+    # Datalen   int64                 8q
+
+    fields = [ "launch",
+               "magic",
+               "version",
+               "arch",
+               "uuid",
+               "ctime",
+               "mtime",
+               "dfree",
+               "dtotal",
+               "descroff",
+               "descrlen",
+               "dataoff",
+               "datalen" ]
+
+    # Format string to read in above
+    fmt = '<32s10s3s3s16s8q'
+
     def __init__(self, updates={}):
         '''a HeaderBase is a pre-set collection of locations and values
             for SIF headers. We use this to parse the header in python
@@ -8,6 +8,7 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 '''
 
+from collections import deque
 import os
 import sys
 from .spinner import Spinner
@@ -31,11 +32,16 @@ RED = "\033[91m"
 DARKRED = "\033[31m"
 CYAN = "\033[36m"
 
+# The number of messages kept in the history (see get_logs), 0 to keep none
+HISTORY = 1000
+
 class SIFMessage:
 
-    def __init__(self, MESSAGELEVEL=None):
+    def __init__(self, MESSAGELEVEL=None, history=None):
         self.level = get_logging_level()
-        self.history = []
+        if history is None:
+            history = get_history_size()
+        self.history = deque(maxlen=history)
         self.errorStream = sys.stderr
         self.outputStream = sys.stdout
         self.colorize = self.useColor()
@@ -110,16 +116,27 @@ class SIFMessage:
             return True
         return False
 
-    def emit(self, level, message, prefix=None, color=None):
+    def emit(self, level, message, prefix=None, color=None, args=None):
         '''emit is the main function to print the message
-        optionally with a prefix
+        optionally with a prefix. The message is only formatted (with args,
+        prefix and color) if the level is enabled, and is kept in the
+        history as is, to be formatted when the logs are asked for.
         :param level: the level of the message
         :param message: the message to print
         :param prefix: a prefix for the message
+        :param args: arguments to interpolate in the message (message % args)
         '''
+        # Add all log messages to history (the oldest are dropped)
+        self.history.append((level, prefix, message, args))
+
+        # If the level is quiet, or the level is not in range, we're done
+        if self.level == QUIET or not self.isEnabledFor(level):
+            return
+
         if color is None:
             color = level
 
+        message = format_message(message, args)
         if prefix is not None:
             prefix = self.addColor(color, "%s " % (prefix))
         else:
@@ -132,19 +149,11 @@ class SIFMessage:
         if not message.endswith('\n'):
             message = "%s\n" % message
 
-        # If the level is quiet, only print to error
-        if self.level == QUIET:
-            pass
-
-        # Otherwise if in range print to stdout and stderr
-        elif self.isEnabledFor(level):
-            if self.emitError(level):
-                self.write(self.errorStream, message)
-            else:
-                self.write(self.outputStream, message)
-
-        # Add all log messages to history
-        self.history.append(message)
+        # Print to stderr or stdout
+        if self.emitError(level):
+            self.write(self.errorStream, message)
+        else:
+            self.write(self.outputStream, message)
 
     def write(self, stream, message):
         '''write will write a message to a stream,
@@ -155,12 +164,20 @@ class SIFMessage:
         stream.write(message)
 
     def get_logs(self, join_newline=True):
-        ''''get_logs will return the complete history, joined by newline
-        (default) or as is.
+        ''''get_logs will return the history (the last messages, see
+        SIF_LOG_HISTORY), joined by newline (default) or as a list.
         '''
+        logs = []
+        for level, prefix, message, args in list(self.history):
+            message = format_message(message, args)
+            if prefix is not None:
+                message = "%s %s" % (prefix, message)
+            if not message.endswith('\n'):
+                message = "%s\n" % message
+            logs.append(message)
         if join_newline:
-            return '\n'.join(self.history)
-        return self.history
+            return '\n'.join(logs)
+        return logs
 
 
     def show_progress(self,
@@ -218,48 +235,48 @@ class SIFMessage:
     # Logging ------------------------------------------
 
 
-    def abort(self, message):
-        self.emit(ABORT, message, 'ABORT')
+    def abort(self, message, *args):
+        self.emit(ABORT, message, 'ABORT', args=args)
 
-    def critical(self, message):
-        self.emit(CRITICAL, message, 'CRITICAL')
+    def critical(self, message, *args):
+        self.emit(CRITICAL, message, 'CRITICAL', args=args)
 
-    def error(self, message):
-        self.emit(ERROR, message, 'ERROR')
+    def error(self, message, *args):
+        self.emit(ERROR, message, 'ERROR', args=args)
 
     def exit(self, message, return_code=1):
         self.emit(ERROR, message, 'ERROR')
         sys.exit(return_code)
 
-    def warning(self, message):
-        self.emit(WARNING, message, 'WARNING')
+    def warning(self, message, *args):
+        self.emit(WARNING, message, 'WARNING', args=args)
 
-    def log(self, message):
-        self.emit(LOG, message, 'LOG')
+    def log(self, message, *args):
+        self.emit(LOG, message, 'LOG', args=args)
 
     def custom(self, prefix, message="", color=PURPLE):
         self.emit(CUSTOM, message, prefix, color)
 
-    def info(self, message):
-        self.emit(INFO, message)
+    def info(self, message, *args):
+        self.emit(INFO, message, args=args)
 
     def newline(self):
         return self.info("")
 
-    def verbose(self, message):
-        self.emit(VERBOSE, message, "VERBOSE")
+    def verbose(self, message, *args):
+        self.emit(VERBOSE, message, "VERBOSE", args=args)
 
-    def verbose1(self, message):
-        self.emit(VERBOSE, message, "VERBOSE1")
+    def verbose1(self, message, *args):
+        self.emit(VERBOSE, message, "VERBOSE1", args=args)
 
-    def verbose2(self, message):
-        self.emit(VERBOSE2, message, 'VERBOSE2')
+    def verbose2(self, message, *args):
+        self.emit(VERBOSE2, message, 'VERBOSE2', args=args)
 
-    def verbose3(self, message):
-        self.emit(VERBOSE3, message, 'VERBOSE3')
+    def verbose3(self, message, *args):
+        self.emit(VERBOSE3, message, 'VERBOSE3', args=args)
 
-    def debug(self, message):
-        self.emit(DEBUG, message, 'DEBUG')
+    def debug(self, message, *args):
+        self.emit(DEBUG, message, 'DEBUG', args=args)
 
     def is_quiet(self):
         '''is_quiet returns true if the level is under 1
@@ -328,6 +345,27 @@ def get_logging_level():
     return level
 
 
+def get_history_size():
+    '''get the number of messages to keep in the history, from
+    SIF_LOG_HISTORY (defaults to HISTORY, 0 keeps none)
+    '''
+    size = os.environ.get("SIF_LOG_HISTORY")
+    try:
+        return max(int(size), 0)
+    except (TypeError, ValueError):
+        return HISTORY
+
+
+def format_message(message, args=None):
+    '''interpolate the (%-style) args of a message, if there are any
+    '''
+    if isinstance(message, bytes):
+        message = message.decode('utf-8')
+    if args:
+        message = message % args
+    return message
+
+
 def get_user_color_preference():
     COLORIZE = os.environ.get('SINGULARITY_COLORIZE', None)
     if COLORIZE is not None:
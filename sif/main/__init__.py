@@ -1 +1,4 @@
 from .header import SIFHeader
+from .descriptors import DescriptorTable
+from .writer import SIFWriter
+from .editor import SIFEditor
@@ -0,0 +1,141 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# An asyncio interface to load headers without blocking the event loop.
+# The (blocking) reads are done by SIFHeader in a bounded pool of threads,
+# and the number of images in flight is capped with a semaphore. Unlike
+# SIFHeader, an image that can't be loaded raises an exception instead
+# of exiting, so a service can handle it like any other error.
+
+from sif.main.header import SIFHeader
+from sif.main.readers import get_reader
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+# The default executor is shared by all loads in a process
+_executors = dict()
+
+def get_executor(workers=None):
+    '''get the default (bounded) executor to load headers in, created on
+       first use with workers threads (defaults to the number of cpus + 4,
+       at most 32).
+    '''
+    if 'default' not in _executors:
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        _executors['default'] = ThreadPoolExecutor(max_workers=workers,
+                                                   thread_name_prefix='sif')
+    return _executors['default']
+
+
+def _load(image, version, lazy, cache):
+    '''load a header (in a worker thread), raising an exception instead
+       of exiting if the image can't be loaded.
+    '''
+    reader = get_reader(image)
+    if isinstance(reader.local, str) and not os.path.exists(reader.local):
+        raise FileNotFoundError('Cannot find %s' % image)
+
+    header = SIFHeader(reader, version=version, lazy=True, cache=cache)
+    if not header.is_sif():
+        raise ValueError('%s is not a SIF file' % image)
+
+    if lazy is not True:
+        try:
+            header.load_header()
+        except SystemExit:
+            raise ValueError('%s cannot be parsed' % image)
+    return header
+
+
+async def load_sif(image, version=None, lazy=False, cache=True, executor=None):
+    '''load the header of an image, reading it in an executor so the event
+       loop isn't blocked, and return the SIFHeader. The header is fully
+       loaded by default, so using it afterwards doesn't read the image
+       (a lazy header would read in the event loop).
+
+       Parameters
+       ==========
+       image: the path (or url, see sif.main.readers) to the image
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+       lazy: return a lazy header (see SIFHeader)
+       cache: use the cache of parsed headers (default True)
+       executor: the executor to read in (defaults to get_executor())
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or get_executor(), _load,
+                                      image, version, lazy, cache)
+
+
+async def iter_sif(images, concurrency=16, version=None, cache=True,
+                   executor=None, return_exceptions=False):
+    '''load the headers of many images concurrently, and yield a tuple of
+       the image and its SIFHeader as each finishes (use with async for).
+       At most concurrency images are loaded at once, and images are taken
+       from the iterable only as needed, so it can be large (e.g., from
+       sif.main.scan.find_files). If the iteration is stopped or cancelled,
+       the loads in flight are cancelled.
+
+       Parameters
+       ==========
+       images: an iterable of paths to images
+       concurrency: the largest number of images to load at once
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+       cache: use the cache of parsed headers (default True)
+       executor: the executor to read in (defaults to get_executor())
+       return_exceptions: yield the exception for an image that can't be
+                          loaded instead of raising it
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def load(image):
+        try:
+            return await load_sif(image, version=version, cache=cache,
+                                  executor=executor)
+        finally:
+            semaphore.release()
+
+    # The image for each task in flight
+    pending = dict()
+    try:
+        for image in images:
+            await semaphore.acquire()
+            pending[asyncio.ensure_future(load(image))] = image
+
+            # Yield what finished while we waited for a slot
+            done = [task for task in pending if task.done()]
+            for result in _get_results(done, pending, return_exceptions):
+                yield result
+
+        while pending:
+            done, _ = await asyncio.wait(list(pending),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for result in _get_results(done, pending, return_exceptions):
+                yield result
+
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _get_results(tasks, pending, return_exceptions):
+    '''remove finished tasks from pending, and return an (image, header)
+       result for each, with the exception instead of the header if 
+       return_exceptions is True (otherwise it is raised)
+    '''
+    results = []
+    for task in tasks:
+        image = pending.pop(task)
+        error = task.exception()
+        if error is None:
+            results.append((image, task.result()))
+        elif return_exceptions is True:
+            results.append((image, error))
+        else:
+            raise error
+    return results
@@ -0,0 +1,223 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# The global header and descriptor table are fixed layout binary, so the
+# headers of many images can be decoded into NumPy structured arrays with
+# np.frombuffer, with a dtype derived from the same format strings that
+# we give to struct. Queries over a fleet of images (e.g., the partition
+# bytes by arch) are then vectorized, instead of loops over dictionaries.
+# NumPy is optional (pip install sif[numpy]), and only needed here.
+
+from sif.logger import bot
+from sif.header import get_structure
+from sif.main.decode import has_magic
+from sif.main.readers import get_reader
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The NumPy type for each (little endian) struct format character
+struct_types = {
+    '?': '?',
+    'b': 'i1',
+    'B': 'u1',
+    'h': '<i2',
+    'H': '<u2',
+    'i': '<i4',
+    'I': '<u4',
+    'q': '<i8',
+    'Q': '<u8'
+}
+
+
+def check_numpy():
+    '''exit if NumPy isn't installed
+    '''
+    if np is None:
+        bot.exit('NumPy is required for arrays: pip install sif[numpy]')
+
+
+def get_dtype(fmt, fields, itemsize=None):
+    '''get a NumPy (packed) dtype from a struct format string, e.g.,
+       '<i?3I7q', and the field names, in order. Byte strings (e.g., 32s)
+       are fixed length byte strings (S32).
+
+       Parameters
+       ==========
+       fmt: the struct format string (little endian, without padding)
+       fields: the names of the fields
+       itemsize: the size of each item, if larger than the fields (padding)
+    '''
+    check_numpy()
+    types = []
+    for count, code in re.findall(r'(\d*)([a-zA-Z?])', fmt.lstrip('<')):
+        count = int(count or 1)
+        if code == 's':
+            types.append('S%s' % count)
+        else:
+            types += [struct_types[code]] * count
+
+    if len(types) != len(fields):
+        raise ValueError('%s has %s fields, not %s' % (fmt, len(types),
+                                                       len(fields)))
+
+    dtype = np.dtype(list(zip(fields, types)))
+    if itemsize is not None:
+        dtype = np.dtype({'names': dtype.names,
+                          'formats': [dtype.fields[name][0] for name in dtype.names],
+                          'offsets': [dtype.fields[name][1] for name in dtype.names],
+                          'itemsize': itemsize})
+    return dtype
+
+
+def get_header_dtype(SIF):
+    '''get the dtype of the global header (HeaderBase.fmt and fields)
+    '''
+    return get_dtype(SIF.HeaderBase.fmt, SIF.HeaderBase.fields)
+
+
+def get_descriptor_dtype(SIF):
+    '''get the dtype of a descriptor entry (Descriptor.fmt and fields), with
+       the name, and extra as raw bytes (see get_extra_dtype)
+    '''
+    base = SIF.HeaderBase
+    fmt = '%s%ss%ss' % (SIF.Descriptor.fmt, base.DescrNameLen,
+                        base.DescrMaxPrivLen)
+    dtype = get_dtype(fmt, SIF.Descriptor.fields + ['name', 'extra'])
+
+    # Extra is the same size, but raw (void) bytes
+    formats = [dtype.fields[name][0] for name in dtype.names]
+    formats[-1] = 'V%s' % base.DescrMaxPrivLen
+    return np.dtype(list(zip(dtype.names, formats)))
+
+
+def get_extra_dtype(Descriptor, SIF):
+    '''get the dtype of extra, for a kind of descriptor (e.g., SIF.Partition),
+       from Descriptor.extra_fmt and extra_fields.
+    '''
+    return get_dtype(Descriptor.extra_fmt, Descriptor.extra_fields,
+                     itemsize=SIF.HeaderBase.DescrMaxPrivLen)
+
+
+class HeaderArrays:
+    '''HeaderArrays holds the global headers and used descriptors of many
+       images, as NumPy structured arrays. headers has a row for each
+       image (in the order of images), and descriptors a row for each used
+       descriptor, with the index of its image (image) and its slot.
+
+       arrays = load_arrays(find_files('/shared/images'))
+       partitions = arrays.get_datatype(0x4004)
+    '''
+
+    def __init__(self, images, headers, descriptors, SIF):
+        self.images = images
+        self.headers = headers
+        self.descriptors = descriptors
+        self.SIF = SIF
+
+    def __str__(self):
+        return "<HeaderArrays:%s images,%s descriptors>" % (len(self.headers),
+                                                            len(self.descriptors))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def get_datatype(self, datatype):
+        '''get the descriptors of a datatype, e.g., 0x4004 for partitions
+        '''
+        return self.descriptors[self.descriptors['Datatype'] == datatype]
+
+    def get_extra(self, datatype):
+        '''get the extra fields (e.g., fstype, partype and arch for
+           partitions) of the descriptors of a datatype, as a structured
+           array with a row for each descriptor of get_datatype(datatype).
+        '''
+        Descriptor = self.SIF.datatypes.get(datatype, self.SIF.Descriptor)
+        extra = self.get_datatype(datatype)['extra']
+        return np.frombuffer(extra.tobytes(),
+                             dtype=get_extra_dtype(Descriptor, self.SIF))
+
+    def get_headers(self, descriptors):
+        '''get the global header of the image of each descriptor
+        '''
+        return self.headers[descriptors['image']]
+
+
+def load_arrays(images, version=None):
+    '''load the global headers and descriptor tables of many images into
+       NumPy structured arrays (see HeaderArrays), with one read of each
+       image (or two, if the descriptors don't fit in the first). Images
+       that are not SIF (or are truncated) are skipped.
+
+       Parameters
+       ==========
+       images: an iterable of images (paths, urls or readers)
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+    '''
+    check_numpy()
+    SIF = get_structure(version)
+    base = SIF.HeaderBase
+    header_dtype = get_header_dtype(SIF)
+    descriptor_dtype = get_descriptor_dtype(SIF)
+
+    found = []
+    headers = bytearray()
+    regions = bytearray()
+    counts = []
+
+    for image in images:
+        reader = get_reader(image)
+        try:
+            data = reader.pread(0, base.DataStartOffset)
+            if len(data) < header_dtype.itemsize or not has_magic(data, SIF):
+                continue
+
+            # The descriptors should be in the first read, but might not be
+            header = np.frombuffer(data, dtype=header_dtype, count=1)[0]
+            start = int(header['descroff'])
+            count = int(header['dtotal'])
+            end = start + count * descriptor_dtype.itemsize
+            if end > len(data):
+                data = reader.pread(0, end)
+        except OSError as e:
+            bot.debug('Cannot read %s: %s', reader.name, e)
+            continue
+        finally:
+            reader.close()
+
+        # A truncated table would leave out descriptors, so it is skipped
+        if start < 0 or count < 0 or end > len(data):
+            bot.debug('Skipping %s, it has a truncated descriptor table',
+                      reader.name)
+            continue
+
+        found.append(reader.name)
+        headers += data[:header_dtype.itemsize]
+        regions += data[start:start + count * descriptor_dtype.itemsize]
+        counts.append(count)
+
+    # Decode all headers, and all descriptor entries, at once
+    headers = np.frombuffer(bytes(headers), dtype=header_dtype)
+    entries = np.frombuffer(bytes(regions), dtype=descriptor_dtype)
+    index = np.repeat(np.arange(len(counts)), counts)
+    slots = np.concatenate([np.arange(count) for count in counts] or
+                           [np.zeros(0, dtype=int)])
+
+    # Keep used descriptors, with the image and slot of each
+    used = entries['Used']
+    names = descriptor_dtype.names
+    dtype = np.dtype([('image', '<i4'), ('slot', '<i4')] +
+                     [(name, descriptor_dtype.fields[name][0]) for name in names])
+    descriptors = np.zeros(int(used.sum()), dtype=dtype)
+    descriptors['image'] = index[used]
+    descriptors['slot'] = slots[used]
+    for name in names:
+        descriptors[name] = entries[name][used]
+
+    return HeaderArrays(found, headers, descriptors, SIF)
@@ -0,0 +1,289 @@
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+from sif.main.descriptors import DescriptorTable
+from sif.utils import ( convert2boolean, get_cache, getenv )
+import fcntl
+import gzip
+import json
+import os
+import tempfile
+
+
+class StatCache:
+    '''A StatCache stores small JSON entries on disk, in a subfolder of the
+       Singularity cache, keyed by the identity of a file, meaning the
+       device, inode, size and modification time. A changed file is never
+       served from the cache, and a hit only needs a stat of the file.
+       Entries are written atomically, writers (and eviction) hold an
+       exclusive lock, and the oldest entries are removed when the cache
+       grows beyond max_size bytes. Entries of a cache with compress = True
+       are gzip compressed. A cache that can't be created, locked or written
+       (e.g., a read only shared cache) is skipped, and never fails a caller.
+    '''
+    compress = False
+
+    def __init__(self, subfolder, max_size=None, disable=None):
+        from sif.defaults import SIF_HEADER_CACHE_SIZE
+
+        if disable is None:
+            disable = convert2boolean(getenv("SINGULARITY_DISABLE_CACHE",
+                                             default=False))
+        self.disable = disable
+        self.max_size = max_size or SIF_HEADER_CACHE_SIZE
+        self.cache_dir = None
+        self.writes = 0
+
+        # A cache folder that can't be created means running uncached
+        if not self.disable:
+            try:
+                self.cache_dir = get_cache(subfolder, quiet=True, create=False)
+                self.lockfile = os.path.join(self.cache_dir, '.lock')
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except (OSError, SystemExit) as e:
+                bot.debug("Cannot use cache %s, disabling it: %s", subfolder, e)
+                self.disable = True
+
+    def __str__(self):
+        return "<%s:%s>" % (self.__class__.__name__, self.cache_dir)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def get_key(self, path, *parts):
+        '''get the key for a file, based on a stat of the file, and any
+           extra parts (e.g., a version). Returns None if the cache is 
+           disabled.
+
+           Parameters
+           ==========
+           path: the path to the file
+           parts: extra (string) parts to add to the key
+        '''
+        if self.disable:
+            return None
+        st = os.stat(path)
+        return "-".join(list(parts) + ["%x-%x-%x-%x" % (st.st_dev, st.st_ino,
+                                       st.st_size, st.st_mtime_ns)])
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, "%s%s" % (key, self._get_suffix()))
+
+    def _get_suffix(self):
+        return '.json.gz' if self.compress else '.json'
+
+    def load(self, key):
+        '''load an entry from the cache, or return None if not cached.
+
+           Parameters
+           ==========
+           key: the key, from get_key
+        '''
+        if key is None:
+            return None
+        opener = gzip.open if self.compress else open
+        try:
+            with opener(self._get_path(key), 'rt') as filey:
+                return json.load(filey)
+        except (OSError, EOFError, ValueError):
+            return None
+
+    def save(self, key, entry):
+        '''save an entry to the cache. An entry that can't be serialized
+           to JSON (e.g., with bytes) is not cached.
+
+           Parameters
+           ==========
+           key: the key, from get_key
+           entry: the entry to save
+        '''
+        if key is None:
+            return
+
+        try:
+            content = json.dumps(entry).encode('utf-8')
+        except TypeError:
+            return
+        if self.compress:
+            content = gzip.compress(content)
+
+        try:
+            with self._lock():
+                self._write(key, content)
+        except OSError as e:
+            bot.debug("Cannot write cache entry: %s", e)
+
+    def _write(self, key, content):
+        '''write an entry (holding the lock), and now and then evict
+        '''
+        # Write to a temporary file first, so readers never see a partial
+        fd, tmpfile = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as filey:
+                filey.write(content)
+            os.replace(tmpfile, self._get_path(key))
+        except OSError:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            raise
+
+        # Checking the size means listing the cache, so do it now and then
+        if self.writes % 64 == 0:
+            self._evict()
+        self.writes += 1
+
+    def _lock(self):
+        '''return an exclusive (process safe) lock on the cache
+        '''
+        return _FileLock(self.lockfile)
+
+    def evict(self):
+        '''remove the oldest entries until the cache is under max_size bytes
+        '''
+        if self.disable:
+            return
+        with self._lock():
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(self._get_suffix()):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total += st.st_size
+
+        entries.sort()
+        while entries and total > self.max_size:
+            mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        '''remove all entries from the cache
+        '''
+        if self.disable:
+            return
+        with self._lock():
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(self._get_suffix()):
+                    os.remove(entry.path)
+
+
+class HeaderCache(StatCache):
+    '''A HeaderCache stores parsed headers (the global header and the
+       descriptor table), keyed by the SIF version and the identity of
+       the image (see StatCache).
+    '''
+
+    def __init__(self, subfolder="sif-headers", max_size=None, disable=None):
+        StatCache.__init__(self, subfolder, max_size, disable)
+
+    def get(self, key, SIF):
+        '''get a cached header, and return the global header (meta) and
+           DescriptorTable, as records, or None if not cached.
+
+           Parameters
+           ==========
+           key: the key for the image, from get_key
+           SIF: the structure from sif.header.get_structure
+        '''
+        entry = self.load(key)
+        if entry is None:
+            return None
+
+        try:
+            table = DescriptorTable()
+            for slot, descriptor in zip(entry['slots'], entry['descriptors']):
+                Descriptor = SIF.datatypes.get(descriptor['Datatype'], 
+                                               SIF.Descriptor)
+                table.add(Descriptor.Record.from_dict(descriptor), slot)
+            return SIF.HeaderRecord.from_dict(entry['meta']), table
+
+        # An entry written by an older version is parsed again
+        except KeyError:
+            return None
+
+    def set(self, key, meta, table):
+        '''save a parsed header to the cache.
+
+           Parameters
+           ==========
+           key: the key for the image, from get_key
+           meta: the global header
+           table: the DescriptorTable
+        '''
+        descriptors = list(table)
+        self.save(key, {'meta': dict(meta),
+                        'descriptors': [dict(d) for d in descriptors],
+                        'slots': [table.slots[d['ID']] for d in descriptors]})
+
+
+class ManifestCache(StatCache):
+    '''A ManifestCache stores the manifests of the files in the squashfs
+       partitions of images (see sif.main.manifest), compressed, keyed by
+       the identity of the image (see StatCache).
+    '''
+    compress = True
+
+    def __init__(self, subfolder="sif-manifests", max_size=None, disable=None):
+        from sif.defaults import SIF_MANIFEST_CACHE_SIZE
+        StatCache.__init__(self, subfolder, max_size or SIF_MANIFEST_CACHE_SIZE,
+                           disable)
+
+
+class _FileLock:
+    '''an exclusive (or shared) lock with flock, as a context manager
+    '''
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.shared = shared
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+
+
+# Caches are shared by all headers in a process
+_caches = dict()
+
+def get_header_cache():
+    '''get the HeaderCache for this process, created on first use.
+    '''
+    if 'headers' not in _caches:
+        _caches['headers'] = HeaderCache()
+    return _caches['headers']
+
+def get_verify_cache():
+    '''get the cache of signature verification results for this process,
+       created on first use.
+    '''
+    if 'verify' not in _caches:
+        _caches['verify'] = StatCache("sif-verified")
+    return _caches['verify']
+
+def get_manifest_cache():
+    '''get the cache of image manifests for this process, created on first
+       use.
+    '''
+    if 'manifests' not in _caches:
+        _caches['manifests'] = ManifestCache()
+    return _caches['manifests']
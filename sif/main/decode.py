@@ -0,0 +1,177 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Decoding works on bytes already read from the image, and does not do
+# any I/O or printing. This lets us read the global header and the whole
+# descriptor region with one read, and parse it with the precompiled
+# struct.Struct objects from sif.header.get_structure. The reads of
+# decode_image are done by the caller, with the function it is given.
+
+import uuid
+
+
+def strip_bytes(values, end_char='\0'):
+    '''decode a fixed length byte string to utf-8, removing the empty
+       end characters. If it cannot be decoded, the bytes are returned.
+
+       Parameters
+       ==========
+       values: the bytes to decode
+       end_char: the character that pads the field
+    '''
+    try:
+        return values.decode('utf-8').replace(end_char, '')
+    except UnicodeDecodeError:
+        return values
+
+
+def has_magic(data, SIF):
+    '''determine if bytes from the start of an image include SIF_MAGIC
+       after the interpreter line.
+
+       Parameters
+       ==========
+       data: bytes read from the start of the image
+       SIF: the structure from sif.header.get_structure
+    '''
+    base = SIF.HeaderBase
+    start = base.HdrLaunchLen
+    magic = data[start:start + base.HdrMagicLen]
+    return magic.startswith(base.HdrMagic.encode('utf-8'))
+
+
+def decode_header(data, SIF):
+    '''decode the global header from bytes read from the start of the image,
+       and return the metadata (a SIF.HeaderRecord). The launch line and
+       magic are not included, as we already know this is a SIF.
+
+       Parameters
+       ==========
+       data: bytes read from the start of the image (at least the header)
+       SIF: the structure from sif.header.get_structure
+    '''
+    launch, magic, version, arch, uid, *times = SIF.HeaderStruct.unpack_from(data)
+
+    end_char = SIF.HeaderBase.EndChar
+    version = strip_bytes(version, end_char)
+    arch = strip_bytes(arch, end_char)
+
+    # Let the uuid library read the (little endian) binary data for us!
+    uid = str(uuid.UUID(bytes_le=uid))
+    return SIF.HeaderRecord(version, arch, uid, *times)
+
+
+def decode_descriptor(data, offset, Descriptor, SIF):
+    '''decode one descriptor entry, including the name and the fields
+       at the start of extra, from the descriptor region, and return a
+       record (Descriptor.Record).
+
+       Parameters
+       ==========
+       data: bytes that include the descriptor entry
+       offset: the offset of the entry in data
+       Descriptor: the descriptor (e.g., SIF.Partition) to provide fields
+       SIF: the structure from sif.header.get_structure
+    '''
+    values = SIF.DescriptorStruct.unpack_from(data, offset)
+    number = len(Descriptor.fields)
+
+    end_char = SIF.HeaderBase.EndChar
+    fields = list(values[:number])
+    fields.append(strip_bytes(values[number], end_char))
+
+    extra = values[number + 1]
+    ExtraStruct = Descriptor.ExtraStruct
+    for key, value in zip(Descriptor.extra_fields,
+                          ExtraStruct.unpack_from(extra)):
+        if key in Descriptor.extra_hex:
+            value = value.hex() if value.strip(b'\0') else ''
+        elif isinstance(value, bytes):
+            value = strip_bytes(value, end_char)
+        fields.append(value)
+    return Descriptor.Record(*fields)
+
+
+def decode_descriptors(data, meta, SIF, data_offset=0):
+    '''decode the full descriptor table (dtotal slots, by default 
+       HeaderBase.DescrNumEntries) from the descriptor region, and return
+       a DescriptorTable, skipping unused entries. Each descriptor
+       is parsed based on its Datatype, and unknown types are parsed as a
+       plain Descriptor. A table that doesn't fit in the data (e.g., of a
+       truncated image) raises a ValueError.
+
+       Parameters
+       ==========
+       data: bytes read from the image, through descriptors
+       meta: the global header, from decode_header
+       SIF: the structure from sif.header.get_structure
+       data_offset: the offset in the image where data starts (default 0)
+    '''
+    from sif.main.descriptors import DescriptorTable
+
+    table = DescriptorTable()
+    size = SIF.DescriptorStruct.size
+    offset = meta['descroff'] - data_offset
+
+    # The number of slots is in the header, and must fit in the data we have
+    if offset < 0 or offset + meta['dtotal'] * size > len(data):
+        raise ValueError('truncated SIF descriptor table')
+
+    # Datatype is first, and Used is right after it (an int32)
+    for slot in range(meta['dtotal']):
+        start = offset + slot * size
+        if data[start + 4] == 0:
+            continue
+
+        datatype = int.from_bytes(data[start:start + 4], 'little', signed=True)
+        Descriptor = SIF.datatypes.get(datatype, SIF.Descriptor)
+        table.add(decode_descriptor(data, start, Descriptor, SIF), slot)
+
+    return table
+
+
+def get_descriptor_region(meta, SIF):
+    '''return the start and end offsets of the descriptor region, which
+       holds at least dtotal descriptors.
+
+       Parameters
+       ==========
+       meta: the global header, from decode_header
+       SIF: the structure from sif.header.get_structure
+    '''
+    start = meta['descroff']
+    end = start + max(meta['descrlen'], 
+                      meta['dtotal'] * SIF.DescriptorStruct.size)
+    return start, end
+
+
+def decode_image(read, SIF):
+    '''read and decode the global header and the descriptor table of an
+       image: one read from the start through DataStartOffset (where the
+       descriptors should be), and another if they don't fit. Returns the
+       global header and the DescriptorTable, or None if the image is not
+       a SIF. A truncated header (or descriptor table) raises a ValueError.
+
+       Parameters
+       ==========
+       read: a function to read the image, read(offset, length, phase),
+             where phase is "header" or "descriptors" (see sif.main.stats)
+       SIF: the structure from sif.header.get_structure
+    '''
+    data = read(0, SIF.HeaderBase.DataStartOffset, 'header')
+    if not has_magic(data, SIF):
+        return None
+
+    if len(data) < SIF.HeaderStruct.size:
+        raise ValueError('truncated SIF header')
+
+    meta = decode_header(data, SIF)
+
+    # The descriptors should be in the first read, but might not be
+    start, end = get_descriptor_region(meta, SIF)
+    if end > len(data):
+        data = read(0, end, 'descriptors')
+    return meta, decode_descriptors(data, meta, SIF)
@@ -0,0 +1,163 @@
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+class DescriptorTable:
+    '''A DescriptorTable holds the used descriptors of an image, in the
+       order of the descriptor slots, with indexes to look them up by ID,
+       group, link and datatype without reading the image again.
+    '''
+
+    def __init__(self, descriptors=None):
+        self.descriptors = []
+        self.slots = dict()
+        self.by_id = dict()
+        self.by_group = dict()
+        self.by_link = dict()
+        self.by_datatype = dict()
+
+        for descriptor in descriptors or []:
+            self.add(descriptor)
+
+    def __str__(self):
+        return "<DescriptorTable:%s>" % len(self)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def __iter__(self):
+        return iter(self.descriptors)
+
+    def add(self, descriptor, slot=None):
+        '''add a descriptor to the table, and update the indexes.
+
+           Parameters
+           ==========
+           descriptor: the descriptor to add, with at least the Descriptor fields
+           slot: the index of the descriptor entry in the image
+        '''
+        if slot is None:
+            slot = len(self.descriptors)
+
+        self.descriptors.append(descriptor)
+        self.slots[descriptor['ID']] = slot
+        self.by_id[descriptor['ID']] = descriptor
+        self.by_group.setdefault(descriptor['Groupid'], []).append(descriptor)
+        self.by_link.setdefault(descriptor['Link'], []).append(descriptor)
+        self.by_datatype.setdefault(descriptor['Datatype'], []).append(descriptor)
+
+    def get(self, descriptor_id, default=None):
+        '''get a descriptor by ID, or return a default if not defined.
+
+           Parameters
+           ==========
+           descriptor_id: the ID of the descriptor
+           default: the default to return
+        '''
+        return self.by_id.get(descriptor_id, default)
+
+    def get_group(self, groupid):
+        '''get the list of descriptors in a group
+
+           Parameters
+           ==========
+           groupid: the Groupid (including the group mask)
+        '''
+        return self.by_group.get(groupid, [])
+
+    def get_links(self, link):
+        '''get the list of descriptors that link to an ID or group
+
+           Parameters
+           ==========
+           link: the ID or group (including the group mask) linked to
+        '''
+        return self.by_link.get(link, [])
+
+    def get_datatype(self, datatype):
+        '''get the list of descriptors of a datatype, e.g., 0x4004 for
+           partitions.
+
+           Parameters
+           ==========
+           datatype: the Datatype of the descriptors
+        '''
+        return self.by_datatype.get(datatype, [])
+
+    def first(self, datatype, default=None):
+        '''get the first descriptor of a datatype, or a default if there
+           are none.
+
+           Parameters
+           ==========
+           datatype: the Datatype of the descriptor
+           default: the default to return
+        '''
+        descriptors = self.get_datatype(datatype)
+        if descriptors:
+            return descriptors[0]
+        return default
+
+
+class LazyDescriptor(dict):
+    '''A LazyDescriptor is a dictionary for a descriptor that reads large
+       payloads (e.g., the content of the deffile) from the image only when
+       the key is requested. Until then, the key is not in the items of the
+       dictionary (but "key in descriptor" is True).
+    '''
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.loaders = dict()
+
+    def __missing__(self, key):
+        if key in self.loaders:
+            return self.load_key(key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.loaders
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def add_loader(self, key, loader):
+        '''add a loader for a key, a function that takes an (optional)
+           open file descriptor and returns the value.
+
+           Parameters
+           ==========
+           key: the key to load
+           loader: the function to load it
+        '''
+        self.loaders[key] = loader
+
+    def load_key(self, key, fd=None):
+        '''load a key now, and remove the loader
+
+           Parameters
+           ==========
+           key: the key to load
+           fd: an optional open file descriptor for the image
+        '''
+        value = self[key] = self.loaders.pop(key)(fd)
+        return value
+
+    def load(self, fd=None):
+        '''load all keys that are not loaded yet.
+
+           Parameters
+           ==========
+           fd: an optional open file descriptor for the image
+        '''
+        for key in list(self.loaders):
+            self.load_key(key, fd)
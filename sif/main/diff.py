@@ -0,0 +1,329 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Two images are compared by the global headers, the descriptor tables, and
+# the files of the squashfs partitions. The file trees are compared from
+# the metadata (the inode and directory tables), and a directory with the
+# same listing (names, types and inode references) is not matched by name.
+# A file with another size is changed, and files of the same size are
+# compared by the stored sizes of their blocks (and the tail end, in a
+# fragment): only a file with other blocks is read, for its digest. With
+# content=True, the stored (compressed) bytes of files with the same blocks
+# are compared too, to find a change that keeps every size. If the
+# metadata of the filesystems is the same, the trees aren't walked at all.
+# Times are not compared, so rebuilds with other times (or the same, e.g.,
+# with SOURCE_DATE_EPOCH) are compared by content. If both images have
+# cached manifests with digests of all files, they are compared instead,
+# without reading the partitions.
+
+from sif.main.manifest import ( get_cached_manifest, get_digest )
+from sif.squashfs.structures import ( DATA_UNCOMPRESSED, DIRECTORY, FILE )
+import os
+import stat
+
+
+def diff(image1, image2, files=True, algorithm='sha256', content=False):
+    '''compare two images, and return a dictionary with the differences
+       of the global headers (meta) and descriptors, and the added,
+       removed and changed files (see diff_files). Values that differ are
+       given as [image1, image2].
+
+       Parameters
+       ==========
+       image1: the first image (e.g., the older build)
+       image2: the second image
+       files: compare the files of the squashfs partitions (default True)
+       algorithm: the hashlib algorithm to compare the content of files
+       content: compare the content of files with the same blocks
+    '''
+    from sif.main import SIFHeader
+
+    header1 = SIFHeader(image1)
+    header2 = SIFHeader(image2)
+    result = {'image1': header1.image, 'image2': header2.image,
+              'meta': diff_values(header1.meta, header2.meta),
+              'descriptors': diff_descriptors(header1.descriptors,
+                                              header2.descriptors),
+              'files': None}
+
+    if files is True:
+        manifest1 = manifest2 = None
+        if header1.reader.local is not None and header2.reader.local is not None:
+            manifest1 = get_cached_manifest(header1.get_local(), True, algorithm)
+            manifest2 = get_cached_manifest(header2.get_local(), True, algorithm)
+
+        if manifest1 is not None and manifest2 is not None:
+            result['files'] = diff_manifests(manifest1, manifest2)
+        elif _has_squashfs(header1) and _has_squashfs(header2):
+            result['files'] = diff_files(header1.get_squashfs(),
+                                         header2.get_squashfs(), algorithm,
+                                         content)
+    return result
+
+
+def has_changes(result):
+    '''determine if a result of diff has any differences
+    '''
+    files = result['files'] or {}
+    return bool(result['meta'] or any(result['descriptors'].values()) or
+                any(files.values()))
+
+
+def _has_squashfs(header):
+    partition = header.get_partition()
+    return partition is not None and partition['fstype'] == 1
+
+
+def diff_values(values1, values2, skip=None):
+    '''compare two mappings (e.g., global headers), and return the keys
+       that differ, with [value1, value2].
+    '''
+    skip = skip or []
+    keys = list(values1) + [key for key in values2 if key not in values1]
+    return dict((key, [values1.get(key), values2.get(key)]) for key in keys
+                if key not in skip and values1.get(key) != values2.get(key))
+
+
+def diff_descriptors(table1, table2):
+    '''compare two descriptor tables by ID, and return the IDs of the added
+       and removed descriptors, and the fields that changed, by ID.
+    '''
+    ids1 = [descriptor['ID'] for descriptor in table1]
+    ids2 = [descriptor['ID'] for descriptor in table2]
+    changed = dict()
+    for descriptor_id in ids1:
+        if descriptor_id in ids2:
+            values = diff_values(table1.get(descriptor_id),
+                                 table2.get(descriptor_id))
+            if values:
+                changed[descriptor_id] = values
+
+    return {'added': [i for i in ids2 if i not in ids1],
+            'removed': [i for i in ids1 if i not in ids2],
+            'changed': changed}
+
+
+def diff_files(squashfs1, squashfs2, algorithm='sha256', content=False):
+    '''compare the file trees of two squashfs filesystems, and return the
+       added and removed paths, and the changed paths, each with the
+       values that differ (e.g., size, mode or digest). The trees are
+       walked together, and files of the same size are compared by their
+       blocks (see _same_blocks), and with content=True, by the stored
+       bytes (see _same_content). Without content, filesystems with the
+       same metadata (see _same_metadata) have no changes.
+
+       Parameters
+       ==========
+       squashfs1: the first SquashFS
+       squashfs2: the second SquashFS
+       algorithm: the hashlib algorithm to compare the content of files
+       content: compare the content of files with the same blocks
+    '''
+    result = {'added': [], 'removed': [], 'changed': []}
+
+    with squashfs1, squashfs2:
+        if content is not True and _same_metadata(squashfs1, squashfs2):
+            return result
+
+        stack = [('/', squashfs1.root, squashfs2.root)]
+        while stack:
+            path, inode1, inode2 = stack.pop()
+
+            # The same listing has the same names, so none are added or removed
+            same = squashfs1.get_listing(inode1) == squashfs2.get_listing(inode2)
+            entries1 = dict((e[0], e[1]) for e in squashfs1.get_entries(inode1))
+            entries2 = entries1 if same else \
+                       dict((e[0], e[1]) for e in squashfs2.get_entries(inode2))
+
+            for name in entries1:
+                child = os.path.join(path, name)
+                if not same and name not in entries2:
+                    result['removed'] += _list_tree(squashfs1, child,
+                                                    entries1[name])
+                    continue
+
+                child1 = squashfs1.get_inode(entries1[name])
+                child2 = squashfs2.get_inode(entries2[name])
+                values = _diff_inodes(squashfs1, child1, squashfs2, child2,
+                                      algorithm, content)
+                if values:
+                    result['changed'].append(dict(path=child, **values))
+
+                # A directory that is now something else is removed, or added
+                if child1.type == DIRECTORY and child2.type == DIRECTORY:
+                    stack.append((child, child1, child2))
+                elif child1.type == DIRECTORY:
+                    result['removed'] += _list_tree(squashfs1, child,
+                                                    entries1[name])[1:]
+                elif child2.type == DIRECTORY:
+                    result['added'] += _list_tree(squashfs2, child,
+                                                  entries2[name])[1:]
+
+            for name in entries2:
+                if not same and name not in entries1:
+                    result['added'] += _list_tree(squashfs2,
+                                                  os.path.join(path, name),
+                                                  entries2[name])
+
+    result['added'].sort()
+    result['removed'].sort()
+    result['changed'].sort(key=lambda item: item['path'])
+    return result
+
+
+def _list_tree(squashfs, path, ref):
+    '''list a path, and if it is a directory, all paths under it
+    '''
+    paths = [path]
+    inode = squashfs.get_inode(ref)
+    if inode.type == DIRECTORY:
+        for name, child, kind in squashfs.get_entries(inode):
+            paths += _list_tree(squashfs, os.path.join(path, name), child)
+    return paths
+
+
+def _same_metadata(squashfs1, squashfs2):
+    '''determine if two filesystems have the same metadata: the same
+       superblock (but the times), and the same bytes from the inode table
+       to the end (the inode, directory, fragment and id tables). The
+       files then have the same names, owners, sizes and blocks, at the
+       same positions, so only a change in the stored bytes of a block
+       (found with content=True) is possible.
+    '''
+    superblock1 = dict(squashfs1.superblock)
+    superblock2 = dict(squashfs2.superblock)
+    for superblock in [superblock1, superblock2]:
+        superblock.pop('mkfs_time')
+    if superblock1 != superblock2:
+        return False
+
+    for data1, data2 in zip(squashfs1.iter_metadata(),
+                            squashfs2.iter_metadata()):
+        if data1 != data2:
+            return False
+    return True
+
+
+def _diff_inodes(squashfs1, inode1, squashfs2, inode2, algorithm,
+                 content=False):
+    '''compare two inodes, and return the values that differ: the type,
+       mode, owner, link target, size, or digest (for files of the same
+       size, with other content). Times aren't compared. A file with the
+       same blocks is only read with content=True.
+    '''
+    values = dict()
+    for key in ['mode', 'uid', 'gid', 'target', 'rdev']:
+        if getattr(inode1, key) != getattr(inode2, key):
+            values[key] = [getattr(inode1, key), getattr(inode2, key)]
+
+    if inode1.type != FILE or inode2.type != FILE:
+        return values
+
+    if inode1.size != inode2.size:
+        values['size'] = [inode1.size, inode2.size]
+        return values
+
+    same = _same_blocks(squashfs1, inode1, squashfs2, inode2)
+    if same is True and content is True:
+        same = _same_content(squashfs1, inode1, squashfs2, inode2)
+    if same is not True:
+        digest1 = get_digest(squashfs1, inode1, algorithm)
+        digest2 = get_digest(squashfs2, inode2, algorithm)
+        if digest1 != digest2:
+            values['digest'] = [digest1, digest2]
+    return values
+
+
+def _same_blocks(squashfs1, inode1, squashfs2, inode2):
+    '''determine if two files of the same size look the same, without
+       reading their blocks: the filesystems have the same compressor, and
+       the files the same stored sizes of the blocks, and the same tail end
+       (read from the fragment, a small block shared by many files).
+       Returns True, or None if the digests need to be compared.
+    '''
+    if squashfs1.superblock.compressor != squashfs2.superblock.compressor or \
+       inode1.blocks != inode2.blocks or \
+       (inode1.fragment is None) != (inode2.fragment is None):
+        return None
+    if inode1.fragment is None or _same_tail(squashfs1, inode1,
+                                             squashfs2, inode2):
+        return True
+
+
+def _same_tail(squashfs1, inode1, squashfs2, inode2):
+    '''determine if two files of the same size have the same tail end, in
+       a fragment
+    '''
+    length = inode1.size % squashfs1.block_size
+    return squashfs1.read_fragment(inode1.fragment, inode1.fragment_offset,
+                                   length) == \
+           squashfs2.read_fragment(inode2.fragment, inode2.fragment_offset,
+                                   length)
+
+
+def _same_content(squashfs1, inode1, squashfs2, inode2):
+    '''determine if two files with the same blocks (see _same_blocks) have
+       the same content, without decompressing the blocks: the stored bytes
+       of each block are compared. Returns True or False.
+    '''
+    position1, position2 = inode1.start, inode2.start
+    for stored in inode1.blocks:
+        if squashfs1.read_stored(position1, stored) != \
+           squashfs2.read_stored(position2, stored):
+            return False
+        position1 += stored & ~DATA_UNCOMPRESSED
+        position2 += stored & ~DATA_UNCOMPRESSED
+    return True
+
+
+def diff_manifests(manifest1, manifest2):
+    '''compare the files of two manifests (see sif.main.manifest), with
+       digests of all files, by path, and return the added, removed and
+       changed paths, with the same values as for the file trees (see
+       diff_files).
+    '''
+    files1 = _get_files(manifest1)
+    files2 = _get_files(manifest2)
+    result = {'added': sorted(p for p in files2 if p not in files1),
+              'removed': sorted(p for p in files1 if p not in files2),
+              'changed': []}
+
+    for path in sorted(files1):
+        if path in files2 and files1[path] != files2[path]:
+            values = dict()
+            for key, value1, value2 in zip(MANIFEST_FIELDS, files1[path],
+                                           files2[path]):
+                if value1 != value2:
+                    values[key] = [value1, value2]
+
+            # A changed size is enough, as for the file trees
+            if 'size' in values:
+                values.pop('digest', None)
+            if values:
+                result['changed'].append(dict(path=path, **values))
+    return result
+
+
+# The values of a file in a manifest, in the order of _diff_inodes
+MANIFEST_FIELDS = ['mode', 'uid', 'gid', 'target', 'rdev', 'size', 'digest']
+
+
+def _get_files(manifest):
+    '''get the values (see MANIFEST_FIELDS) of each path of a manifest,
+       with a size only for files, as for the file trees
+    '''
+    files = dict()
+    if 'error' in manifest:
+        return files
+    columns = zip(manifest['paths'], manifest['modes'], manifest['uids'],
+                  manifest['gids'], manifest['targets'], manifest['rdevs'],
+                  manifest['sizes'], manifest['hashes'])
+    for path, mode, uid, gid, target, rdev, size, digest in columns:
+        if not stat.S_ISREG(mode):
+            size = None
+        if path != '/':
+            files[path] = (mode, uid, gid, target, rdev, size, digest)
+    return files
@@ -0,0 +1,269 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+from sif.header import get_structure
+from sif.main.decode import ( decode_descriptors, decode_header, has_magic )
+from sif.main.encode import ( encode_descriptor, encode_header,
+                              patch_descriptor )
+from sif.main.writer import ( align, new_descriptor, write_data )
+import fcntl
+import os
+import time
+
+
+class SIFEditor:
+    '''A SIFEditor changes the descriptors of an existing image in place.
+       Only the bytes that change are written: the descriptor entry that is
+       added, updated or deleted, the global header (dfree, dtotal,
+       descrlen, datalen and mtime) and, for a new descriptor, its data
+       object, which is appended after the last one. The image is never
+       rewritten, so attaching a small signature to a large image is fast.
+
+       Each change holds an exclusive lock on the image, and reads the
+       header again under the lock. New data is written before the
+       descriptor, and the descriptor before the global header, so an
+       interrupted change leaves (at worst) unused bytes at the end.
+
+       editor = SIFEditor('boxes.sif')
+       editor.add_signature('rootfs.sig', link=2)
+       editor.update(2, name='rootfs')
+       editor.delete(3)
+    '''
+
+    def __init__(self, image, version=None, alignment=4096):
+        if not os.path.exists(image):
+            bot.exit('Cannot find %s.' % image)
+
+        self.SIF = get_structure(version)
+        self.base = self.SIF.HeaderBase
+        self.image = image
+        self.alignment = alignment
+
+    def __str__(self):
+        return "<SIFEditor:%s>" % self.image
+
+    def __repr__(self):
+        return self.__str__()
+
+    def add(self, datatype, source, name='', link=None, groupid=None,
+                  extra=None):
+        '''add a data object in a free descriptor slot, with the data
+           appended to the image, and return the ID of its descriptor.
+
+           Parameters
+           ==========
+           datatype: the Datatype of the descriptor (e.g., 0x4005)
+           source: the path to a file with the data, or bytes
+           name: the name of the descriptor
+           link: the ID (or group) the descriptor links to (default unused)
+           groupid: the group of the descriptor (default is the first group)
+           extra: a dictionary of values for the extra_fields of the datatype
+        '''
+        if isinstance(source, (bytes, bytearray)):
+            length = len(source)
+        elif os.path.exists(source):
+            length = os.stat(source).st_size
+        else:
+            bot.exit('Cannot find %s' % source)
+
+        with _ImageLock(self.image) as fd:
+            meta, table = self._load(fd)
+            slot = self._get_free_slot(meta, table)
+
+            descriptor_id = max([d['ID'] for d in table] + [0]) + 1
+            descriptor = new_descriptor(self.SIF, datatype, descriptor_id, name,
+                                        link, groupid, extra)
+
+            # The data object goes after the end of the data, or the end of
+            # the file if there is more (e.g., from an interrupted add), so
+            # nothing past datalen is overwritten
+            now = int(time.time())
+            end = max(os.fstat(fd).st_size, meta['dataoff'] + meta['datalen'])
+            offset = align(end, self.alignment)
+            descriptor.update({'Fileoff': offset,
+                               'Filelen': length,
+                               'Storelen': length,
+                               'Ctime': now,
+                               'Mtime': now})
+
+            if write_data(fd, source, offset, length) != length:
+                bot.exit('%s changed while it was written to %s' %
+                         (source, self.image))
+            self._write_descriptor(fd, meta, slot, descriptor)
+
+            meta['dfree'] = meta['dtotal'] - len(table) - 1
+            meta['datalen'] = offset + length - meta['dataoff']
+            self._write_header(fd, meta, now)
+
+        bot.debug('Added descriptor %s to %s', descriptor_id, self.image)
+        return descriptor_id
+
+    def add_signature(self, source, link, hashtype=2, entity='',
+                      name='part-signature'):
+        '''add a signature block (a clear signed SIFHASH) for a descriptor
+           or group, and return the ID of its descriptor.
+
+           Parameters
+           ==========
+           source: the path to the signature block, or bytes
+           link: the ID (or group) that is signed
+           hashtype: the hash of the signed data (see hashtypes, SHA384)
+           entity: the fingerprint of the signing key, as hex
+        '''
+        extra = {'hashtype': hashtype, 'entity': entity}
+        return self.add(self.SIF.Signature.datatype, source, name, link=link,
+                        groupid=self.base.DescrUnusedGroup, extra=extra)
+
+    def update(self, descriptor_id, **values):
+        '''update the metadata of a descriptor, e.g., the name, Link or
+           extra fields, and the modification time (Mtime, unless given).
+           The location of the data object and the ID can't be changed.
+           Only the given fields are written, the rest of the entry is
+           left as it is.
+           Returns the updated descriptor.
+
+           Parameters
+           ==========
+           descriptor_id: the ID of the descriptor
+           values: the fields to update
+        '''
+        fixed = ['Datatype', 'Used', 'ID', 'Fileoff', 'Filelen', 'Storelen']
+
+        with _ImageLock(self.image) as fd:
+            meta, table = self._load(fd)
+            descriptor = dict(self._get_descriptor(table, descriptor_id))
+
+            Descriptor = self.SIF.datatypes.get(descriptor['Datatype'],
+                                                self.SIF.Descriptor)
+            allowed = Descriptor.fields + ['name'] + Descriptor.extra_fields
+            for key in values:
+                if key not in allowed or key in fixed:
+                    bot.exit('%s cannot be updated for a %s descriptor.' %
+                             (key, Descriptor.name))
+
+            # Only the changed fields are written into the entry
+            now = int(time.time())
+            values = dict({'Mtime': now}, **values)
+            descriptor.update(values)
+
+            size = self.SIF.DescriptorStruct.size
+            offset = meta['descroff'] + table.slots[descriptor_id] * size
+            entry = os.pread(fd, size, offset)
+            os.pwrite(fd, patch_descriptor(entry, values, Descriptor, self.SIF),
+                      offset)
+            self._write_header(fd, meta, now)
+
+        return descriptor
+
+    def delete(self, descriptor_id, zero=False):
+        '''delete a descriptor, by marking its entry unused (all zeros). If
+           the data object is the last in the image, the image is truncated,
+           otherwise the data is left in place, or overwritten with zeros
+           (zero=True).
+
+           Parameters
+           ==========
+           descriptor_id: the ID of the descriptor
+           zero: overwrite the data object with zeros
+        '''
+        with _ImageLock(self.image) as fd:
+            meta, table = self._load(fd)
+            descriptor = self._get_descriptor(table, descriptor_id)
+            slot = table.slots[descriptor_id]
+
+            size = self.SIF.DescriptorStruct.size
+            os.pwrite(fd, bytes(size), meta['descroff'] + slot * size)
+
+            # The data ends at the end of the last object that remains
+            remaining = [d for d in table if d['ID'] != descriptor_id]
+            end = max([d['Fileoff'] + d['Filelen'] for d in remaining] +
+                      [meta['dataoff']])
+
+            if descriptor['Fileoff'] >= end:
+                os.ftruncate(fd, end)
+            elif zero is True:
+                self._zero(fd, descriptor['Fileoff'], descriptor['Filelen'])
+
+            meta['dfree'] = meta['dtotal'] - len(remaining)
+            meta['datalen'] = end - meta['dataoff']
+            self._write_header(fd, meta, int(time.time()))
+
+        bot.debug('Deleted descriptor %s from %s', descriptor_id, self.image)
+
+    def _load(self, fd):
+        '''read the global header and descriptors from the open image
+        '''
+        data = os.pread(fd, self.base.DataStartOffset, 0)
+        if not has_magic(data, self.SIF):
+            bot.exit('%s is not a SIF file.' % self.image)
+
+        meta = dict(decode_header(data, self.SIF))
+        if len(data) < meta['descroff'] + meta['descrlen']:
+            bot.exit('%s is truncated.' % self.image)
+        try:
+            return meta, decode_descriptors(data, meta, self.SIF)
+        except ValueError:
+            bot.exit('%s is truncated.' % self.image)
+
+    def _get_descriptor(self, table, descriptor_id):
+        descriptor = table.get(descriptor_id)
+        if descriptor is None:
+            bot.exit('%s does not have descriptor %s' %
+                     (self.image, descriptor_id))
+        return descriptor
+
+    def _get_free_slot(self, meta, table):
+        '''get the first unused descriptor slot. If all slots are used, the
+           table is grown by one slot, if there is room before the data.
+        '''
+        used = set(table.slots.values())
+        for slot in range(meta['dtotal']):
+            if slot not in used:
+                return slot
+
+        size = self.SIF.DescriptorStruct.size
+        if meta['descroff'] + (meta['dtotal'] + 1) * size > meta['dataoff']:
+            bot.exit('%s has no free descriptors.' % self.image)
+
+        meta['dtotal'] += 1
+        meta['descrlen'] = meta['dtotal'] * size
+        return meta['dtotal'] - 1
+
+    def _write_descriptor(self, fd, meta, slot, descriptor):
+        Descriptor = self.SIF.datatypes.get(descriptor['Datatype'],
+                                            self.SIF.Descriptor)
+        size = self.SIF.DescriptorStruct.size
+        data = encode_descriptor(descriptor, Descriptor, self.SIF)
+        os.pwrite(fd, data, meta['descroff'] + slot * size)
+
+    def _write_header(self, fd, meta, now):
+        meta['mtime'] = now
+        os.pwrite(fd, encode_header(meta, self.SIF), 0)
+
+    def _zero(self, fd, offset, length, chunk_size=1024 * 1024):
+        zeros = bytes(min(chunk_size, length))
+        while length > 0:
+            count = os.pwrite(fd, zeros[:length], offset)
+            offset += count
+            length -= count
+
+
+class _ImageLock:
+    '''open an image for writing, with an exclusive lock (flock), as a
+       context manager that returns the file descriptor
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self.fd
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
@@ -0,0 +1,139 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Encoding is the inverse of decoding (see decode.py), and turns the
+# dictionaries that we parse back into bytes with the same precompiled
+# struct.Struct objects. It does not do any I/O.
+
+from struct import ( calcsize, Struct )
+import re
+import uuid
+
+
+def encode_header(meta, SIF):
+    '''encode the global header from a dictionary of metadata (as returned
+       by decode_header). The launch line and magic are from the base.
+
+       Parameters
+       ==========
+       meta: the global header, with the fields of HeaderBase
+       SIF: the structure from sif.header.get_structure
+    '''
+    base = SIF.HeaderBase
+    values = dict(meta)
+    values['launch'] = base.HdrLaunch.encode('utf-8')
+    values['magic'] = base.HdrMagic.encode('utf-8')
+    values['version'] = values['version'].encode('utf-8')
+    values['arch'] = values['arch'].encode('utf-8')
+    values['uuid'] = uuid.UUID(values['uuid']).bytes_le
+    return SIF.HeaderStruct.pack(*[values[key] for key in base.fields])
+
+
+def encode_descriptor(descriptor, Descriptor, SIF):
+    '''encode one descriptor entry, including the name and the fields
+       at the start of extra, from a dictionary (as returned by
+       decode_descriptor).
+
+       Parameters
+       ==========
+       descriptor: the descriptor, with the fields of Descriptor
+       Descriptor: the descriptor (e.g., SIF.Partition) to provide fields
+       SIF: the structure from sif.header.get_structure
+    '''
+    values = [descriptor[key] for key in Descriptor.fields]
+
+    extra = []
+    for key in Descriptor.extra_fields:
+        value = descriptor[key]
+        if key in Descriptor.extra_hex:
+            value = bytes.fromhex(value)
+        elif isinstance(value, str):
+            value = value.encode('utf-8')
+        extra.append(value)
+
+    values.append(descriptor['name'].encode('utf-8'))
+    values.append(Descriptor.ExtraStruct.pack(*extra))
+    return SIF.DescriptorStruct.pack(*values)
+
+
+def patch_descriptor(entry, values, Descriptor, SIF):
+    '''patch fields of a descriptor entry, as read from the image, and
+       return the new entry. Only the bytes of the given fields change, so
+       the rest of extra (past extra_fields) and a name that can't be
+       decoded (e.g., not utf-8) are kept as they are.
+
+       Parameters
+       ==========
+       entry: the bytes of the descriptor entry (DescriptorStruct.size)
+       values: the fields to change, as returned by decode_descriptor
+       Descriptor: the descriptor (e.g., SIF.Partition) to provide fields
+       SIF: the structure from sif.header.get_structure
+    '''
+    entry = bytearray(entry)
+    base = SIF.HeaderBase
+    name_offset = calcsize(Descriptor.fmt)
+    extra_offset = name_offset + base.DescrNameLen
+
+    layout = _get_layout(Descriptor.fmt, Descriptor.fields)
+    layout.update(_get_layout(Descriptor.extra_fmt, Descriptor.extra_fields,
+                              extra_offset))
+
+    for key, value in values.items():
+        if key == 'name':
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            Struct('%ss' % base.DescrNameLen).pack_into(entry, name_offset,
+                                                        value)
+            continue
+
+        offset, fmt = layout[key]
+        if key in Descriptor.extra_hex:
+            value = bytes.fromhex(value)
+        elif isinstance(value, str):
+            value = value.encode('utf-8')
+        Struct(fmt).pack_into(entry, offset, value)
+    return bytes(entry)
+
+
+def _get_layout(fmt, fields, start=0):
+    '''get the offset and (single value) format of each field of a
+       struct format, e.g., '<i?3I' for four fields
+    '''
+    order, codes = fmt[0], []
+    for count, code in re.findall(r'(\d*)([a-zA-Z?])', fmt[1:]):
+        if code == 's':
+            codes.append(count + code)
+        else:
+            codes += [code] * int(count or 1)
+
+    layout = dict()
+    for index, (key, code) in enumerate(zip(fields, codes)):
+        offset = start + calcsize(order + ''.join(codes[:index]))
+        layout[key] = (offset, order + code)
+    return layout
+
+
+def encode_descriptors(table, SIF, slots=None):
+    '''encode the descriptor region, with every slot (unused slots are
+       zeros), from a DescriptorTable. Descriptors are put in the slot that
+       they were read from, or in order if they weren't read.
+
+       Parameters
+       ==========
+       table: the DescriptorTable
+       SIF: the structure from sif.header.get_structure
+       slots: the number of slots (defaults to HeaderBase.DescrNumEntries)
+    '''
+    slots = slots or SIF.HeaderBase.DescrNumEntries
+    size = SIF.DescriptorStruct.size
+    data = bytearray(slots * size)
+
+    for index, descriptor in enumerate(table):
+        slot = table.slots.get(descriptor['ID'], index)
+        Descriptor = SIF.datatypes.get(descriptor['Datatype'], SIF.Descriptor)
+        data[slot * size:(slot + 1) * size] = encode_descriptor(descriptor,
+                                                                Descriptor, SIF)
+    return bytes(data)
@@ -5,35 +5,79 @@
 # Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+from contextlib import nullcontext
+import mmap
 import os
-import uuid
 from sif.logger import bot
 from sif.defaults import SIF_VERSION
-from struct import ( unpack, calcsize )
+from sif.main.decode import (
+    decode_descriptors,
+    decode_header,
+    decode_image,
+    get_descriptor_region,
+    has_magic,
+    strip_bytes
+)
+from sif.main.descriptors import LazyDescriptor
+from sif.main.readers import get_reader
+from sif.main.stats import (
+    IOStats,
+    StatsReader,
+    get_stats,
+    is_enabled
+)
 
 class SIFHeader:
 
-    def __init__(self, image, load_header=True, version=None):
+    def __init__(self, image, load_header=True, version=None, lazy=False,
+                       cache=True, verbose=False, stats=None):
 
         # Load the base for a particular SIF version
         self.load_base(version)
 
-        # We will store global headers, and descriptors
-        self.meta = dict()
-        self.desc = dict()
-
-        if not os.path.exists(image):
-            bot.exit('Cannot find %s.' % image)
+        # We will store global headers, and descriptors, loaded on demand
+        self._meta = None
+        self._desc = None
+        self._descriptors = None
+        self._mmap = None
+
+        # The image can be a path, url, open file descriptor, bytes or reader
+        self.reader = get_reader(image)
+        self.image = self.reader.name
+
+        if isinstance(self.reader.local, str) and \
+           not os.path.exists(self.reader.local):
+            bot.exit('Cannot find %s.' % self.image)
+
+        # Counting reads is opt-in, by default from SIF_IO_STATS
+        self.stats = None
+        if stats is True or (stats is None and is_enabled()):
+            self.stats = IOStats(self.image, parent=get_stats())
+            self.reader = StatsReader(self.reader, self.stats)
+
+        # Printing what was loaded is opt-in, see get_presenter
+        self.verbose = verbose
+
+        # Parsed headers (of local images) are cached, keyed by a stat
+        self.cache = None
+        if cache is True and self.reader.local is not None:
+            from sif.main.cache import get_header_cache
+            self.cache = get_header_cache()
+
+        # Lazy means nothing is read until it's needed, not even the magic
+        if lazy is True:
+            return
+
+        # The user might want to wait to load, otherwise the magic is
+        # checked from the same read as the header
+        if load_header is True:
+            self.load_header()
 
-        if not self.is_sif(image):
+        elif not self.is_sif():
             bot.exit('%s is not a SIF file.' % image)
 
-        bot.info('%s is a SIF file.' % image)
-        self.image = image
-
-        # The user might want to wait to load
-        if load_header is True:
-            self.load_header()
+        elif self.verbose is True:
+            bot.info('%s is a SIF file.' % image)
 
 
     def __str__(self):
@@ -44,18 +88,28 @@ class SIFHeader:
         '''representation of SIF image is also the path'''
         return self.__str__()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 
 ################################################################################
 # Printing
 ################################################################################
 
 
+    def get_presenter(self):
+        '''get a HeaderPresenter, to print the header for the user to see
+        '''
+        from sif.main.presenter import HeaderPresenter
+        return HeaderPresenter(self)
+
     def print_header(self):
         '''print the metadata for the user to see
         '''
-        for key, val in self.meta.items():
-            bot.info('SIF Header %s %s' % (key, val) )
-        bot.newline()
+        self.get_presenter().print_header()
 
     def print_descriptor(self, descriptor, skip_keys=None):
         '''print the definition file metadata for the user to see
@@ -65,19 +119,7 @@ class SIFHeader:
            name: the key in self.desc to iterate over
            skip_keys: skip these keys in self.desc[key]
         ''' 
-        if skip_keys == None:
-            skip_keys = []
-
-        if not isinstance(skip_keys, list):
-            skip_keys = [skip_keys]
-
-        if descriptor in self.desc:
-            name = descriptor.capitalize()
-            for key, val in self.desc[descriptor].items():
-                if key not in skip_keys:
-                    bot.info('%s %s %s' % (name, key, val) )
-        bot.newline()
-
+        self.get_presenter().print_descriptor(descriptor, skip_keys)
 
     def print_descriptor_deffile(self):
         self.print_descriptor('deffile', 'content')
@@ -91,59 +133,50 @@ class SIFHeader:
     def print_deffile(self):
         '''print the definition file for the user to see
         '''
-        if 'deffile' in self.desc:
-            if 'content' in self.desc['deffile']:
-                print(self.desc['deffile']['content'])
+        self.get_presenter().print_deffile()
 
     def print_arch(self):
         '''print the human friendly architecture'''
-        if 'arch' in self.meta:
-            if self.meta['arch'] in self.arches:
-                bot.info('Architecture: %s' % self.arches[self.meta['arch']])
-            bot.newline()
+        self.get_presenter().print_arch()
 
 ################################################################################
-# Validation
+# Structured Result
 ################################################################################
 
 
-    def is_sif(self, image):
-        '''determine if an image is SIF based on finding SIF_MAGIC
-        ''' 
-
-        with open(image, 'rb') as filey:
-
-            # Skip the first line
-            filey.seek(self.base.HdrLaunchLen)
-
-            # Read # of bytes corresponding to length of sif magic
-            fmt = "%ss" % self.base.HdrMagicLen
- 
-            # Read length of header magic (if fails, not sif)           
-            try:
-                line = self.unpack_chars(filey, fmt)
-            except UnicodeDecodeError:
-                pass
-                return False
+    def get_info(self):
+        '''return a HeaderInfo, the structured result of parsing the header,
+           which can be serialized to a dictionary or JSON.
+        '''
+        from sif.main.info import HeaderInfo
+        return HeaderInfo(self.image, self.meta, list(self.descriptors), 
+                          self.SIF)
 
-            if line != None:
-                if isinstance(line, str) and line.startswith(self.base.HdrMagic):
-                    return True
+    def to_dict(self):
+        '''return the parsed header as a dictionary'''
+        return self.get_info().to_dict()
 
-            return False
+    def to_json(self, indent=None):
+        '''return the parsed header as JSON'''
+        return self.get_info().to_json(indent=indent)
 
 
-    def unpack_chars(self, filey, fmt, number=None, encoding='utf-8'):
-        '''unpack characters, and handle the encoding and removing
-           an end character.
-        '''
-        line, = self.unpack_bytes(filey, fmt, number)
+################################################################################
+# Validation
+################################################################################
 
-        # Return numbers, otherwise parse bytes to string
-        if isinstance(line, (int, float)):
-            return line
 
-        return line.decode(encoding).replace(self.base.EndChar, '')
+    def is_sif(self, image=None):
+        '''determine if an image is SIF based on finding SIF_MAGIC
+           after the interpreter line, with one small read. The image
+           defaults to the image of the header.
+        ''' 
+        reader = self.reader
+        if image is not None:
+            reader = get_reader(image)
+        length = self.base.HdrLaunchLen + self.base.HdrMagicLen
+        with self._phase('magic'):
+            return has_magic(reader.pread(0, length), self.SIF)
 
 
 ################################################################################
@@ -154,58 +187,36 @@ class SIFHeader:
         '''load a sif base, or default to version 02
         '''
         from sif.header import get_structure
-        SIF = get_structure(version)
+        self.SIF = get_structure(version)
 
         # We have a header base, arches
-        self.base = SIF.HeaderBase
-        self.arches = SIF.arches
+        self.base = self.SIF.HeaderBase
+        self.arches = self.SIF.arches
 
         # Descriptors
-        self.Deffile = SIF.Deffile 
-        self.Partition = SIF.Partition
-        self.Signature = SIF.Signature
-
-    def read_and_strip(self, filey, fmt, number=None):
-        '''read a number of bytes (number of based on a format) from the
-           file, remove empty / white spaces indicated by \0.
-        '''
-        values = self.read_bytes(filey, fmt, number)
-         
-        try:
-            return values.decode('utf-8').replace('\0', '')
-        except:
-            return values
+        self.Deffile = self.SIF.Deffile 
+        self.Partition = self.SIF.Partition
+        self.Signature = self.SIF.Signature
 
-
-    def read_bytes(self, filey, fmt, number=None):
-        '''just read a number of bytes from an open file.
-
-           Parameters
-           ==========
-           filey: an open file object
-           number: the number of bytes to read
-           fmt: an optional format string
-        '''
-        if number == None:
-            number = calcsize(fmt)
-
-        return filey.read(number)
-
-
-    def unpack_bytes(self, filey, fmt, number=None):
-        '''read AND unpack a number of bytes from an open file. If a 
-           format is provided, convert to utf-8 and return the string. 
-           If fmt is None, assume a character string of the same length.
+    def read_bytes(self, fd, offset, number):
+        '''read a number of bytes from an open file descriptor (or a 
+           reader) at an offset, without changing the file position.
 
            Parameters
            ==========
-           filey: an open file object
+           fd: an open file descriptor, or a reader (None for self.reader)
+           offset: the offset in the file to read from
            number: the number of bytes to read
-           fmt: an optional format string
         '''
-        byte_values = self.read_bytes(filey, fmt, number)
-        return unpack(fmt, byte_values)
+        if fd is None:
+            fd = self.reader
+        if not isinstance(fd, int):
+            return fd.pread(offset, number)
 
+        data = os.pread(fd, number, offset)
+        if self.stats is not None:
+            self.stats.add(reads=1, bytes=len(data))
+        return data
 
 
 ################################################################################
@@ -214,190 +225,496 @@ class SIFHeader:
 
             
     def load_header(self):
-        '''Once we know is sif, load the header.
+        '''load the header, checking for the SIF magic first. The global
+           header and descriptors are read with a single read (through
+           DataStartOffset), and the data objects with one read each. A
+           header from the cache only needs a stat of the image, and the
+           data objects are then read when they are requested.
         ''' 
+        if self._load_cached():
+            self._desc = self._load_desc()
+            return self.print_loaded()
+
+        with self.reader as reader:
 
-        # Start at end of interpreter line, and after sif magix
-        byte_start = self.base.HdrLaunchLen + self.base.HdrMagicLen
+            def read(offset, length, phase):
+                with self._phase(phase):
+                    return reader.pread(offset, length)
+
+            try:
+                decoded = decode_image(read, self.SIF)
+            except ValueError as e:
+                bot.exit('%s has a %s.' % (self.image, e))
+            if decoded is None:
+                bot.exit('%s is not a SIF file.' % self.image)
 
-        with open(self.image, 'rb') as filey:
+            # The full descriptor table, and the common descriptors
+            self._meta, self._descriptors = decoded
+            self._save_cached()
+            self._desc = self._load_desc(reader)
 
-            # Skip the first line
-            filey.seek(byte_start)
+        self.print_loaded()
 
-            # 1. Read the version
-            self.meta['version'] = self.unpack_chars(filey, 
-                                                     number=self.base.HdrVersionLen, 
-                                                     fmt = "%ss" % self.base.HdrVersionLen)
+    def print_loaded(self):
+        '''Update the user with what was loaded, if verbose
+        '''
+        if self.verbose is True:
 
-            # 2. Read the architecture
-            self.meta['arch'] = self.unpack_chars(filey, 
-                                                  number=self.base.HdrArchLen,
-                                                  fmt = "<%ss" % self.base.HdrArchLen)
+            # Payloads not read yet (e.g., from a cached header) are shown
+            pending = [d for d in self.desc.values() if d.loaders]
+            if pending:
+                with self.reader as reader:
+                    for descriptor in pending:
+                        descriptor.load(reader)
 
-            # 3. Read the uuid - this returns little endian bytes
-            uuid_bytes = self.read_bytes(filey, fmt='<16c')
+            bot.info('%s is a SIF file.' % self.image)
+            self.get_presenter().print_all()
 
-            # Let the uuid library read the binary data for us!
-            self.meta['uuid'] = str(uuid.UUID(bytes_le=uuid_bytes))
+################################################################################
+# Lazy Loading
+################################################################################
 
-            # 4. Read in the remaining Global header fields, 1 signed int
-            items = ['ctime', 
-                     'mtime', 
-                     'dfree',
-                     'dtotal',
-                     'descroff',
-                     'descrlen', 
-                     'dataoff', 
-                     'datalen']
+# Each of the global header, the descriptor table, and the legacy desc
+# dictionary is loaded on first access if load_header wasn't run. Payloads
+# (e.g., deffile content) are then only read when their key is requested.
 
-            for item in items:
-                self.meta[item] = self.unpack_bytes(filey, fmt='1q')[0]
+    @property
+    def meta(self):
+        '''the global header, from the cache or read (and checked for 
+           SIF magic) on demand
+        '''
+        if self._meta is None and not self._load_cached():
+            with self._phase('header'):
+                data = self._read(0, self.SIF.HeaderStruct.size)
+            if not has_magic(data, self.SIF):
+                bot.exit('%s is not a SIF file.' % self.image)
+            if len(data) < self.SIF.HeaderStruct.size:
+                bot.exit('%s has a truncated SIF header.' % self.image)
+            self._meta = decode_header(data, self.SIF)
+        return self._meta
+
+    @property
+    def descriptors(self):
+        '''the DescriptorTable, read with the descriptor region on demand
+        '''
+        if self._descriptors is None:
+            start, end = self._get_descriptor_region()
+            with self._phase('descriptors'):
+                data = self._read(start, end - start)
+            try:
+                self._descriptors = decode_descriptors(data, self.meta,
+                                                       self.SIF,
+                                                       data_offset=start)
+            except ValueError as e:
+                bot.exit('%s has a %s.' % (self.image, e))
+            self._save_cached()
+        return self._descriptors
+
+    @property
+    def desc(self):
+        '''the deffile, partition and signature descriptors, as dictionaries
+        '''
+        if self._desc is None:
+            self._desc = self._load_desc()
+        return self._desc
 
-            # Load the definition file descriptors
-            self.desc['deffile'] = self._load_deffile()
-            self.desc['partition'] = self._load_partition()
-            self.desc['signature'] = self._load_signature()
+    def _get_cache_key(self):
+        '''the cache key is based on a stat of the image, done once
+        '''
+        if not hasattr(self, '_cache_key'):
+            self._cache_key = self.cache.get_key(self.reader.local, 
+                                                 self.base.HdrVersion)
+        return self._cache_key
+
+    def _load_cached(self):
+        '''load the global header and descriptors from the cache, and 
+           return True if found.
+        '''
+        if self.cache is None:
+            return False
+        with self._phase('cache'):
+            cached = self.cache.get(self._get_cache_key(), self.SIF)
+        if cached is None:
+            return False
+        self._meta, self._descriptors = cached
+        return True
 
-        # Update the user with what was loaded
-        self.print_header()
-        self.print_arch()
-        self.print_descriptor_deffile() 
-        self.print_descriptor_partition()
-        self.print_descriptor_signature()
+    def _save_cached(self):
+        '''save the global header and descriptors to the cache
+        '''
+        if self.cache is not None:
+            self.cache.set(self._get_cache_key(), self._meta, self._descriptors)
 
-################################################################################
-# Descriptors
-################################################################################
+    def _get_descriptor_region(self):
+        '''return the start and end offsets of the descriptor region
+        '''
+        return get_descriptor_region(self.meta, self.SIF)
 
+    def _read(self, offset, number):
+        '''read a number of bytes at an offset of the image
+        '''
+        return self.reader.pread(offset, number)
 
-    def _load_deffile(self):
-        ''' load the header descriptor for the definition file. If a file
-            object is not provided, open. The fields and format string are 
-            provided via the self.Deffile object, which we get from 
-            self.header --> __init__.py --> get_structure() --> SIF
+    def _phase(self, name):
+        '''count the reads (and time) of a block for a phase (see 
+           sif.main.stats), if reads are counted.
+        '''
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.phase(name)
+
+    def get_local(self):
+        '''return the path (or open file descriptor) of a local image, 
+           needed to copy or hash data objects in the kernel or in a single
+           pass, or exit if the image isn't local (e.g., a url).
         '''
+        if self.reader.local is None:
+            bot.exit('%s is not a local file.' % self.image)
+        return self.reader.local
 
-        filey = open(self.image, 'rb')
+    def read_data(self, descriptor, fd=None):
+        '''read the data object for a descriptor, and return bytes.
 
-        # Read to the description offset
-        descriptors = dict()
-        filey.seek(self.meta['descroff'])
+           Parameters
+           ==========
+           descriptor: the descriptor (e.g., from self.descriptors)
+           fd: an optional open file descriptor (or reader) for the image
+        '''
+        with self._phase('data:%s' % descriptor['ID']):
+            return self.read_bytes(fd, descriptor['Fileoff'],
+                                   descriptor['Filelen'])
+
+    def get_deffile(self):
+        '''return the content of the definition file, or None if the image
+           doesn't have one.
+        '''
+        deffile = self.descriptors.first(self.Deffile.datatype)
+        if deffile is not None:
+            return self._decode_deffile(self.read_data(deffile))
 
-        # see sif.header module for the default fields and format strings
-        values = self.unpack_bytes(filey, self.Deffile.fmt)
-         
-        # Update the descriptors dictionary
-        for d in range(len(values)):
-            descriptors[self.Deffile.fields[d]] = values[d]
+################################################################################
+# Data Objects
+################################################################################
 
-        # Can we get a name (this seems wrong) - loads as "."
-        name = self.read_and_strip(filey, "%sc" % self.base.DescrNameLen)
-        extra = self.read_and_strip(filey, '%sc' % self.base.DescrMaxPrivLen)
+# The image can be mapped (read only) to get zero-copy memoryview slices of
+# data objects, e.g., to hash or scan a partition without reading it into
+# bytes. Views must be released before the header is closed.
 
-        descriptors['name'] = name
-        descriptors['extra'] = extra
+    def get_descriptor(self, descriptor):
+        '''get a descriptor from the table. The descriptor can be given
+           as a descriptor, an ID, or one of "deffile", "partition" or 
+           "signature" (as in self.desc).
 
-        # Save the location for the start of the partition
-        self.Partition.start = filey.tell()
+           Parameters
+           ==========
+           descriptor: the descriptor, ID, or name of a common descriptor
+        '''
+        if isinstance(descriptor, int):
+            found = self.descriptors.get(descriptor)
+        elif isinstance(descriptor, str):
+            found = self.desc.get(descriptor) or None
+        else:
+            found = descriptor
+
+        if found is None:
+            bot.exit('Cannot find descriptor %s in %s' % (descriptor, self.image))
+        return found
+
+    def mmap(self):
+        '''map the image (read only), once, and return the mmap. For an
+           image in memory, the buffer itself is returned.
+        '''
+        if self._mmap is None:
+            self._mmap = self.reader.get_buffer()
+        return self._mmap
 
-        # Definition File - offset should point us to the deffile    
-        filey.seek(descriptors['Fileoff'])
+    def get_view(self, descriptor):
+        '''return a zero-copy memoryview of the data object for a descriptor,
+           from the mapped image. The view should be released (or go out
+           of scope) before the header is closed.
 
-        # And the length is also provided
-        fmt = '%sc' % descriptors['Filelen']
-        number = calcsize(fmt)
-        deffile = filey.read(number)
+           Parameters
+           ==========
+           descriptor: the descriptor, ID, or name of a common descriptor
+        '''
+        descriptor = self.get_descriptor(descriptor)
+        mapped = self.mmap()
+        start = descriptor['Fileoff']
+        end = start + descriptor['Filelen']
+        if start < 0 or end > len(mapped):
+            bot.exit('Descriptor %s extends past the end of %s' % 
+                     (descriptor['ID'], self.image))
+        return memoryview(mapped)[start:end]
+
+    def get_squashfs(self, descriptor='partition', cache_size=1024,
+                     block_cache_size=32):
+        '''get a SquashFS (see sif.squashfs) for a squashfs partition, to
+           list, stat and read files in it without mounting or extracting it.
 
-        # Try to decode to utf-8 for the user
+           Parameters
+           ==========
+           descriptor: the descriptor, ID, or name of a common descriptor
+           cache_size: the number of decoded metadata blocks to keep
+           block_cache_size: the number of decompressed data blocks to keep
+        '''
+        from sif.squashfs import SquashFS
+        descriptor = self.get_descriptor(descriptor)
+        if descriptor.get('fstype') != 1:
+            bot.exit('Descriptor %s of %s is not a squashfs partition' %
+                     (descriptor['ID'], self.image))
+
+        # The files are read later, so their reads are counted for the data
+        reader = self.reader
+        if self.stats is not None:
+            reader = StatsReader(reader.reader, self.stats,
+                                 phase='data:%s' % descriptor['ID'])
         try:
-            deffile = deffile.decode('utf-8')
-        except:
-            pass
+            return SquashFS(reader, offset=descriptor['Fileoff'],
+                            length=descriptor['Filelen'],
+                            cache_size=cache_size,
+                            block_cache_size=block_cache_size)
+        except ValueError as e:
+            bot.exit(str(e))
+
+    def extract(self, descriptor, output):
+        '''extract the data object for a descriptor to a file, or to an open
+           file (e.g., sys.stdout.buffer) or file descriptor. The bytes are
+           copied in the kernel where possible (see sif.utils.copy_range).
+           Returns the number of bytes written.
 
-        descriptors['content'] = deffile
-        filey.close()
+           Parameters
+           ==========
+           descriptor: the descriptor, ID, or name of a common descriptor
+           output: the path, open file or file descriptor to write to
+        '''
+        descriptor = self.get_descriptor(descriptor)
+
+        if isinstance(output, int):
+            copied = self._copy(descriptor, output)
+        elif hasattr(output, 'fileno'):
+            output.flush()
+            copied = self._copy(descriptor, output.fileno())
+        else:
+            with open(output, 'wb') as filey:
+                copied = self._copy(descriptor, filey.fileno())
+
+        if copied != descriptor['Filelen']:
+            bot.exit('%s ended before the end of descriptor %s' % 
+                     (self.image, descriptor['ID']))
+        return copied
+
+    def _copy(self, descriptor, output, chunk_size=1024 * 1024):
+        '''copy the data object for a descriptor to an open file descriptor,
+           in the kernel for a local image, and otherwise in chunks.
+        '''
+        from sif.utils import copy_range
+        offset = descriptor['Fileoff']
+        length = descriptor['Filelen']
+
+        with self._phase('data:%s' % descriptor['ID']), self.reader as reader:
+            if reader.local is not None:
+                fd = reader.local if isinstance(reader.local, int) else reader.fd
+                copied = copy_range(fd, output, offset, length)
+                if self.stats is not None:
+                    self.stats.add(reads=1, bytes=copied)
+                return copied
+
+            copied = 0
+            while copied < length:
+                data = reader.pread(offset + copied, 
+                                    min(chunk_size, length - copied))
+                if not data:
+                    break
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(output, view):]
+                copied += len(data)
+            return copied
+
+    def get_digests(self, descriptor=None, algorithms=None):
+        '''compute one or more digests (e.g., md5, sha256, sha384, blake2b)
+           of the image, or the data object of a descriptor, in one pass.
+           Returns a dictionary of hex digests by algorithm.
 
-        return descriptors
+           Parameters
+           ==========
+           descriptor: the descriptor, ID, or name of a common descriptor,
+                       or None (default) for the whole image
+           algorithms: a list of hashlib algorithms (defaults to sha256)
+        '''
+        from sif.utils import get_digests
+        local = self.get_local()
+        if descriptor is None:
+            with self._phase('digests'):
+                self._count_file(0, self.reader.get_size())
+                return get_digests(local, algorithms)
+
+        descriptor = self.get_descriptor(descriptor)
+        with self._phase('data:%s' % descriptor['ID']):
+            self._count_file(descriptor['Fileoff'], descriptor['Filelen'])
+            return get_digests(local, algorithms, 
+                               offset=descriptor['Fileoff'],
+                               length=descriptor['Filelen'])
+
+    def verify(self, keyring=None, cache=True):
+        '''verify the signatures of the image, by streaming the signed data
+           objects through the declared hash, and (if a keyring file is
+           given) checking the OpenPGP signatures offline. Returns a list
+           of results, one per signature (see sif.main.verify.verify).
+
+           Parameters
+           ==========
+           keyring: an optional keyring file (gpg --export) to check signatures
+           cache: use the cache of verified results (default True)
+        '''
+        from sif.main.verify import verify
+        with self._phase('verify'):
+            return verify(self, keyring=keyring, cache=cache)
 
+    def _count_file(self, offset, length):
+        '''count a read of the image as a file (e.g., for digests), which
+           is one open, and one read of the bytes (see sif.main.stats)
+        '''
+        if self.stats is not None:
+            self.stats.add(opens=1, reads=1, bytes=length,
+                           seeks=int(offset != 0))
 
-    def _load_partition(self):
-        ''' load the paritition descriptor. We must get the start based on
-            first reading the deffile desciptor, which adds the location
-            to self.Parition.start. If we don't have this attribute, we need
-            to run it first (This should not happen in normal cases, as they
-            are called under one function, one after the other)
+    def get_all_digests(self, algorithms=None):
+        '''compute digests of the image and of the data object of each 
+           descriptor, with a single read of the image. Returns a dictionary
+           with "file" (digests by algorithm) and "descriptors" (digests by
+           algorithm, by descriptor ID).
+
+           Parameters
+           ==========
+           algorithms: a list of hashlib algorithms (defaults to sha256)
+        '''
+        from sif.utils import get_digests
+        ranges = dict((d['ID'], (d['Fileoff'], d['Filelen'])) 
+                      for d in self.descriptors)
+        local = self.get_local()
+        with self._phase('digests'):
+            self._count_file(0, self.reader.get_size())
+            digests = get_digests(local, algorithms, ranges=ranges)
+        return {'file': digests['file'], 'descriptors': digests['ranges']}
+
+    def close(self):
+        '''close the mapped image, if it was mapped, and the reader.
         '''
-        if not hasattr(self.Partition, 'start'):
-            self._load_deffile()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._mmap = None
+        self.reader.close()
 
-        filey = open(self.image, 'rb')
+################################################################################
+# Descriptors
+################################################################################
 
-        partition = dict()
-        filey.seek(self.Partition.start)
 
-        # see sif.header module for the default fields and format strings
-        values = self.unpack_bytes(filey, self.Deffile.fmt)
-         
-        # Update the descriptors dictionary
-        for d in range(len(values)):
-            partition[self.Partition.fields[d]] = values[d]
+    def get_partition(self):
+        '''get the primary system partition descriptor, or the first
+           partition if none is marked as primary.
+        '''
+        partitions = self.descriptors.get_datatype(self.Partition.datatype)
+        for partition in partitions:
+            if partition['partype'] == 2:
+                return partition
+        if partitions:
+            return partitions[0]
 
-        # squashfs-955608129.img
-        name = self.read_and_strip(filey, "%sc" % self.base.DescrNameLen)
-        partition['name'] = name
 
-        # partype and fstype might be part of extra?
-        fstype, partype = self.unpack_bytes(filey, "2i")
-        partition['fstype'] = fstype        
-        partition['partype'] = partype
+    def get_signatures(self, descriptor=None):
+        '''get the signature descriptors, optionally only those that
+           link to a descriptor (by ID or by its group).
 
-        # The remaining extra is the self.base.DescrMaxPrivLen - len(2i)
-        fmt = '%sc' % (self.base.DescrMaxPrivLen - calcsize('2i'))       
-        extra = self.read_and_strip(filey, fmt)
+           Parameters
+           ==========
+           descriptor: a descriptor that is signed
+        '''
+        signatures = self.descriptors.get_datatype(self.Signature.datatype)
+        if descriptor is None:
+            return signatures
+        links = [descriptor['ID'], descriptor['Groupid']]
+        return [s for s in signatures if s['Link'] in links]
 
-        partition['extra'] = extra
 
-        # Can we find the start of the signature?
-        self.Signature.start = filey.tell()
-        filey.close()
-        return partition
+    def _load_desc(self, fd=None):
+        '''load the deffile, partition and signature descriptors. If an open
+           file descriptor is provided, the payloads are read now, otherwise
+           they are read when requested.
 
+           Parameters
+           ==========
+           fd: an optional open file descriptor (or reader) for the image
+        '''
+        desc = {'deffile': self._load_deffile(),
+                'partition': self._load_partition(),
+                'signature': self._load_signature()}
 
-    def _load_signature(self):
-        '''finally, load the signature descriptor. We again get the start
-           based on loading the partition first.
+        if fd is not None:
+            for descriptor in desc.values():
+                descriptor.load(fd)
+        return desc
+
+
+    def _decode_deffile(self, deffile):
+        '''Try to decode the definition file to utf-8 for the user
+        '''
+        try:
+            return deffile.decode('utf-8')
+        except:
+            return deffile
+
+
+    def _load_deffile(self):
+        ''' load the descriptor for the definition file, and its content.
+            The fields and format string are provided via the
+            self.Deffile object, which we get from
+            self.header --> __init__.py --> get_structure() --> SIF
         '''
-        if not hasattr(self.Signature, 'start'):
-            self._load_partition()
+        found = self.descriptors.first(self.Deffile.datatype)
+        if found is None:
+            return LazyDescriptor()
+
+        descriptors = LazyDescriptor(found)
+        descriptors['extra'] = ''
 
-        filey = open(self.image, 'rb')
+        # Definition File - offset and length are provided
+        descriptors.add_loader('content', lambda fd: 
+            self._decode_deffile(self.read_data(found, fd)))
+        return descriptors
 
-        signature = dict()
-        filey.seek(self.Signature.start)
-        values = self.unpack_bytes(filey, self.Signature.fmt)
 
-        # If the first value is 0, the container isn't signed
-        if values[0] != 0:
+    def _load_partition(self):
+        ''' load the primary paritition descriptor. The fstype, partype
+            and arch are at the start of extra.
+        '''
+        found = self.get_partition()
+        if found is None:
+            return LazyDescriptor()
 
-            for d in range(len(values)):
-                signature[self.Signature.fields[d]] = values[d]
+        partition = LazyDescriptor(found)
+        partition['extra'] = partition.pop('arch')
+        return partition
 
-            # squashfs-955608129.img
-            name = self.read_and_strip(filey, "%sc" % self.base.DescrNameLen)
-            signature['name'] = name
-            hashtype, = self.unpack_bytes(filey, "i") # unpack tuple
 
-            # We need to parse the entity here (I don't know what that means)
-            # see self.base.DescEntityLen
+    def _load_signature(self):
+        '''finally, load the signature descriptor for the primary partition
+           (or the first signature), and the signature block.
+        '''
+        signatures = self.get_signatures(self.get_partition()) or \
+                     self.get_signatures()
 
-            # Go to the signature block, and retrieve it
-            filey.seek(signature['Fileoff'])
-            fmt = '%sc' % signature['Filelen']
-            signed = self.read_and_strip(filey, fmt)
+        if not signatures:
+            return LazyDescriptor()
 
-            signature['hastype'] = hashtype
-            signature['publicKey'] = signed
+        found = signatures[0]
+        signature = LazyDescriptor()
+        for key in self.Signature.fields + ['name']:
+            signature[key] = found[key]
+        signature['hastype'] = found['hashtype']
 
-        filey.close()
+        # The signature block is retrieved when requested
+        signature.add_loader('publicKey', lambda fd: 
+            strip_bytes(self.read_data(found, fd), self.base.EndChar))
         return signature
@@ -0,0 +1,77 @@
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+
+
+class HeaderInfo:
+    '''A HeaderInfo is the structured result of parsing a SIF header: the
+       path, the global header (meta), and the used descriptors. It doesn't
+       print anything, and can be serialized to a dictionary or JSON.
+    '''
+
+    def __init__(self, image, meta, descriptors, SIF=None):
+        self.image = image
+        self.meta = meta
+        self.descriptors = descriptors
+        self.SIF = SIF
+
+    def __str__(self):
+        return "<HeaderInfo:%s>" % self.image
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def arch(self):
+        return self.meta['arch']
+
+    @property
+    def uuid(self):
+        return self.meta['uuid']
+
+    @property
+    def arch_name(self):
+        '''the human friendly architecture, if known'''
+        if self.SIF is not None:
+            return self.SIF.arches.get(self.arch)
+
+    def get_datatype(self, datatype):
+        '''get the list of descriptors of a datatype, e.g., 0x4004 for
+           partitions.
+
+           Parameters
+           ==========
+           datatype: the Datatype of the descriptors
+        '''
+        return [d for d in self.descriptors if d['Datatype'] == datatype]
+
+    def to_dict(self):
+        '''return a dictionary with the image, meta and descriptors, which
+           can be serialized to JSON.
+        '''
+        return {'image': self.image,
+                'meta': dict(self.meta),
+                'descriptors': [dict(d) for d in self.descriptors]}
+
+    def to_json(self, indent=None):
+        '''serialize to JSON. Bytes that could not be decoded (e.g., a name)
+           are written as hex.
+
+           Parameters
+           ==========
+           indent: an optional indent, for pretty printing
+        '''
+        return json.dumps(self.to_dict(), indent=indent, default=to_json)
+
+
+def to_json(value):
+    '''a default for json.dumps, writing bytes as hex
+    '''
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError('%s is not JSON serializable' % type(value))
@@ -0,0 +1,363 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A manifest lists the files in the squashfs partition of an image: the
+# path, size, mode, owner, link target and device of each, and
+# (optionally) a digest of the content.
+# Manifests are read from the partition directly (see sif.squashfs), and
+# cached (see ManifestCache) by the identity of the image, so questions
+# like "which images have this libssl" are answered from the cache, and
+# only new or changed images are read again.
+#
+# The files of a manifest are stored as columns (a list of paths, a list
+# of sizes, and so on), which is much smaller than an entry for each.
+
+from sif.main.decode import decode_image
+from sif.main.readers import get_reader
+from sif.main.scan import ( find_files, sniff )
+from sif.header import get_structure
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait
+)
+import fnmatch
+import hashlib
+import os
+import re
+import stat
+
+# The version of the manifest format, part of the cache key
+MANIFEST_VERSION = "2"
+
+
+def get_patterns(digests):
+    '''normalize the files to compute digests of: None (no digests), True
+       (all files), or a glob or list of globs (e.g., "*.so*"), matched
+       against the path and the name. Returns None, or a sorted list.
+    '''
+    if digests is None or digests is False:
+        return None
+    if digests is True:
+        return ['*']
+    if isinstance(digests, str):
+        digests = [digests]
+    return sorted(set(digests))
+
+
+def compile_patterns(patterns):
+    '''compile a list of globs to one regular expression, or return None
+    '''
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns))
+
+
+def make_manifest(image, digests=None, algorithm='sha256'):
+    '''read the manifest of an image, from the squashfs partition. Returns
+       a dictionary with the image, and the paths, sizes, modes, uids,
+       gids, link targets, devices (rdev) and digests of the files (as
+       columns), or with an error if the partition can't
+       be read. An image without a squashfs partition has no files.
+
+       Parameters
+       ==========
+       image: the path to the image
+       digests: the files to compute digests of (see get_patterns)
+       algorithm: the hashlib algorithm of the digests
+    '''
+    from sif.squashfs import SquashFS
+
+    patterns = get_patterns(digests)
+    manifest = {'image': image, 'version': MANIFEST_VERSION,
+                'algorithm': algorithm, 'digests': patterns,
+                'paths': [], 'sizes': [], 'modes': [], 'uids': [],
+                'gids': [], 'targets': [], 'rdevs': [], 'hashes': []}
+
+    try:
+        with get_reader(image) as reader:
+            partition = get_partition(reader)
+            if partition is None or partition['fstype'] != 1:
+                return manifest
+
+            squashfs = SquashFS(reader, offset=partition['Fileoff'],
+                                length=partition['Filelen'])
+            with squashfs:
+                _add_files(manifest, squashfs, compile_patterns(patterns))
+
+    except Exception as e:
+        return {'image': image, 'version': MANIFEST_VERSION,
+                'error': '%s: %s' % (e.__class__.__name__, e)}
+    return manifest
+
+
+def get_partition(reader, version=None):
+    '''get the primary system partition descriptor of an image (see
+       SIFHeader.get_partition), or None. Unlike a SIFHeader, this doesn't
+       exit: an image that isn't a SIF (or is truncated) raises a ValueError.
+
+       Parameters
+       ==========
+       reader: the reader of the image (see sif.main.readers)
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+    '''
+    SIF = get_structure(version)
+    decoded = decode_image(lambda offset, length, phase:
+                           reader.pread(offset, length), SIF)
+    if decoded is None:
+        raise ValueError('%s is not a SIF image' % reader.name)
+
+    partitions = decoded[1].get_datatype(SIF.Partition.datatype)
+    for partition in partitions:
+        if partition['partype'] == 2:
+            return partition
+    if partitions:
+        return partitions[0]
+
+
+def _add_files(manifest, squashfs, regex=None):
+    '''add the files of a squashfs to a manifest, with a digest of each
+       regular file that matches the regular expression (by path or name).
+       A file with hard links is read once.
+    '''
+    from sif.squashfs.extract import walk_inodes
+
+    algorithm = manifest['algorithm']
+    hashed = dict()
+
+    for path, inode in walk_inodes(squashfs):
+        path = '/' + path
+        digest = None
+
+        if regex is not None and stat.S_ISREG(inode.mode) and \
+           (regex.match(path) or regex.match(os.path.basename(path))):
+            digest = hashed.get(inode.ref)
+            if digest is None:
+                digest = hashed[inode.ref] = get_digest(squashfs, inode,
+                                                         algorithm)
+
+        manifest['paths'].append(path)
+        manifest['sizes'].append(inode.size)
+        manifest['modes'].append(inode.mode)
+        manifest['uids'].append(inode.uid)
+        manifest['gids'].append(inode.gid)
+        manifest['targets'].append(inode.target)
+        manifest['rdevs'].append(inode.rdev)
+        manifest['hashes'].append(digest)
+
+
+def get_digest(squashfs, inode, algorithm='sha256', chunk_size=1024 * 1024):
+    '''compute the (hex) digest of the content of a file in a squashfs
+
+       Parameters
+       ==========
+       squashfs: the SquashFS with the file
+       inode: the inode of the file
+       algorithm: the hashlib algorithm
+    '''
+    from sif.squashfs.files import SquashFSFile
+    digest = hashlib.new(algorithm)
+    with SquashFSFile(squashfs, inode, '') as filey:
+        for chunk in iter(lambda: filey.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _covers(manifest, patterns, algorithm):
+    '''determine if a cached manifest has (at least) the digests we need.
+       A manifest with an error (cached by an older version) is read again.
+    '''
+    if 'error' in manifest:
+        return False
+    if patterns is None:
+        return True
+    if manifest.get('algorithm') != algorithm:
+        return False
+    return manifest.get('digests') in [patterns, ['*']]
+
+
+def get_manifest(image, digests=None, algorithm='sha256', cache=True):
+    '''get the manifest of an image (see make_manifest), from the cache if
+       the image hasn't changed (and the cached manifest has the digests),
+       otherwise it is read, and saved to the cache. A manifest with an
+       error (which can be transient, e.g., EIO) is not cached.
+
+       Parameters
+       ==========
+       image: the path to the image
+       digests: the files to compute digests of (see get_patterns)
+       algorithm: the hashlib algorithm of the digests
+       cache: use the cache of manifests (default True)
+    '''
+    patterns = get_patterns(digests)
+    if cache is not True:
+        return make_manifest(image, patterns, algorithm)
+
+    manifest = get_cached_manifest(image, patterns, algorithm)
+    if manifest is None:
+        manifest = make_manifest(image, patterns, algorithm)
+        if 'error' not in manifest:
+            _save_manifest(image, manifest)
+    return manifest
+
+
+def get_cached_manifest(image, digests=None, algorithm='sha256'):
+    '''get the manifest of an image from the cache, if the image hasn't
+       changed and the cached manifest has the digests, or None.
+
+       Parameters
+       ==========
+       image: the path to the image
+       digests: the files that need digests (see get_patterns)
+       algorithm: the hashlib algorithm of the digests
+    '''
+    from sif.main.cache import get_manifest_cache
+    cache = get_manifest_cache()
+    manifest = cache.load(_get_key(cache, image))
+    if manifest is not None and _covers(manifest, get_patterns(digests),
+                                        algorithm):
+        manifest['image'] = image
+        return manifest
+
+
+def _save_manifest(image, manifest):
+    from sif.main.cache import get_manifest_cache
+    cache = get_manifest_cache()
+    cache.save(_get_key(cache, image), manifest)
+
+
+def _get_key(cache, image):
+    try:
+        return cache.get_key(image, 'v%s' % MANIFEST_VERSION)
+    except OSError:
+        return None
+
+
+def search(manifest, path=None, digest=None):
+    '''search a manifest for files that match a path glob (e.g.,
+       "*/libssl.so*", matched against the path and the name) and/or a
+       digest, and return a list of dictionaries with the path, size,
+       mode and digest of each.
+
+       Parameters
+       ==========
+       manifest: the manifest, e.g., from get_manifest
+       path: a glob of the paths to find
+       digest: the digest (hex) of the files to find
+    '''
+    if 'error' in manifest:
+        return []
+
+    paths = manifest['paths']
+    hashes = manifest['hashes']
+
+    # A digest is a (fast) list search, and a glob a regular expression
+    if digest is not None:
+        digest = digest.lower()
+        indices = [i for i, value in enumerate(hashes) if value == digest]
+    else:
+        indices = range(len(paths))
+
+    if path is not None:
+        regex = compile_patterns([path])
+        indices = [i for i in indices if regex.match(paths[i]) or
+                   regex.match(paths[i].rpartition('/')[2])]
+
+    return [{'path': paths[i], 'size': manifest['sizes'][i],
+             'mode': manifest['modes'][i], 'digest': hashes[i]}
+            for i in indices]
+
+
+def query_image(image, path=None, digest=None, digests=None,
+                algorithm='sha256', version=None):
+    '''get the manifest of an image (from the cache, or read it), and
+       search it. Returns a dictionary with the image and the matches (or
+       an error), or None if the image isn't a SIF.
+    '''
+    fd = os.open(image, os.O_RDONLY)
+    try:
+        if not sniff(fd, get_structure(version)):
+            return None
+    finally:
+        os.close(fd)
+
+    # To find a digest, the manifest needs digests (of all files, by default)
+    if digest is not None and digests is None:
+        digests = True
+
+    manifest = get_manifest(image, digests, algorithm)
+    if 'error' in manifest:
+        return {'image': image, 'error': manifest['error']}
+    return {'image': image, 'matches': search(manifest, path, digest)}
+
+
+def query(paths, path=None, digest=None, digests=None, algorithm='sha256',
+          workers=None, processes=False, version=None, follow_symlinks=False):
+    '''find the images (under one or more paths) with files that match a
+       path glob and/or a digest, e.g., query('/shared/images',
+       path='libssl.so*'). Manifests are built for new or changed images
+       only (in a pool of workers), and otherwise read from the cache.
+       Yields a result (see query_image) for each image with matches, or
+       an error.
+
+       Parameters
+       ==========
+       paths: a path, or list of paths (files or directories) to search
+       path: a glob of the paths to find
+       digest: the digest (hex) of the files to find
+       digests: the files to compute digests of, when reading a manifest
+                (see get_patterns, all files if a digest is given)
+       algorithm: the hashlib algorithm of the digests
+       workers: the number of workers (defaults to the number of cpus)
+       processes: use a pool of processes instead of threads
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+       follow_symlinks: follow symbolic links to files and directories
+    '''
+    workers = workers or os.cpu_count() or 1
+    Executor = ThreadPoolExecutor
+    if processes is True:
+        Executor = ProcessPoolExecutor
+
+    files = find_files(paths, follow_symlinks=follow_symlinks)
+    limit = workers * 4
+
+    # The image of each future, to report an error for it
+    images = dict()
+    with Executor(max_workers=workers) as executor:
+        pending = set()
+        for image in files:
+            future = executor.submit(query_image, image, path, digest,
+                                     digests, algorithm, version)
+            images[future] = image
+            pending.add(future)
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for result in _get_matches(done, images):
+                    yield result
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for result in _get_matches(done, images):
+                yield result
+
+
+def _get_matches(futures, images):
+    '''yield the results of finished futures with matches (or an error).
+       An image that can't be opened is skipped, and any other failure is
+       an error for that image, so one image doesn't stop the query.
+    '''
+    for future in futures:
+        image = images.pop(future)
+        try:
+            result = future.result()
+        except OSError:
+            continue
+        except Exception as e:
+            result = {'image': image,
+                      'error': '%s: %s' % (e.__class__.__name__, e)}
+        if result is not None and (result.get('matches') or 'error' in result):
+            yield result
@@ -0,0 +1,77 @@
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+
+
+class HeaderPresenter:
+    '''A HeaderPresenter prints a SIFHeader for the user to see. Parsing
+       doesn't print anything, so printing is only done (and paid for)
+       when a presenter is asked to.
+    '''
+
+    def __init__(self, header):
+        self.header = header
+
+    def __str__(self):
+        return "<HeaderPresenter:%s>" % self.header.image
+
+    def __repr__(self):
+        return self.__str__()
+
+    def print_all(self):
+        '''print the global header, architecture and common descriptors
+        '''
+        self.print_header()
+        self.print_arch()
+        self.print_descriptor('deffile', 'content')
+        self.print_descriptor('partition')
+        self.print_descriptor('signature')
+
+    def print_header(self):
+        '''print the metadata for the user to see
+        '''
+        for key, val in self.header.meta.items():
+            bot.info('SIF Header %s %s' % (key, val) )
+        bot.newline()
+
+    def print_descriptor(self, descriptor, skip_keys=None):
+        '''print the definition file metadata for the user to see
+
+           Parameters
+           ==========
+           name: the key in self.desc to iterate over
+           skip_keys: skip these keys in self.desc[key]
+        '''
+        if skip_keys == None:
+            skip_keys = []
+
+        if not isinstance(skip_keys, list):
+            skip_keys = [skip_keys]
+
+        desc = self.header.desc
+        if descriptor in desc:
+            name = descriptor.capitalize()
+            for key, val in desc[descriptor].items():
+                if key not in skip_keys:
+                    bot.info('%s %s %s' % (name, key, val) )
+        bot.newline()
+
+    def print_deffile(self):
+        '''print the definition file for the user to see
+        '''
+        deffile = self.header.get_deffile()
+        if deffile is not None:
+            print(deffile)
+
+    def print_arch(self):
+        '''print the human friendly architecture'''
+        meta = self.header.meta
+        if 'arch' in meta:
+            if meta['arch'] in self.header.arches:
+                bot.info('Architecture: %s' % self.header.arches[meta['arch']])
+            bot.newline()
@@ -0,0 +1,251 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A reader is a source of bytes for an image, with pread(offset, length).
+# Parsing a header only needs a few small reads at the start of the image,
+# so an image can be read from a local file, an open file descriptor,
+# bytes in memory, or a server that supports HTTP Range requests, without
+# reading (or downloading) the rest of it.
+
+from sif.logger import bot
+import http.client
+import mmap
+import os
+import urllib.parse
+
+
+def get_reader(image):
+    '''get a reader for an image, which can be a path, an http(s) url,
+       an open file descriptor, bytes (or another buffer), or a reader.
+
+       Parameters
+       ==========
+       image: the image to read
+    '''
+    if isinstance(image, Reader):
+        return image
+    if isinstance(image, int):
+        return FdReader(image)
+    if isinstance(image, (bytes, bytearray, memoryview, mmap.mmap)):
+        return BytesReader(image)
+    if is_url(image):
+        return HTTPReader(image)
+    return FileReader(image)
+
+
+def is_url(image):
+    '''determine if an image is given as an http(s) url
+    '''
+    return isinstance(image, str) and image.startswith(('http://', 'https://'))
+
+
+class Reader:
+    '''A Reader reads bytes from an image at an offset. Used as a context
+       manager, any resources (e.g., an open file) are held for all reads
+       in the block. local is the path or file descriptor of a local image
+       (for os.stat or open), or None.
+    '''
+    name = 'reader'
+    local = None
+
+    def __str__(self):
+        return "<%s:%s>" % (self.__class__.__name__, self.name)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def pread(self, offset, length):
+        '''read up to length bytes at offset (fewer at the end of the image)
+        '''
+        raise NotImplementedError
+
+    def get_size(self):
+        '''return the size of the image in bytes
+        '''
+        raise NotImplementedError
+
+    def get_buffer(self):
+        '''return a buffer (e.g., a read only mmap) with the whole image,
+           to take zero-copy views of. Not all readers can.
+        '''
+        bot.exit('%s cannot be mapped, it is not a local file.' % self.name)
+
+    def close(self):
+        '''release any resources held by the reader
+        '''
+        pass
+
+
+class FileReader(Reader):
+    '''A FileReader reads from an image on disk. The file is opened for
+       each read, or once for all reads in a with block.
+    '''
+
+    def __init__(self, path):
+        self.name = self.local = path
+        self.fd = None
+        self.depth = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.fd = os.open(self.name, os.O_RDONLY)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if self.depth == 0:
+            os.close(self.fd)
+            self.fd = None
+
+    def pread(self, offset, length):
+        with self:
+            return os.pread(self.fd, length, offset)
+
+    def get_size(self):
+        return os.stat(self.name).st_size
+
+    def get_buffer(self):
+        with self:
+            return mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+
+
+class FdReader(Reader):
+    '''An FdReader reads from a file descriptor that is already open, and
+       is not closed by the reader.
+    '''
+
+    def __init__(self, fd):
+        self.name = '<fd:%s>' % fd
+        self.fd = self.local = fd
+
+    def pread(self, offset, length):
+        return os.pread(self.fd, length, offset)
+
+    def get_size(self):
+        return os.fstat(self.fd).st_size
+
+    def get_buffer(self):
+        return mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+
+
+class BytesReader(Reader):
+    '''A BytesReader reads from an image in memory, e.g., bytes or an mmap.
+    '''
+
+    def __init__(self, data, name='<bytes>'):
+        self.name = name
+        self.data = memoryview(data)
+
+    def pread(self, offset, length):
+        return bytes(self.data[offset:offset + length])
+
+    def get_size(self):
+        return len(self.data)
+
+    def get_buffer(self):
+        return self.data
+
+
+class HTTPReader(Reader):
+    '''An HTTPReader reads from an image on a server that supports HTTP
+       Range requests, with one (persistent) connection. The first
+       readahead bytes are fetched with the first read that needs them
+       and kept, so parsing the header (a check of the magic, then the
+       header and descriptors) is one request.
+
+       Parameters
+       ==========
+       url: the http(s) url of the image
+       headers: extra headers for each request (e.g., Authorization)
+       readahead: the number of bytes to fetch (and keep) from the start
+       timeout: the timeout for the connection, in seconds
+    '''
+
+    def __init__(self, url, headers=None, readahead=32768, timeout=30):
+        self.name = url
+        self.url = urllib.parse.urlsplit(url)
+        self.headers = headers or {}
+        self.readahead = readahead
+        self.timeout = timeout
+        self.connection = None
+        self.size = None
+        self.start = None
+
+    def pread(self, offset, length):
+        if length <= 0:
+            return b''
+
+        # Reads from the start of the image are served from the readahead
+        if offset + length <= self.readahead:
+            if self.start is None:
+                self.start = self._request(0, self.readahead)
+            return self.start[offset:offset + length]
+        return self._request(offset, length)
+
+    def get_size(self):
+        if self.size is None:
+            self.pread(0, 1)
+        return self.size
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _connect(self):
+        Connection = http.client.HTTPConnection
+        if self.url.scheme == 'https':
+            Connection = http.client.HTTPSConnection
+        return Connection(self.url.netloc, timeout=self.timeout)
+
+    def _request(self, offset, length):
+        '''request a range, and return the bytes. If the (persistent)
+           connection was closed by the server, we connect again once.
+        '''
+        path = self.url.path or '/'
+        if self.url.query:
+            path = '%s?%s' % (path, self.url.query)
+
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%s-%s' % (offset, offset + length - 1)
+
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self._connect()
+            try:
+                self.connection.request('GET', path, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt == 1:
+                    raise
+
+        # Past the end of the image
+        if response.status == 416:
+            return b''
+
+        if response.status == 200:
+            self.close()
+            raise OSError('%s does not support range requests' % self.name)
+
+        if response.status != 206:
+            raise OSError('%s returned HTTP %s' % (self.name, response.status))
+
+        # Content-Range is bytes start-end/size
+        content_range = response.getheader('Content-Range', '')
+        size = content_range.rpartition('/')[2]
+        if size.isdigit():
+            self.size = int(size)
+        return data
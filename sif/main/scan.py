@@ -0,0 +1,244 @@
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# The scanner finds SIF images under one or more paths, and parses their
+# headers in a pool of workers, with the same decoding (and cache of parsed
+# headers) as SIFHeader. Unlike SIFHeader, a file that can't be read or
+# parsed is reported in its result, and does not exit.
+
+from sif.main.decode import ( decode_image, has_magic )
+from sif.main.info import ( HeaderInfo, to_json )
+from sif.main.stats import ( enable, get_stats, is_enabled, new_stats )
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait
+)
+import json
+import os
+
+
+def find_files(paths, follow_symlinks=False):
+    '''find_files walks one or more paths with os.scandir, and yields
+       the path of each regular file found. A path that is a file is
+       yielded as is. When following symbolic links, each directory
+       (by device and inode) is walked once, so a link to a parent
+       directory doesn't loop.
+
+       Parameters
+       ==========
+       paths: a path, or list of paths (files or directories)
+       follow_symlinks: follow symbolic links to files and directories
+    '''
+    if not isinstance(paths, (list, tuple)):
+        paths = [paths]
+
+    visited = set()
+    stack = []
+    for path in paths:
+        if os.path.isdir(path):
+            stack.append(path)
+        elif os.path.isfile(path):
+            yield path
+
+    while stack:
+        path = stack.pop()
+        try:
+            if follow_symlinks:
+                st = os.stat(path)
+                if (st.st_dev, st.st_ino) in visited:
+                    continue
+                visited.add((st.st_dev, st.st_ino))
+            entries = os.scandir(path)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=follow_symlinks):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=follow_symlinks):
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def sniff(fd, SIF):
+    '''determine if an open file is a SIF, with one small read of the
+       interpreter line and SIF_MAGIC.
+
+       Parameters
+       ==========
+       fd: an open file descriptor
+       SIF: the structure from sif.header.get_structure
+    '''
+    length = SIF.HeaderBase.HdrLaunchLen + SIF.HeaderBase.HdrMagicLen
+    return has_magic(os.pread(fd, length, 0), SIF)
+
+
+def scan_image(path, version=None, cache=True):
+    '''scan a single image, and return a dictionary with the image, and the
+       global header (meta) and descriptors if it is a SIF (see HeaderInfo
+       to_dict). If the file is not a SIF, None is returned, and if it
+       can't be read or parsed, the error is included in the result.
+
+       Parameters
+       ==========
+       path: the path to the image
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+       cache: use the cache of parsed headers (see HeaderCache)
+    '''
+    from sif.header import get_structure
+    SIF = get_structure(version)
+
+    # Reads are counted (see sif.main.stats) if I/O accounting is on
+    stats = new_stats(path)
+
+    try:
+        header_cache = key = None
+        if cache is True:
+            from sif.main.cache import get_header_cache
+            header_cache = get_header_cache()
+            key = header_cache.get_key(path, SIF.HeaderBase.HdrVersion)
+            decoded = _get_cached(header_cache, key, SIF, stats)
+            if decoded is not None:
+                return HeaderInfo(path, decoded[0], list(decoded[1])).to_dict()
+
+        if stats is not None:
+            stats.add('magic', opens=1)
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            length = SIF.HeaderBase.HdrLaunchLen + SIF.HeaderBase.HdrMagicLen
+            if not has_magic(_read(fd, length, 0, stats, 'magic'), SIF):
+                return None
+
+            decoded = decode_image(lambda offset, length, phase: 
+                                   _read(fd, length, offset, stats, phase), SIF)
+        finally:
+            os.close(fd)
+
+        if decoded is None:
+            return None
+        if header_cache is not None:
+            header_cache.set(key, *decoded)
+        return HeaderInfo(path, decoded[0], list(decoded[1])).to_dict()
+
+    except Exception as e:
+        return {'image': path, 'error': '%s: %s' % (e.__class__.__name__, e)}
+
+
+def _get_cached(header_cache, key, SIF, stats=None):
+    '''get a parsed header from the cache, counted as the cache phase
+    '''
+    if stats is None:
+        return header_cache.get(key, SIF)
+    with stats.phase('cache'):
+        return header_cache.get(key, SIF)
+
+
+def _read(fd, length, offset, stats=None, phase=None):
+    '''read from an open file, and count the read for a phase, if reads
+       are counted (see sif.main.stats)
+    '''
+    if stats is None:
+        return os.pread(fd, length, offset)
+    with stats.phase(phase):
+        data = os.pread(fd, length, offset)
+        stats.add(reads=1, bytes=len(data))
+    return data
+
+
+def scan(paths, workers=None, processes=False, version=None,
+         follow_symlinks=False, cache=True):
+    '''scan one or more paths for SIF images, and yield a result (see
+       scan_image) for each image as it finishes. Non SIF files are skipped.
+       To keep memory bounded for large trees, only a few tasks per worker
+       are submitted at once.
+
+       Parameters
+       ==========
+       paths: a path, or list of paths (files or directories) to scan
+       workers: the number of workers (defaults to the number of cpus)
+       processes: use a pool of processes instead of threads
+       version: the SIF version to parse with (defaults to SIF_VERSION)
+       follow_symlinks: follow symbolic links to files and directories
+       cache: use the cache of parsed headers (see HeaderCache)
+    '''
+    workers = workers or os.cpu_count() or 1
+    Executor = ThreadPoolExecutor
+    task = (scan_image,)
+    if processes is True:
+        Executor = ProcessPoolExecutor
+        task = (_scan_process, is_enabled())
+
+    files = find_files(paths, follow_symlinks=follow_symlinks)
+    limit = workers * 4
+
+    with Executor(max_workers=workers) as executor:
+        pending = set()
+        for path in files:
+            pending.add(executor.submit(task[0], path, version, cache,
+                                        *task[1:]))
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for result in _get_results(done, processes):
+                    yield result
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for result in _get_results(done, processes):
+                yield result
+
+
+def _scan_process(path, version=None, cache=True, stats=False):
+    '''scan an image in a worker process, and return the result and the
+       I/O counts of the scan (by phase, or None if accounting is off),
+       which would otherwise stay in the aggregate of the worker.
+    '''
+    if not stats:
+        return scan_image(path, version, cache), None
+
+    enable(True)
+    aggregate = get_stats()
+    aggregate.reset()
+    result = scan_image(path, version, cache)
+    return result, aggregate.to_dict()['phases']
+
+
+def _get_results(futures, processes=False):
+    '''yield the results of finished futures, skipping non SIF files. The
+       I/O counts of a worker process are added to the aggregate here.
+    '''
+    for future in futures:
+        result = future.result()
+        if processes is True:
+            result, phases = result
+            for phase, counts in (phases or {}).items():
+                get_stats().add(phase, **counts)
+        if result is not None:
+            yield result
+
+
+def write_jsonl(results, stream):
+    '''write each result as one line of JSON to a stream, flushing each
+       so the output can be followed while the scan runs. Returns the
+       number of results written.
+
+       Parameters
+       ==========
+       results: an iterable of results, e.g., from scan
+       stream: an open stream to write to
+    '''
+    count = 0
+    for result in results:
+        stream.write(json.dumps(result, default=to_json) + '\n')
+        stream.flush()
+        count += 1
+    return count
@@ -0,0 +1,218 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# I/O accounting is opt-in (SIFHeader(image, stats=True), enable(), or
+# SIF_IO_STATS=yes). The reader of a header is then wrapped in a StatsReader
+# that counts opens, seeks and reads, and the bytes read, for the phase the
+# header is in: the check of the magic, the global header, the descriptor
+# table, a cached header, or the data object of a descriptor (data:ID).
+# Each phase also has the (wall) time spent in it. The counts of each
+# header are added to an aggregate for the process (see get_stats), where
+# the data objects of all descriptors are one phase (data).
+#
+# A seek is a read that doesn't start where the last one ended. Data that
+# is copied in the kernel (e.g., extract) is counted as one read, and
+# digests (computed on the file) as one open and one read, with the bytes.
+
+from sif.main.readers import ( FileReader, Reader )
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+
+FIELDS = ['opens', 'seeks', 'reads', 'bytes', 'seconds']
+
+
+class IOStats:
+    '''IOStats are counts of opens, seeks, reads and bytes read, and the
+       wall time, by phase, for a header (or in aggregate). The counts of
+       a child are also added to its parent.
+
+       Parameters
+       ==========
+       name: the name (e.g., the image) the counts are for
+       parent: the IOStats to also add the counts to (e.g., the aggregate)
+    '''
+
+    def __init__(self, name=None, parent=None):
+        self.name = name
+        self.parent = parent
+        self.phases = OrderedDict()
+        self.current = 'other'
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return "<IOStats:%s>" % self.name
+
+    def __repr__(self):
+        return self.__str__()
+
+    def add(self, phase=None, **counts):
+        '''add counts (e.g., reads=1, bytes=4096) to a phase, by default
+           the current one.
+        '''
+        phase = phase or self.current
+        with self.lock:
+            entry = self.phases.get(phase)
+            if entry is None:
+                entry = self.phases[phase] = dict.fromkeys(FIELDS, 0)
+            for key, value in counts.items():
+                entry[key] += value
+
+        if self.parent is not None:
+            self.parent.add(phase.split(':')[0], **counts)
+
+    @contextmanager
+    def phase(self, name):
+        '''count the reads in a block for a phase, and the time spent in it.
+           The time of a phase includes any phase in it.
+        '''
+        previous = self.current
+        self.current = name
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.current = previous
+            self.add(name, seconds=time.perf_counter() - start)
+
+    def get_total(self):
+        '''return the sum of the counts of all phases
+        '''
+        total = dict.fromkeys(FIELDS, 0)
+        with self.lock:
+            for entry in self.phases.values():
+                for key in FIELDS:
+                    total[key] += entry[key]
+        return total
+
+    def to_dict(self):
+        '''return the counts by phase, and the total
+        '''
+        with self.lock:
+            phases = OrderedDict((phase, dict(entry)) for phase, entry
+                                 in self.phases.items())
+        return {'name': self.name, 'phases': phases, 'total': self.get_total()}
+
+    def reset(self):
+        '''remove all counts
+        '''
+        with self.lock:
+            self.phases.clear()
+
+    def format(self):
+        '''return the counts as a table, a line for each phase, and the total
+        '''
+        lines = ['%-14s %8s %8s %8s %12s %10s' % ('phase', 'opens', 'seeks',
+                 'reads', 'bytes', 'seconds')]
+        rows = list(self.to_dict()['phases'].items())
+        rows.append(('total', self.get_total()))
+        for phase, entry in rows:
+            lines.append('%-14s %8s %8s %8s %12s %10.6f' % (phase,
+                         entry['opens'], entry['seeks'], entry['reads'],
+                         entry['bytes'], entry['seconds']))
+        return '\n'.join(lines)
+
+
+class StatsReader(Reader):
+    '''A StatsReader wraps a reader, and counts its opens, seeks and reads
+       (and the bytes read) in an IOStats. Only a FileReader opens a file,
+       once for each read, or once for all reads in a with block.
+
+       Parameters
+       ==========
+       reader: the reader to wrap
+       stats: the IOStats to count in
+       phase: a phase to count all reads (and their time) in, e.g., for a
+              data object that is read later (defaults to the current)
+    '''
+
+    def __init__(self, reader, stats, phase=None):
+        self.reader = reader
+        self.stats = stats
+        self.phase = phase
+        self.name = reader.name
+        self.local = reader.local
+        self.position = None
+        self.opened = False
+
+    @property
+    def fd(self):
+        return self.reader.fd
+
+    def _will_open(self):
+        return isinstance(self.reader, FileReader) and self.reader.depth == 0
+
+    # The open of a with block is counted with its first read, in its phase
+    def __enter__(self):
+        if self._will_open():
+            self.opened = True
+        self.reader.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.reader.__exit__(*args)
+        if self.opened and self._will_open():
+            self.stats.add(self.phase, opens=1)
+            self.opened = False
+
+    def pread(self, offset, length):
+        opens = int(self._will_open() or self.opened)
+        self.opened = False
+        start = time.perf_counter()
+        data = self.reader.pread(offset, length)
+        counts = {'opens': opens, 'reads': 1, 'bytes': len(data),
+                  'seeks': int(self.position is not None and
+                               offset != self.position)}
+        if self.phase is not None:
+            counts['seconds'] = time.perf_counter() - start
+        self.stats.add(self.phase, **counts)
+        self.position = offset + len(data)
+        return data
+
+    def get_size(self):
+        return self.reader.get_size()
+
+    def get_buffer(self):
+        return self.reader.get_buffer()
+
+    def close(self):
+        self.reader.close()
+
+
+# The aggregate of all headers (and scans) in this process
+_stats = IOStats('all')
+_enabled = None
+
+
+def get_stats():
+    '''get the aggregate IOStats of this process
+    '''
+    return _stats
+
+
+def enable(enabled=True):
+    '''turn I/O accounting on (or off) for new headers in this process
+    '''
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    '''determine if I/O accounting is on, by default from SIF_IO_STATS
+    '''
+    if _enabled is None:
+        from sif.defaults import SIF_IO_STATS
+        return SIF_IO_STATS
+    return _enabled
+
+
+def new_stats(name):
+    '''return a new IOStats for a header (or scan), that adds to the
+       aggregate, or None if I/O accounting is off.
+    '''
+    if is_enabled():
+        return IOStats(name, parent=_stats)
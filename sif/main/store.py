@@ -0,0 +1,436 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A cache of images is often many rebuilds of the same base, which differ
+# in a few files. A ChunkStore splits the data objects of each image into
+# content-defined chunks, and stores each unique chunk once (by its
+# sha256), with a recipe (the list of chunks) to rebuild the image. A chunk
+# ends where the rolling sum of a (fixed, random) value for each of the
+# last WINDOW bytes has its low bits set, so boundaries depend only on the
+# bytes around them: a changed or inserted file only changes the chunks
+# around it, and the rest (e.g., the same squashfs blocks, at another
+# offset) are found again. The sum is vectorized with NumPy if it is
+# installed, and otherwise computed byte by byte, with the same chunks.
+
+from sif.logger import bot
+from sif.main.cache import _FileLock
+from sif.main.writer import preallocate
+from sif.utils import ( get_cache, mkdir_p )
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The bytes of the rolling sum, and the (smallest, largest) chunk sizes
+WINDOW = 64
+MIN_SIZE = 64 * 1024
+MAX_SIZE = 1024 * 1024
+
+# A boundary is where the low MASK_BITS of the sum are set (after MIN_SIZE)
+MASK_BITS = 18
+
+# The bytes read at once from an image, and searched at once with NumPy
+READ_SIZE = 8 * 1024 * 1024
+SCAN_SIZE = 128 * 1024
+
+# The value of each byte, from sha256 so it never changes between versions
+TABLE = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], 'little')
+         for i in range(256)]
+
+
+def find_boundary(data, min_size=MIN_SIZE, max_size=MAX_SIZE, bits=MASK_BITS):
+    '''find the length of the chunk at the start of data (a buffer): the
+       first position from min_size where the low bits of the sum of the
+       last WINDOW bytes are set, or max_size (or the length of the data).
+
+       Parameters
+       ==========
+       data: the data (e.g., a memoryview) from the start of the chunk
+       min_size: the smallest chunk (at least WINDOW)
+       max_size: the largest chunk
+       bits: the number of bits to match (the average is 2**bits after min)
+    '''
+    end = min(len(data), max_size)
+    if end <= min_size:
+        return end
+
+    mask = (1 << bits) - 1
+    if np is None:
+        return _find_boundary(data, min_size, end, mask)
+    return _find_boundary_numpy(data, min_size, end, mask)
+
+
+def _find_boundary(data, start, end, mask):
+    '''find a boundary between start and end, one byte at a time
+    '''
+    table = TABLE
+    total = sum(table[byte] for byte in data[start - WINDOW:start])
+    if total & mask == mask:
+        return start
+
+    for position in range(start, end):
+        total += table[data[position]] - table[data[position - WINDOW]]
+        if total & mask == mask:
+            return position + 1
+    return end
+
+
+def _find_boundary_numpy(data, start, end, mask):
+    '''find a boundary between start and end, SCAN_SIZE bytes at a time. The
+       sums of windows are differences of a cumulative sum, which (with
+       unsigned wrap around) has the same low bits as the sums.
+    '''
+    view = np.frombuffer(data, dtype=np.uint8)
+    table = np.array(TABLE, dtype=np.uint32)
+
+    position = start
+    while position <= end:
+        stop = min(end, position + SCAN_SIZE - 1)
+        values = table[view[position - WINDOW:stop]]
+        sums = np.zeros(len(values) + 1, dtype=np.uint32)
+        np.cumsum(values, dtype=np.uint32, out=sums[1:])
+
+        # windows[i] is the sum of the WINDOW bytes before position + i
+        windows = sums[WINDOW:] - sums[:-WINDOW]
+        found = np.flatnonzero((windows & mask) == mask)
+        if found.size:
+            return position + int(found[0])
+        position = stop + 1
+    return end
+
+
+def get_chunks(fd, offset, length, min_size=MIN_SIZE, max_size=MAX_SIZE,
+               bits=MASK_BITS):
+    '''yield the content-defined chunks (as memoryviews) of a range of an
+       open file, read READ_SIZE bytes at a time.
+
+       Parameters
+       ==========
+       fd: the file descriptor to read from
+       offset: the start of the range
+       length: the length of the range
+       min_size: the smallest chunk
+       max_size: the largest chunk
+       bits: the number of bits to match (see find_boundary)
+    '''
+    buffer = b''
+    start = 0
+    end = offset + length
+    while start < len(buffer) or offset < end:
+
+        # A chunk is only found with at least max_size bytes (or the rest)
+        if len(buffer) - start < max_size and offset < end:
+            data = os.pread(fd, min(READ_SIZE, end - offset), offset)
+            if not data:
+                bot.exit('Unexpected end of file at %s' % offset)
+            buffer = buffer[start:] + data
+            start = 0
+            offset += len(data)
+            continue
+
+        view = memoryview(buffer)[start:]
+        size = find_boundary(view, min_size, max_size, bits)
+        yield view[:size]
+        start += size
+
+
+def get_ranges(header, size):
+    '''split an image into the ranges to chunk: the header (and descriptor
+       table), each data object, and any space between, so a chunk never
+       spans two data objects. Returns a list of (offset, length).
+    '''
+    offsets = set([0, size])
+    for descriptor in header.descriptors:
+        for offset in [descriptor['Fileoff'],
+                       descriptor['Fileoff'] + descriptor['Filelen']]:
+            offsets.add(min(max(offset, 0), size))
+
+    offsets = sorted(offsets)
+    return [(first, last - first) for first, last in zip(offsets, offsets[1:])]
+
+
+def get_names(recipe):
+    '''return the names of an image in the store (a recipe written by an
+       older version has one name)
+    '''
+    return recipe.get('names') or [recipe['name']]
+
+
+class ChunkStore:
+    '''A ChunkStore stores images as content-defined chunks (see
+       get_chunks), in a subfolder of the Singularity cache, and rebuilds
+       them byte for byte. Chunks are under chunks/, by sha256, and the
+       recipe of each image under images/, by the sha256 of the image, with
+       the names it was added as. Adding and restoring images hold a shared
+       lock on the store, and removing chunks that aren't used (see gc) an
+       exclusive one. Recipes are written holding a lock of their own.
+    '''
+
+    def __init__(self, root=None, min_size=MIN_SIZE, max_size=MAX_SIZE,
+                       bits=MASK_BITS):
+
+        if min_size < WINDOW or max_size < min_size:
+            bot.exit('Chunks must be at least %s bytes, and max_size at '
+                     'least min_size' % WINDOW)
+
+        self.root = root or get_cache('sif-chunks', quiet=True)
+        self.chunks_dir = os.path.join(self.root, 'chunks')
+        self.images_dir = os.path.join(self.root, 'images')
+        mkdir_p(self.chunks_dir)
+        mkdir_p(self.images_dir)
+        self.lockfile = os.path.join(self.root, '.lock')
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.bits = bits
+
+    def __str__(self):
+        return "<%s:%s>" % (self.__class__.__name__, self.root)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def _lock(self, shared=False):
+        return _FileLock(self.lockfile, shared=shared)
+
+    def _get_chunk_path(self, key):
+        return os.path.join(self.chunks_dir, key[:2], key)
+
+    def _lock_recipes(self):
+        return _FileLock(os.path.join(self.images_dir, '.lock'))
+
+    def _get_recipe_path(self, digest):
+        return os.path.join(self.images_dir, '%s.json' % digest)
+
+    def _write_recipe(self, recipe):
+        self._write(self._get_recipe_path(recipe['digest']),
+                    json.dumps(recipe).encode('utf-8'))
+
+    def add(self, image, name=None):
+        '''add an image to the store, and return its recipe: the names,
+           size, mode and sha256 (digest) of the image, its chunks, and the
+           chunks (and bytes) that were new to the store. An image that is
+           in the store already (by sha256) gets another name.
+
+           Parameters
+           ==========
+           image: the path to the image
+           name: the name to find the image by (defaults to the file name)
+        '''
+        from sif.main import SIFHeader
+
+        header = SIFHeader(image)
+        st = os.stat(image)
+        digest = hashlib.sha256()
+        recipe = {'names': [name or os.path.basename(image)],
+                  'size': st.st_size, 'mode': st.st_mode, 'chunks': [],
+                  'new_chunks': 0, 'new_bytes': 0}
+
+        with self._lock(shared=True):
+            fd = os.open(image, os.O_RDONLY)
+            try:
+                for offset, length in get_ranges(header, st.st_size):
+                    for chunk in get_chunks(fd, offset, length, self.min_size,
+                                            self.max_size, self.bits):
+                        digest.update(chunk)
+                        key = hashlib.sha256(chunk).hexdigest()
+                        if self._save_chunk(key, chunk):
+                            recipe['new_chunks'] += 1
+                            recipe['new_bytes'] += len(chunk)
+                        recipe['chunks'].append([key, len(chunk)])
+            finally:
+                os.close(fd)
+
+            recipe['digest'] = digest.hexdigest()
+            recipe['added'] = int(time.time())
+
+            # The names of the image (if it's in the store) are kept
+            with self._lock_recipes():
+                existing = self._load_recipe(recipe['digest'])
+                if existing is not None:
+                    recipe['names'] = sorted(set(get_names(existing) +
+                                                 recipe['names']))
+                    recipe['added'] = existing['added']
+                self._write_recipe(recipe)
+
+        bot.debug('Added %s to %s, %s of %s chunks are new', image, self,
+                  recipe['new_chunks'], len(recipe['chunks']))
+        return recipe
+
+    def _save_chunk(self, key, chunk):
+        '''save a chunk, unless it is in the store. Returns True if it is new.
+        '''
+        path = self._get_chunk_path(key)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write(path, chunk)
+        return True
+
+    def _write(self, path, data):
+        '''write a file to a temporary file first, so it's never seen partial
+        '''
+        fd, tmpfile = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as filey:
+                filey.write(data)
+            os.replace(tmpfile, path)
+        except BaseException:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            raise
+
+    def get_recipes(self):
+        '''return the recipes of the images in the store, oldest first
+        '''
+        recipes = []
+        for entry in os.scandir(self.images_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path) as filey:
+                        recipes.append(json.load(filey))
+                except (OSError, ValueError):
+                    continue
+        return sorted(recipes, key=lambda recipe: recipe['added'])
+
+    def _load_recipe(self, digest):
+        '''load the recipe of an image by its sha256, or return None
+        '''
+        try:
+            with open(self._get_recipe_path(digest)) as filey:
+                return json.load(filey)
+        except FileNotFoundError:
+            return None
+
+    def get_recipe(self, key):
+        '''get the recipe of an image, by its sha256 (or the start of it), or
+           one of its names. Exits if there is no image, or more than one.
+
+           Parameters
+           ==========
+           key: the sha256 of the image (or a prefix), or a name
+        '''
+        recipe = self._load_recipe(key)
+        if recipe is not None:
+            return recipe
+
+        found = [recipe for recipe in self.get_recipes()
+                 if recipe['digest'].startswith(key) or
+                 key in get_names(recipe)]
+        if not found:
+            bot.exit('%s is not in the store.' % key)
+        if len(found) > 1:
+            bot.exit('%s matches %s images, use the sha256.' % (key, len(found)))
+        return found[0]
+
+    def restore(self, key, output):
+        '''write an image in the store to a file, from its chunks. The image
+           is written to a temporary file first, and renamed once its
+           sha256 is checked. Returns the path to the image.
+
+           Parameters
+           ==========
+           key: the sha256 of the image (or a prefix), or the name
+           output: the path to write the image to
+        '''
+        recipe = self.get_recipe(key)
+        folder = os.path.dirname(os.path.abspath(output))
+        fd, tmpfile = tempfile.mkstemp(dir=folder, prefix='.%s' %
+                                       os.path.basename(output))
+        digest = hashlib.sha256()
+
+        with self._lock(shared=True):
+            try:
+                with os.fdopen(fd, 'wb') as filey:
+                    preallocate(fd, recipe['size'])
+                    for chunk, length in recipe['chunks']:
+                        data = self._read_chunk(chunk, length)
+                        digest.update(data)
+                        filey.write(data)
+                    os.fchmod(filey.fileno(), recipe['mode'] & 0o7777)
+
+                if digest.hexdigest() != recipe['digest']:
+                    bot.exit('The chunks of %s are corrupt, the sha256 is %s' %
+                             (recipe['digest'], digest.hexdigest()))
+                os.replace(tmpfile, output)
+            except BaseException:
+                os.remove(tmpfile)
+                raise
+
+        bot.debug('Restored %s to %s', recipe['digest'], output)
+        return output
+
+    def _read_chunk(self, key, length):
+        try:
+            with open(self._get_chunk_path(key), 'rb') as filey:
+                data = filey.read()
+        except FileNotFoundError:
+            bot.exit('Chunk %s is missing from the store.' % key)
+        if len(data) != length:
+            bot.exit('Chunk %s is %s bytes, and not %s' % (key, len(data),
+                                                            length))
+        return data
+
+    def remove(self, key):
+        '''remove an image from the store, and the chunks that no other image
+           uses. Returns the number of bytes freed. An image removed by one
+           of its names keeps the others, and is only removed with the last.
+
+           Parameters
+           ==========
+           key: the sha256 of the image (or a prefix), or a name
+        '''
+        recipe = self.get_recipe(key)
+        with self._lock():
+            names = [name for name in get_names(recipe) if name != key]
+            if key in get_names(recipe) and names:
+                recipe['names'] = names
+                self._write_recipe(recipe)
+                return 0
+            os.remove(self._get_recipe_path(recipe['digest']))
+            return self._gc()
+
+    def gc(self):
+        '''remove the chunks that no image uses (e.g., left by an add that
+           failed), and return the number of bytes freed.
+        '''
+        with self._lock():
+            return self._gc()
+
+    def _gc(self):
+        used = set(chunk for recipe in self.get_recipes()
+                   for chunk, length in recipe['chunks'])
+        freed = 0
+        for path, size in self._list_chunks():
+            if os.path.basename(path) not in used:
+                os.remove(path)
+                freed += size
+        return freed
+
+    def _list_chunks(self):
+        '''yield the (path, size) of each chunk (and any temporary file)
+        '''
+        for folder in os.scandir(self.chunks_dir):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    yield entry.path, entry.stat().st_size
+
+    def stats(self):
+        '''return the number of images and chunks in the store, the size of
+           the images, and the bytes stored (the size of the chunks).
+        '''
+        chunks = list(self._list_chunks())
+        recipes = self.get_recipes()
+        return {'images': len(recipes),
+                'size': sum(recipe['size'] for recipe in recipes),
+                'chunks': len(chunks),
+                'stored': sum(size for path, size in chunks)}
@@ -0,0 +1,216 @@
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A signature descriptor links to the data object (or group) it signs, and
+# its data object is a clear signed message with the hash of the signed
+# data objects, e.g.,
+#
+#     SIFHASH:
+#     4de3d88a550a8c1976b54b91445b027af718cb0bf38133c50dcd723f...
+#
+# Verification streams the signed data objects through the declared hash
+# (all signatures with one sequential read), compares the result to the
+# SIFHASH, and if a keyring is given, checks the OpenPGP signature offline.
+# The SIFHASH is only taken from the signed text of the message (never the
+# armor headers before it), and with a keyring, from the text that verified.
+
+from sif.utils.digest import update_digests
+from sif.utils.pgp import ( parse_cleartext, read_keyring, verify_cleartext )
+import hashlib
+import os
+
+# Cached results of an older version (of verify) are not used
+VERIFY_VERSION = '2'
+
+
+def get_signed(header, signature):
+    '''get the descriptors signed by a signature, in order of ID. The Link
+       of the signature is an ID, or a group (with the group mask set).
+
+       Parameters
+       ==========
+       header: the SIFHeader
+       signature: the signature descriptor
+    '''
+    link = signature['Link']
+    if link & header.base.DescrGroupMask:
+        signed = [d for d in header.descriptors.get_group(link)
+                  if d['Datatype'] != header.Signature.datatype]
+    else:
+        signed = [header.descriptors.get(link)]
+    return sorted([d for d in signed if d is not None], key=lambda d: d['ID'])
+
+
+def get_sifhash(text):
+    '''get the hash from the signed text of a signature block (the line
+       after SIFHASH:), or None if there isn't one.
+
+       Parameters
+       ==========
+       text: the signed text (see sif.utils.pgp.parse_cleartext)
+    '''
+    lines = [line.strip() for line in text.splitlines()]
+    if 'SIFHASH:' in lines:
+        index = lines.index('SIFHASH:') + 1
+        if index < len(lines):
+            return lines[index].lower()
+
+
+def get_keyring_id(keyring):
+    '''identify a keyring file (by a stat) so that cached results are not
+       used if the keyring changes.
+    '''
+    if keyring is None:
+        return 'nokeyring'
+    st = os.stat(keyring)
+    return "%x-%x-%x" % (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def verify(header, keyring=None, cache=True):
+    '''verify the signatures of an image, and return a list of results,
+       one per signature. Each result has the signature ID, the IDs of the
+       signed descriptors, the hashtype, the expected and computed hash,
+       and "integrity" (True if they match). If a keyring is given, the
+       OpenPGP signature is checked against it, with the key id and
+       fingerprint of the signer, and "verified" is True only if both the
+       hash and the signature are good (otherwise it is None). Results
+       are cached by the identity of the image and keyring, unless a key
+       in the keyring expires.
+
+       Parameters
+       ==========
+       header: the SIFHeader for the image
+       keyring: an optional keyring file (gpg --export) to check signatures
+       cache: use the cache of verified results (default True)
+    '''
+    from sif.main.cache import get_verify_cache
+
+    # The signed data is hashed with one pass over the (local) image
+    local = header.get_local()
+
+    key = None
+    if cache is True:
+        verify_cache = get_verify_cache()
+        key = verify_cache.get_key(local, VERIFY_VERSION,
+                                   header.base.HdrVersion,
+                                   get_keyring_id(keyring))
+        results = verify_cache.load(key)
+        if results is not None:
+            return results
+
+    keys = None
+    if keyring is not None:
+        keys = read_keyring(keyring)
+
+    # Read the (small) signature blocks, and prepare a hasher for each
+    results = []
+    targets = []
+    with header.reader as reader:
+        for signature in header.get_signatures():
+            result, message, hasher, segments = _prepare(header, signature, 
+                                                         reader, keys)
+            results.append((result, message, hasher))
+            if hasher is not None:
+                targets.append((segments, hasher))
+
+    # One sequential read of the signed data objects, for all signatures
+    update_digests(local, targets)
+    if header.stats is not None and targets:
+        segments = [segment for covered, hasher in targets
+                    for segment in covered]
+        start = min(offset for offset, length in segments)
+        end = max(offset + length for offset, length in segments)
+        header.stats.add(opens=1, reads=1, bytes=end - start)
+
+    for result, message, hasher in results:
+        if hasher is not None:
+            result['computed'] = hasher.hexdigest()
+            result['integrity'] = result['computed'] == result['expected']
+            if not result['integrity']:
+                result['error'] = 'hash of signed data does not match'
+            _check_signature(result, message, keys)
+
+    # A result with a key that expires can change, without the keyring
+    results = [result for result, message, hasher in results]
+    if cache is True and not any(k['expires'] for k in (keys or {}).values()):
+        verify_cache.save(key, results)
+    return results
+
+
+def _prepare(header, signature, reader, keys):
+    '''prepare to verify one signature: read the signature block, and
+       return the result (so far), the block, the hasher, and the segments
+       to hash. If the signature can't be checked, the hasher is None.
+    '''
+    from sif.main.decode import strip_bytes
+
+    signed = get_signed(header, signature)
+    hashtype = header.SIF.hashtypes.get(signature['hashtype'], '')
+    result = {'signature': signature['ID'],
+              'signed': [d['ID'] for d in signed],
+              'hashtype': hashtype,
+              'entity': signature['entity'],
+              'expected': None,
+              'computed': None,
+              'integrity': False,
+              'verified': None if keys is None else False}
+
+    message = strip_bytes(header.read_data(signature, reader), header.base.EndChar)
+    if isinstance(message, bytes):
+        result['error'] = 'signature block is not text'
+        return result, None, None, None
+
+    try:
+        text = parse_cleartext(message)[0].decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        result['error'] = 'signature block is not a clear signed message'
+        return result, None, None, None
+
+    result['expected'] = get_sifhash(text)
+    if result['expected'] is None:
+        result['error'] = 'no SIFHASH in the signature block'
+        return result, message, None, None
+
+    if not signed:
+        result['error'] = 'signed descriptor %s not found' % signature['Link']
+        return result, message, None, None
+
+    try:
+        hasher = hashlib.new(hashtype.lower())
+    except ValueError:
+        result['error'] = 'hashtype %s is not supported' % signature['hashtype']
+        return result, message, None, None
+
+    segments = [(d['Fileoff'], d['Filelen']) for d in signed]
+    return result, message, hasher, segments
+
+
+def _check_signature(result, message, keys):
+    '''check the OpenPGP signature of a message against keys from a keyring,
+       if there are any, and update the result.
+    '''
+    if keys is None:
+        return
+
+    checked = verify_cleartext(message, keys)
+    result['keyid'] = checked['keyid']
+    result['fingerprint'] = checked['fingerprint']
+    if 'error' in checked:
+        result['error'] = checked['error']
+
+    # The hash that was checked must be the one in the text that verified
+    if checked['verified'] and get_sifhash(checked['text']) != result['expected']:
+        result['error'] = 'SIFHASH is not in the signed text'
+        checked['verified'] = False
+
+    # The entity of the descriptor, if set, should be the signing key
+    entity = result['entity'].upper()
+    if entity and checked['fingerprint'] and entity != checked['fingerprint']:
+        result['error'] = 'signing key does not match the descriptor entity'
+        checked['verified'] = False
+
+    result['verified'] = result['integrity'] and checked['verified']
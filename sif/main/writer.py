@@ -0,0 +1,297 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.logger import bot
+from sif.header import get_structure
+from sif.main.descriptors import DescriptorTable
+from sif.main.encode import ( encode_descriptors, encode_header )
+from sif.utils import copy_range
+import errno
+import os
+import platform
+import tempfile
+import time
+import uuid
+
+# The machine (from platform.machine) for each architecture code
+machines = {
+    "i386": "01", "i486": "01", "i586": "01", "i686": "01",
+    "x86_64": "02", "amd64": "02",
+    "armv7l": "03", "arm": "03",
+    "aarch64": "04", "arm64": "04",
+    "ppc64": "05",
+    "ppc64le": "06",
+    "mips": "07",
+    "mipsel": "08",
+    "mips64": "09",
+    "mips64el": "10",
+    "s390x": "11"
+}
+
+
+class SIFWriter:
+    '''A SIFWriter assembles a SIF image from data objects, each from a
+       file (e.g., a squashfs rootfs) or bytes. The global header and the
+       descriptor table are laid out as described by the HeaderBase, and
+       data objects start at DataStartOffset, each aligned to alignment
+       bytes. The image is preallocated, and the data objects are copied
+       by the kernel where possible (see sif.utils.copy_range), so they
+       don't pass through Python. Nothing is written until write().
+
+       writer = SIFWriter('boxes.sif')
+       writer.add_deffile(b'bootstrap: docker\nfrom: vanessa/boxes\n')
+       writer.add_partition('rootfs.squashfs')
+       writer.write()
+    '''
+
+    def __init__(self, image, arch=None, version=None, alignment=4096):
+        self.SIF = get_structure(version)
+        self.base = self.SIF.HeaderBase
+        self.image = image
+        self.alignment = alignment
+        self.arch = arch or get_arch()
+        self.objects = []
+
+    def __str__(self):
+        return "<SIFWriter:%s>" % self.image
+
+    def __repr__(self):
+        return self.__str__()
+
+    def add(self, datatype, source, name='', link=None, groupid=None, 
+                  extra=None):
+        '''add a data object, and return the ID of its descriptor.
+
+           Parameters
+           ==========
+           datatype: the Datatype of the descriptor (e.g., 0x4004)
+           source: the path to a file with the data, or bytes
+           name: the name of the descriptor
+           link: the ID (or group) the descriptor links to (default unused)
+           groupid: the group of the descriptor (default is the first group)
+           extra: a dictionary of values for the extra_fields of the datatype
+        '''
+        if len(self.objects) >= self.base.DescrNumEntries:
+            bot.exit('A SIF image can have at most %s descriptors.' % 
+                     self.base.DescrNumEntries)
+
+        if not isinstance(source, (bytes, bytearray)) and not os.path.exists(source):
+            bot.exit('Cannot find %s' % source)
+
+        descriptor = new_descriptor(self.SIF, datatype, len(self.objects) + 1,
+                                    name, link, groupid, extra)
+        self.objects.append((descriptor, source))
+        return descriptor['ID']
+
+    def add_deffile(self, source, name=''):
+        '''add a definition file, from a path or bytes.
+        '''
+        return self.add(self.SIF.Deffile.datatype, source, name)
+
+    def add_partition(self, source, fstype=1, parttype=2, arch=None, name=None):
+        '''add a partition, by default a squashfs (1) primary system (2)
+           partition for the architecture of the image.
+
+           Parameters
+           ==========
+           source: the path to the partition (e.g., a squashfs file), or bytes
+           fstype: the filesystem type (see fstypes)
+           parttype: the partition type (see parttypes)
+           arch: the architecture code (defaults to that of the image)
+           name: the name of the descriptor (defaults to the file name)
+        '''
+        if name is None:
+            name = '' if isinstance(source, (bytes, bytearray)) else \
+                   os.path.basename(source)
+        extra = {'fstype': fstype, 'partype': parttype, 'arch': arch or self.arch}
+        return self.add(self.SIF.Partition.datatype, source, name, extra=extra)
+
+    def add_signature(self, source, link, hashtype=2, entity='', 
+                      name='part-signature'):
+        '''add a signature block (a clear signed SIFHASH) for a descriptor
+           or group.
+
+           Parameters
+           ==========
+           source: the path to the signature block, or bytes
+           link: the ID (or group) that is signed
+           hashtype: the hash of the signed data (see hashtypes, SHA384)
+           entity: the fingerprint of the signing key, as hex
+        '''
+        extra = {'hashtype': hashtype, 'entity': entity}
+        return self.add(self.SIF.Signature.datatype, source, name, link=link,
+                        groupid=self.base.DescrUnusedGroup, extra=extra)
+
+    def get_layout(self):
+        '''determine the offset and size of each data object, and return
+           the meta (global header), DescriptorTable and the size of the image.
+        '''
+        now = int(time.time())
+        table = DescriptorTable()
+        offset = self.base.DataStartOffset
+        end = offset
+
+        for descriptor, source in self.objects:
+            if isinstance(source, (bytes, bytearray)):
+                size = len(source)
+            else:
+                size = os.stat(source).st_size
+            offset = align(offset, self.alignment)
+            descriptor.update({'Fileoff': offset,
+                               'Filelen': size,
+                               'Storelen': size,
+                               'Ctime': now,
+                               'Mtime': now})
+            table.add(descriptor)
+            offset += size
+            end = offset
+
+        size = self.SIF.DescriptorStruct.size
+        meta = {'version': self.base.HdrFileVersion,
+                'arch': self.arch,
+                'uuid': str(uuid.uuid4()),
+                'ctime': now,
+                'mtime': now,
+                'dfree': self.base.DescrNumEntries - len(table),
+                'dtotal': self.base.DescrNumEntries,
+                'descroff': self.base.DescrStartOffset,
+                'descrlen': self.base.DescrNumEntries * size,
+                'dataoff': self.base.DataStartOffset,
+                'datalen': end - self.base.DataStartOffset}
+        return meta, table, end
+
+    def write(self):
+        '''write the image, first to a temporary file in the same folder,
+           which is then renamed, so the image is never seen half written.
+           Returns the path to the image.
+        '''
+        meta, table, end = self.get_layout()
+
+        header = bytearray(self.base.DataStartOffset)
+        data = encode_header(meta, self.SIF)
+        header[:len(data)] = data
+        data = encode_descriptors(table, self.SIF)
+        header[meta['descroff']:meta['descroff'] + len(data)] = data
+
+        folder = os.path.dirname(os.path.abspath(self.image))
+        fd, tmpfile = tempfile.mkstemp(dir=folder, prefix='.%s' % 
+                                       os.path.basename(self.image))
+        try:
+            try:
+                preallocate(fd, end)
+                os.pwrite(fd, bytes(header), 0)
+                for descriptor, source in self.objects:
+                    self._write_object(fd, descriptor, source)
+                os.fchmod(fd, 0o755)
+            finally:
+                os.close(fd)
+            os.replace(tmpfile, self.image)
+        except BaseException:
+            os.remove(tmpfile)
+            raise
+
+        bot.debug('Wrote %s with %s descriptors', self.image, len(table))
+        return self.image
+
+    def _write_object(self, fd, descriptor, source):
+        '''write one data object at its offset, from bytes or a file
+        '''
+        written = write_data(fd, source, descriptor['Fileoff'], 
+                             descriptor['Filelen'])
+        if written != descriptor['Filelen']:
+            bot.exit('%s changed while it was written to %s' % 
+                     (source, self.image))
+
+
+def write_data(fd, source, offset, length):
+    '''write a data object to an open file at an offset, from bytes, or
+       from a file with a kernel copy (see sif.utils.copy_range). Returns
+       the number of bytes written.
+
+       Parameters
+       ==========
+       fd: the file descriptor to write to
+       source: the path to a file with the data, or bytes
+       offset: the offset to write at
+       length: the number of bytes to write
+    '''
+    if isinstance(source, (bytes, bytearray)):
+        return os.pwrite(fd, source[:length], offset)
+
+    src = os.open(source, os.O_RDONLY)
+    try:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return copy_range(src, fd, 0, length)
+    finally:
+        os.close(src)
+
+
+def new_descriptor(SIF, datatype, descriptor_id, name='', link=None,
+                   groupid=None, extra=None):
+    '''create a (used) descriptor, without the location of the data object
+       (Fileoff, Filelen and Storelen) or times (Ctime, Mtime).
+
+       Parameters
+       ==========
+       SIF: the structure from sif.header.get_structure
+       datatype: the Datatype of the descriptor (e.g., 0x4004)
+       descriptor_id: the ID of the descriptor
+       name: the name of the descriptor
+       link: the ID (or group) the descriptor links to (default unused)
+       groupid: the group of the descriptor (default is the first group)
+       extra: a dictionary of values for the extra_fields of the datatype
+    '''
+    base = SIF.HeaderBase
+    if link is None:
+        link = base.DescrUnusedLink
+    if groupid is None:
+        groupid = base.DescrDefaultGroup
+
+    Descriptor = SIF.datatypes.get(datatype, SIF.Descriptor)
+    descriptor = {'Datatype': datatype,
+                  'Used': True,
+                  'ID': descriptor_id,
+                  'Groupid': groupid,
+                  'Link': link,
+                  'UID': os.getuid(),
+                  'Gid': os.getgid(),
+                  'name': name}
+
+    # Extra fields that aren't given are empty (zero)
+    ExtraStruct = Descriptor.ExtraStruct
+    for key, empty in zip(Descriptor.extra_fields, 
+                          ExtraStruct.unpack(bytes(ExtraStruct.size))):
+        if isinstance(empty, bytes):
+            empty = ''
+        descriptor[key] = (extra or {}).get(key, empty)
+    return descriptor
+
+
+def get_arch():
+    '''get the architecture code (e.g., 02) for this machine
+    '''
+    return machines.get(platform.machine().lower(), "00")
+
+
+def align(offset, alignment):
+    if alignment > 1:
+        return (offset + alignment - 1) // alignment * alignment
+    return offset
+
+
+def preallocate(fd, size):
+    '''preallocate a file, so data (e.g., data objects) is written to
+       contiguous blocks and we fail early if the disk is full. If the
+       filesystem can't (e.g., not supported), the file is only extended.
+    '''
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                raise
+    os.ftruncate(fd, size)
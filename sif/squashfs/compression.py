@@ -0,0 +1,75 @@
+'''
+
+Copyright (C) 2018-2019 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+'''
+
+import lzma
+import zlib
+
+# The compressor ids of the superblock. gzip (zlib), lzma and xz are in the
+# standard library, lz4 and zstd need the lz4 and zstandard modules, and
+# lzo isn't supported.
+compressors = {
+    1: 'gzip',
+    2: 'lzma',
+    3: 'lzo',
+    4: 'xz',
+    5: 'lz4',
+    6: 'zstd'
+}
+
+
+def _gzip(data, size):
+    return zlib.decompress(data)
+
+
+def _lzma(data, size):
+    return lzma.decompress(data, format=lzma.FORMAT_ALONE)
+
+
+def _xz(data, size):
+    return lzma.decompress(data, format=lzma.FORMAT_XZ)
+
+
+def _lz4(data, size):
+    import lz4.block
+    return lz4.block.decompress(data, uncompressed_size=size)
+
+
+def _zstd(data, size):
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+
+
+_decompressors = {1: _gzip, 2: _lzma, 4: _xz, 5: _lz4, 6: _zstd}
+
+
+def get_decompressor(compressor):
+    '''get a function to decompress a block, given the compressed bytes
+       and the (maximum) size of the result, for the compressor id of a
+       superblock. A ValueError is raised if it isn't supported.
+
+       Parameters
+       ==========
+       compressor: the compressor id (e.g., 1 for gzip)
+    '''
+    name = compressors.get(compressor, compressor)
+    decompress = _decompressors.get(compressor)
+    if decompress is None:
+        raise ValueError('%s compression is not supported' % name)
+
+    # Optional modules are checked now, instead of at the first block
+    try:
+        if compressor == 5:
+            import lz4.block
+        elif compressor == 6:
+            import zstandard
+    except ImportError:
+        raise ValueError('%s compression needs the %s module' %
+                         (name, 'lz4' if compressor == 5 else 'zstandard'))
+    return decompress
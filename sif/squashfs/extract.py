@@ -0,0 +1,264 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Extracting a whole filesystem is mostly decompressing data blocks, which
+# is independent for each block. The tree is read once (in this process),
+# the directories, links and (preallocated, empty) files are created, and
+# then the data blocks are split into tasks of about TASK_SIZE bytes, that
+# a pool of processes decompress and write (with pwrite) in parallel. The
+# modes, owners and times are set last, so the files can be written.
+
+from sif.logger import bot
+from sif.main.readers import is_url
+from sif.main.writer import preallocate
+from sif.squashfs.files import SquashFSFile
+from sif.squashfs.reader import SquashFS
+from sif.squashfs.structures import (
+    DIRECTORY,
+    FILE,
+    SYMLINK,
+    BLOCK_DEVICE,
+    CHAR_DEVICE,
+    FIFO
+)
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait
+)
+import os
+
+# The (decompressed) size, and most files, of a task for a worker
+TASK_SIZE = 8 * 1024 * 1024
+TASK_FILES = 512
+
+# Each worker process opens the filesystem once (see _init_worker)
+_squashfs = None
+
+
+def extract(squashfs, output, workers=None):
+    '''extract a squashfs filesystem to a directory, like unsquashfs, with
+       the data blocks decompressed in a pool of processes. Modes, links
+       and hard links are kept, and owners and devices if we are root.
+       Returns a dictionary of counts (e.g., files) and the bytes written.
+
+       Parameters
+       ==========
+       squashfs: the SquashFS to extract
+       output: the directory to extract to, which can't exist, or is empty
+       workers: the number of processes (defaults to the number of cpus)
+    '''
+    if os.path.lexists(output) and (not os.path.isdir(output) or
+                                    os.listdir(output)):
+        bot.exit('%s exists, and is not an empty directory' % output)
+    os.makedirs(output, exist_ok=True)
+
+    counts = {'directories': 0, 'files': 0, 'symlinks': 0, 'hardlinks': 0,
+              'special': 0, 'skipped': 0, 'bytes': 0}
+    created = []
+    files = []
+    seen = dict()
+
+    with squashfs:
+        for relpath, inode in walk_inodes(squashfs):
+            path = os.path.join(output, relpath)
+
+            # The same inode (a hard link) is linked to the first path
+            if inode.type != DIRECTORY and inode.ref in seen:
+                os.link(seen[inode.ref], path, follow_symlinks=False)
+                counts['hardlinks'] += 1
+                continue
+
+            if not _create(path, inode, relpath):
+                counts['skipped'] += 1
+                continue
+
+            seen[inode.ref] = path
+            created.append((path, inode))
+            if inode.type == FILE:
+                files.append((path, inode))
+            key = {DIRECTORY: 'directories', FILE: 'files',
+                   SYMLINK: 'symlinks'}.get(inode.type, 'special')
+            counts[key] += 1
+
+    counts['bytes'] = write_files(squashfs, files, workers)
+
+    # Parents are after their children in reverse, for the directory times
+    is_root = os.geteuid() == 0
+    for path, inode in reversed(created):
+        set_metadata(path, inode, is_root)
+    return counts
+
+
+def walk_inodes(squashfs):
+    '''yield (path, inode) for each entry of a filesystem, with the path
+       relative to the root (which is '') and parents before children.
+       Names that would leave the tree (e.g., with a /) are skipped.
+    '''
+    stack = [('', squashfs.root)]
+    while stack:
+        path, inode = stack.pop()
+        yield path, inode
+
+        if inode.type == DIRECTORY:
+            for name, ref, kind in reversed(squashfs.get_entries(inode)):
+                if '/' in name or name in ['', '.', '..']:
+                    bot.warning('Skipping %s in %s, it is not a valid name' %
+                                (name, path or '/'))
+                    continue
+                stack.append((os.path.join(path, name),
+                              squashfs.get_inode(ref)))
+
+
+def _create(path, inode, relpath):
+    '''create an entry (e.g., an empty file, or a link) with a mode that we
+       can write to, and return False if it can't be created (a socket,
+       or a device if we aren't root).
+    '''
+    if inode.type == DIRECTORY:
+        if relpath:
+            os.mkdir(path, 0o700)
+
+    elif inode.type == FILE:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                           os.O_NOFOLLOW, 0o600)
+        try:
+            # A file with sparse (zero) blocks is kept sparse
+            if 0 in inode.blocks:
+                os.ftruncate(fd, inode.size)
+            elif inode.size > 0:
+                preallocate(fd, inode.size)
+        finally:
+            os.close(fd)
+
+    elif inode.type == SYMLINK:
+        os.symlink(inode.target, path)
+
+    elif inode.type == FIFO:
+        os.mkfifo(path, 0o600)
+
+    elif inode.type in [BLOCK_DEVICE, CHAR_DEVICE] and os.geteuid() == 0:
+        major = (inode.rdev >> 8) & 0xFFF
+        minor = (inode.rdev & 0xFF) | ((inode.rdev >> 12) & 0xFFF00)
+        os.mknod(path, inode.mode, os.makedev(major, minor))
+
+    else:
+        bot.debug('Skipping %s, it is a device or socket', relpath)
+        return False
+    return True
+
+
+def set_metadata(path, inode, is_root=False):
+    '''set the mode, owner (if we are root) and times of an entry, without
+       following links.
+    '''
+    if is_root:
+        os.chown(path, inode.uid, inode.gid, follow_symlinks=False)
+
+    times = (inode.mtime, inode.mtime)
+    if inode.type != SYMLINK:
+        os.chmod(path, inode.mode & 0o7777)
+        os.utime(path, times)
+    elif os.utime in os.supports_follow_symlinks:
+        os.utime(path, times, follow_symlinks=False)
+
+
+def get_tasks(files, block_size, task_size=TASK_SIZE, task_files=TASK_FILES):
+    '''split the data of files into tasks, each a list of (path, inode,
+       first block, last block) of (about) task_size bytes. Large files are
+       split across tasks, and small files are grouped.
+
+       Parameters
+       ==========
+       files: a list of (path, inode) for the files
+       block_size: the block size of the filesystem
+       task_size: the (decompressed) bytes of each task
+       task_files: the most files (or parts of files) in a task
+    '''
+    step = max(1, task_size // block_size)
+    task = []
+    size = 0
+    for path, inode in files:
+        count = (inode.size + block_size - 1) // block_size
+        for first in range(0, count, step):
+            last = min(count, first + step)
+            task.append((path, inode, first, last))
+            size += min(inode.size, last * block_size) - first * block_size
+            if size >= task_size or len(task) >= task_files:
+                yield task
+                task = []
+                size = 0
+    if task:
+        yield task
+
+
+def write_blocks(task, squashfs=None):
+    '''write the blocks of a task (see get_tasks) to the files, which must
+       exist, and return the number of bytes written. Sparse blocks are
+       skipped. In a worker, the filesystem is the one of the process.
+    '''
+    squashfs = squashfs or _squashfs
+    block_size = squashfs.block_size
+    written = 0
+
+    with squashfs:
+        for path, inode, first, last in task:
+            filey = SquashFSFile(squashfs, inode, path)
+            fd = os.open(path, os.O_WRONLY | os.O_NOFOLLOW)
+            try:
+                for index in range(first, last):
+                    if index < len(inode.blocks) and inode.blocks[index] == 0:
+                        continue
+                    length = min(block_size, inode.size - index * block_size)
+                    view = memoryview(filey.get_block(index))[:length]
+                    offset = index * block_size
+                    while view:
+                        count = os.pwrite(fd, view, offset)
+                        view = view[count:]
+                        offset += count
+                    written += length
+            finally:
+                os.close(fd)
+    return written
+
+
+def write_files(squashfs, files, workers=None):
+    '''write the data of files, in a pool of processes that each open the
+       filesystem (once). A filesystem that another process can't open
+       (e.g., from bytes, or a file descriptor), or one worker, is written
+       in this process. Returns the number of bytes written.
+    '''
+    workers = workers or os.cpu_count() or 1
+    tasks = get_tasks(files, squashfs.block_size)
+    name = squashfs.reader.name
+
+    if workers == 1 or not (isinstance(squashfs.reader.local, str) or
+                            is_url(name)):
+        return sum(write_blocks(task, squashfs) for task in tasks)
+
+    written = 0
+    limit = workers * 4
+    initargs = (name, squashfs.offset, squashfs.length)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(write_blocks, task))
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += sum(future.result() for future in done)
+
+        written += sum(future.result() for future in pending)
+    return written
+
+
+def _init_worker(image, offset, length):
+    '''open the filesystem once in a worker process. Fragment blocks are
+       shared by many small files, so a few blocks are cached.
+    '''
+    global _squashfs
+    _squashfs = SquashFS(image, offset=offset, length=length,
+                         block_cache_size=8)
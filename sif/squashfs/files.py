@@ -0,0 +1,118 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from sif.squashfs.structures import DATA_UNCOMPRESSED
+import io
+
+
+class SquashFSFile(io.RawIOBase):
+    '''A SquashFSFile is a (read only, seekable) binary file in a squashfs
+       filesystem, from SquashFS.open. Only the data blocks (or fragment)
+       that a read needs are read and decompressed, and decompressed
+       blocks are kept in the (LRU) block cache of the SquashFS, so
+       reading (or seeking back in) a small file is a read of one block.
+
+       Parameters
+       ==========
+       squashfs: the SquashFS with the file
+       inode: the inode of the file
+       name: the path of the file
+    '''
+
+    def __init__(self, squashfs, inode, name):
+        self.squashfs = squashfs
+        self.inode = inode
+        self.name = name
+        self.size = inode.size
+        self.position = 0
+
+        # The position of each block, after the sizes of the ones before
+        self.offsets = []
+        offset = inode.start
+        for stored in inode.blocks:
+            self.offsets.append(offset)
+            offset += stored & ~DATA_UNCOMPRESSED
+
+    def __str__(self):
+        return "<SquashFSFile:%s>" % self.name
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def mode(self):
+        return 'rb'
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._check_closed()
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_closed()
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError('invalid whence (%s)' % whence)
+        if offset < 0:
+            raise ValueError('negative seek position %s' % offset)
+        self.position = offset
+        return self.position
+
+    def read(self, size=-1):
+        '''read up to size bytes (or to the end of the file, by default)
+        '''
+        self._check_closed()
+        if size is None or size < 0:
+            size = self.size
+        size = max(0, min(size, self.size - self.position))
+
+        chunks = []
+        block_size = self.squashfs.block_size
+        while size > 0:
+            index, start = divmod(self.position, block_size)
+            chunk = self.get_block(index)[start:start + size]
+            if not chunk:
+                raise ValueError('%s is truncated at %s' % (self.name,
+                                                            self.position))
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+
+        if len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def get_block(self, index):
+        '''get the (decompressed) data block at an index, or the tail end
+           of the file from its fragment.
+        '''
+        block_size = self.squashfs.block_size
+        length = min(block_size, self.size - index * block_size)
+        if index < len(self.offsets):
+            return self.squashfs.read_block(self.offsets[index],
+                                            self.inode.blocks[index], length)
+        return self.squashfs.read_fragment(self.inode.fragment,
+                                           self.inode.fragment_offset, length)
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
@@ -0,0 +1,734 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A squashfs partition can be listed (and files stat'ed) by reading its
+# metadata directly: the superblock, then the inode and directory tables,
+# which are in small compressed blocks. Only the blocks that a lookup
+# needs are read and decompressed, and decoded blocks are kept in a
+# bounded (LRU) cache, so listing a directory of an image takes a few
+# small reads instead of mounting (or extracting) the filesystem. Files
+# are read the same way, one data block (or fragment) at a time.
+
+from sif.main.readers import get_reader
+from sif.squashfs.compression import get_decompressor
+from sif.squashfs.files import SquashFSFile
+from sif.squashfs.structures import (
+    SQUASHFS_MAGIC,
+    METADATA_SIZE,
+    METADATA_UNCOMPRESSED,
+    DATA_UNCOMPRESSED,
+    NO_FRAGMENT,
+    DIRECTORY,
+    FILE,
+    SYMLINK,
+    EXT_DIRECTORY,
+    EXT_FILE,
+    EXT_SYMLINK,
+    DirectoryEntry,
+    DirectoryHeader,
+    DirectoryIndex,
+    FragmentEntry,
+    IdEntry,
+    Inode,
+    InodeHeader,
+    Superblock,
+    SuperblockStruct,
+    file_types,
+    inode_structs
+)
+from collections import OrderedDict
+import errno
+import io
+import os
+import posixpath
+import struct
+
+# The most symbolic links followed to resolve a path (as on Linux)
+MAX_SYMLINKS = 40
+
+
+class LRUCache(OrderedDict):
+    '''An LRUCache is a dictionary that keeps (up to) size items, and
+       removes the least recently used item when it is full.
+    '''
+
+    def __init__(self, size):
+        OrderedDict.__init__(self)
+        self.size = size
+
+    def get(self, key, default=None):
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        return default
+
+    def set(self, key, value):
+        self[key] = value
+        if len(self) > self.size:
+            self.popitem(last=False)
+        return value
+
+
+class SquashFS:
+    '''A SquashFS reads a squashfs (4.0) filesystem, e.g., the partition of
+       a SIF image (see SIFHeader.get_squashfs), without mounting it. Paths
+       are inside the filesystem, and relative paths are from the root.
+
+       squashfs = SquashFS('rootfs.sqfs')
+       squashfs.listdir('/etc')
+       squashfs.stat('/etc/os-release').st_size
+       squashfs.open('/etc/os-release', 'r').read()
+
+       Parameters
+       ==========
+       image: the filesystem, or the image it is in (a path, url, file
+              descriptor, bytes or reader, see sif.main.readers)
+       offset: the offset of the filesystem in the image
+       length: the length of the filesystem (defaults to the rest)
+       cache_size: the number of decoded metadata blocks (and directory
+                   listings) to keep
+       block_cache_size: the number of decompressed data blocks (and
+                         fragment blocks) to keep
+    '''
+
+    def __init__(self, image, offset=0, length=None, cache_size=1024,
+                 block_cache_size=32):
+        self.reader = get_reader(image)
+        self.name = self.reader.name
+        self.offset = offset
+        self.length = length
+        self._metadata = LRUCache(cache_size)
+        self._directories = LRUCache(cache_size)
+        self._blocks = LRUCache(block_cache_size)
+        self._ids = None
+        self._fragments = None
+
+        self.superblock = self._load_superblock()
+        self.block_size = self.superblock.block_size
+        self.decompress = get_decompressor(self.superblock.compressor)
+        self.root = self.get_inode(self.superblock.root_inode)
+
+    def __str__(self):
+        return "<SquashFS:%s>" % self.name
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __enter__(self):
+        self.reader.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.reader.__exit__(*args)
+
+    def close(self):
+        '''clear the cache, and close the reader
+        '''
+        self._metadata.clear()
+        self._directories.clear()
+        self._blocks.clear()
+        self.reader.close()
+
+################################################################################
+# Reading
+################################################################################
+
+    def _pread(self, offset, length):
+        '''read bytes at an offset of the filesystem (not past its end)
+        '''
+        if self.length is not None:
+            length = max(0, min(length, self.length - offset))
+        return self.reader.pread(self.offset + offset, length)
+
+    def _load_superblock(self):
+        data = self._pread(0, SuperblockStruct.size)
+        if len(data) < SuperblockStruct.size:
+            raise ValueError('%s is not a squashfs filesystem' % self.name)
+
+        superblock = Superblock(*SuperblockStruct.unpack(data))
+        if superblock.magic != SQUASHFS_MAGIC:
+            raise ValueError('%s is not a squashfs filesystem' % self.name)
+        if (superblock.major, superblock.minor) != (4, 0):
+            raise ValueError('%s is squashfs %s.%s, only 4.0 is supported' %
+                             (self.name, superblock.major, superblock.minor))
+        if self.length is not None and superblock.bytes_used > self.length:
+            raise ValueError('%s is truncated' % self.name)
+        return superblock
+
+    def _read_metadata_block(self, position):
+        '''read (and decompress) the metadata block at a position, and
+           return the data and the position of the next block. Blocks are
+           cached, and the least recently used is removed when full.
+        '''
+        found = self._metadata.get(position)
+        if found is not None:
+            return found
+
+        data = self._pread(position, 2 + METADATA_SIZE)
+        header = struct.unpack_from('<H', data)[0] if len(data) >= 2 else 0
+        size = header & ~METADATA_UNCOMPRESSED
+        if size == 0 or len(data) < 2 + size:
+            raise ValueError('%s has a truncated metadata block at %s' %
+                             (self.name, position))
+
+        data = data[2:2 + size]
+        if not header & METADATA_UNCOMPRESSED:
+            data = self.decompress(data, METADATA_SIZE)
+
+        return self._metadata.set(position, (data, position + 2 + size))
+
+    def _read_metadata(self, position, offset, length):
+        '''read bytes from metadata (e.g., an inode), which can continue
+           into the next blocks. Returns the bytes, and the position and
+           offset after them.
+
+           Parameters
+           ==========
+           position: the position of the metadata block
+           offset: the offset in the (decompressed) block
+           length: the number of bytes to read
+        '''
+        chunks = []
+        while length > 0:
+            data, after = self._read_metadata_block(position)
+            chunk = data[offset:offset + length]
+            if not chunk:
+                raise ValueError('%s has a truncated metadata block at %s' %
+                                 (self.name, position))
+            chunks.append(chunk)
+            length -= len(chunk)
+            offset += len(chunk)
+            if offset >= len(data):
+                position, offset = after, 0
+        return b''.join(chunks), position, offset
+
+    def _read_table(self, start, count, size):
+        '''read a table (e.g., the id table) of count entries of size bytes,
+           in metadata blocks that are listed (by position) at start.
+        '''
+        if count == 0:
+            return b''
+        blocks = (count * size + METADATA_SIZE - 1) // METADATA_SIZE
+        data = self._pread(start, 8 * blocks)
+        if len(data) < 8 * blocks:
+            raise ValueError('%s has a truncated table at %s' %
+                             (self.name, start))
+
+        # Each block is read from its position, as they can be anywhere
+        length = count * size
+        chunks = []
+        for position in struct.unpack('<%sQ' % blocks, data):
+            chunk = self._read_metadata_block(position)[0][:length]
+            chunks.append(chunk)
+            length -= len(chunk)
+        if length > 0:
+            raise ValueError('%s has a truncated table at %s' %
+                             (self.name, start))
+        return b''.join(chunks)
+
+    def get_ids(self):
+        '''get the list of uid and gid values, that inodes index into
+        '''
+        if self._ids is None:
+            count = self.superblock.id_count
+            data = self._read_table(self.superblock.id_table, count,
+                                    IdEntry.size)
+            self._ids = list(struct.unpack('<%sI' % count, data))
+        return self._ids
+
+################################################################################
+# Inodes
+################################################################################
+
+    def get_inode(self, ref):
+        '''read and decode an inode, from a reference (the position of its
+           metadata block in the inode table << 16 | the offset in it).
+           Returns an Inode (see sif.squashfs.structures).
+
+           Parameters
+           ==========
+           ref: the reference of the inode, e.g., from a directory entry
+        '''
+        position = self.superblock.inode_table + (ref >> 16)
+        data, position, offset = self._read_metadata(position, ref & 0xFFFF,
+                                                     InodeHeader.size)
+        kind, permissions, uid, gid, mtime, number = InodeHeader.unpack(data)
+
+        Struct = inode_structs.get(kind)
+        if Struct is None:
+            raise ValueError('%s has an unknown inode type %s' %
+                             (self.name, kind))
+        data, position, offset = self._read_metadata(position, offset,
+                                                     Struct.size)
+        values = Struct.unpack(data)
+
+        basic = kind if kind <= 7 else kind - 7
+        ids = self.get_ids()
+        inode = {'ref': ref, 'type': basic,
+                 'mode': file_types[basic] | permissions,
+                 'uid': ids[uid], 'gid': ids[gid], 'mtime': mtime,
+                 'inode_number': number, 'nlink': 1, 'size': 0,
+                 'start': None, 'offset': None, 'parent': None,
+                 'blocks': None, 'fragment': None, 'fragment_offset': None,
+                 'target': None, 'rdev': None, 'xattr': None, 'index': None}
+
+        if kind == DIRECTORY:
+            inode.update(zip(['start', 'nlink', 'size', 'offset', 'parent'],
+                             values))
+        elif kind == EXT_DIRECTORY:
+            inode.update(zip(['nlink', 'size', 'start', 'parent', 'count',
+                              'offset', 'xattr'], values))
+
+            # A large directory has an index of the listing, by name
+            index = []
+            for _ in range(inode['count']):
+                data, position, offset = self._read_metadata(
+                    position, offset, DirectoryIndex.size)
+                start, block, size = DirectoryIndex.unpack(data)
+                name, position, offset = self._read_metadata(position, offset,
+                                                             size + 1)
+                index.append((start, block, name))
+            inode['index'] = tuple(index) or None
+
+        elif kind in [FILE, EXT_FILE]:
+            if kind == FILE:
+                fields = ['start', 'fragment', 'fragment_offset', 'size']
+            else:
+                fields = ['start', 'size', 'sparse', 'nlink', 'fragment',
+                          'fragment_offset', 'xattr']
+            inode.update(zip(fields, values))
+
+            # The tail end of the file can be in a fragment, instead of a block
+            count, tail = divmod(inode['size'], self.block_size)
+            if inode['fragment'] == NO_FRAGMENT:
+                inode['fragment'] = inode['fragment_offset'] = None
+                count += 1 if tail else 0
+            data = self._read_metadata(position, offset, 4 * count)[0]
+            inode['blocks'] = struct.unpack('<%sI' % count, data)
+
+        elif kind in [SYMLINK, EXT_SYMLINK]:
+            inode['nlink'], size = values
+            data, position, offset = self._read_metadata(position, offset, size)
+            inode['target'] = os.fsdecode(data)
+            inode['size'] = size
+            if kind == EXT_SYMLINK:
+                data = self._read_metadata(position, offset, 4)[0]
+                inode['xattr'] = struct.unpack('<I', data)[0]
+
+        # Devices have nlink and rdev, and ipc only nlink (and an xattr)
+        else:
+            inode['nlink'] = values[0]
+            if basic in [4, 5]:
+                inode['rdev'] = values[1]
+            if kind > 7:
+                inode['xattr'] = values[-1]
+
+        return Inode.from_dict(inode)
+
+    def get_stat(self, inode):
+        '''get an os.stat_result for an inode. Only the modification time is
+           stored, so it is also the access and change time.
+        '''
+        return os.stat_result((inode.mode, inode.inode_number, 0, inode.nlink,
+                               inode.uid, inode.gid, inode.size, inode.mtime,
+                               inode.mtime, inode.mtime))
+
+################################################################################
+# Directories
+################################################################################
+
+    def get_entries(self, inode):
+        '''read the entries of a directory inode, as a list of (name, ref,
+           type) in the order of the listing (sorted by name).
+
+           Parameters
+           ==========
+           inode: the inode of the directory
+        '''
+        return [(name, ref, kind) for name, (ref, kind) in
+                self._get_directory(inode).items()]
+
+    def get_listing(self, inode):
+        '''read the (decompressed) bytes of a directory listing, as stored.
+           Two directories with the same listing have the same names, types
+           and inode references.
+
+           Parameters
+           ==========
+           inode: the inode of the directory
+        '''
+        if inode.type != DIRECTORY:
+            raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR))
+        # The size includes three bytes (for . and ..) that aren't stored
+        length = inode.size - 3
+        if length <= 0:
+            return b''
+        position = self.superblock.dir_table + inode.start
+        return self._read_metadata(position, inode.offset, length)[0]
+
+    def _get_directory(self, inode):
+        '''read a directory listing, as a dictionary of (ref, type) by name
+           (in order). Listings are cached, as the metadata blocks are.
+        '''
+        if inode.type != DIRECTORY:
+            raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR))
+
+        # An empty directory points to where the next listing starts
+        key = (inode.start, inode.offset, inode.size)
+        found = self._directories.get(key)
+        if found is not None:
+            return found
+
+        found = dict()
+        data = self.get_listing(inode)
+        index = 0
+        while index + DirectoryHeader.size <= len(data):
+            count, start, number = DirectoryHeader.unpack_from(data, index)
+            index += DirectoryHeader.size
+            for _ in range(count + 1):
+                offset, delta, kind, size = \
+                    DirectoryEntry.unpack_from(data, index)
+                index += DirectoryEntry.size
+                name = os.fsdecode(data[index:index + size + 1])
+                index += size + 1
+                found[name] = (start << 16 | offset, kind)
+
+        return self._directories.set(key, found)
+
+    def _find_entry(self, inode, name):
+        '''find a name in a directory, and return its (ref, type), or None.
+           If the listing isn't cached, and the directory has an index (see
+           get_inode), the listing is read from the run that the index
+           gives for the name, until the name is found or passed.
+        '''
+        key = (inode.start, inode.offset, inode.size)
+        if inode.index is None or key in self._directories:
+            return self._get_directory(inode).get(name)
+
+        # The index has the first name of (some) runs, sorted as bytes
+        target = os.fsencode(name)
+        length, start = 0, inode.start
+        for index, block, first in inode.index:
+            if first > target:
+                break
+            length, start = index, block
+
+        position = self.superblock.dir_table + start
+        offset = (inode.offset + length) % METADATA_SIZE
+        length += 3
+        while length < inode.size:
+            data, position, offset = self._read_metadata(
+                position, offset, DirectoryHeader.size)
+            count, block, number = DirectoryHeader.unpack(data)
+            length += DirectoryHeader.size
+            for _ in range(count + 1):
+                data, position, offset = self._read_metadata(
+                    position, offset, DirectoryEntry.size)
+                entry_offset, delta, kind, size = DirectoryEntry.unpack(data)
+                found, position, offset = self._read_metadata(position,
+                                                              offset, size + 1)
+                length += DirectoryEntry.size + size + 1
+                if found == target:
+                    return (block << 16 | entry_offset, kind)
+                if found > target:
+                    return None
+        return None
+
+    def lookup(self, path, follow_symlinks=True):
+        '''get the inode for a path. Symbolic links are resolved inside the
+           filesystem (absolute targets are from its root), including the
+           last component unless follow_symlinks is False.
+
+           Parameters
+           ==========
+           path: the path in the filesystem
+           follow_symlinks: resolve the last component, if it is a link
+        '''
+        parts = [part for part in path.split('/') if part]
+        parts.reverse()
+        parents = [self.root]
+        links = 0
+
+        while parts:
+            part = parts.pop()
+            if part == '.':
+                continue
+            if part == '..':
+                if len(parents) > 1:
+                    parents.pop()
+                continue
+
+            current = parents[-1]
+            if current.type != DIRECTORY:
+                raise NotADirectoryError(errno.ENOTDIR,
+                                         os.strerror(errno.ENOTDIR), path)
+
+            found = self._find_entry(current, part)
+            if found is None:
+                raise FileNotFoundError(errno.ENOENT,
+                                        os.strerror(errno.ENOENT), path)
+            inode = self.get_inode(found[0])
+
+            if inode.type != SYMLINK or (not parts and not follow_symlinks):
+                parents.append(inode)
+                continue
+
+            links += 1
+            if links > MAX_SYMLINKS:
+                raise OSError(errno.ELOOP, os.strerror(errno.ELOOP), path)
+            if inode.target.startswith('/'):
+                parents = [self.root]
+            parts += reversed([part for part in inode.target.split('/') if part])
+
+        # A trailing slash is only allowed for a directory
+        if path.endswith('/') and parents[-1].type != DIRECTORY:
+            raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR),
+                                     path)
+        return parents[-1]
+
+    def listdir(self, path='/'):
+        '''list the names in a directory, like os.listdir
+        '''
+        return [name for name, ref, kind in self.get_entries(self.lookup(path))]
+
+    def scandir(self, path='/'):
+        '''list the entries of a directory, like os.scandir, as DirEntry.
+           Entries know their type, and read the inode when needed.
+        '''
+        return [DirEntry(self, posixpath.join(path, name), name, ref, kind)
+                for name, ref, kind in self.get_entries(self.lookup(path))]
+
+    def walk(self, top='/'):
+        '''walk the tree from a directory (top down), like os.walk, and
+           yield (dirpath, dirnames, filenames). Links to directories are
+           listed in filenames, and not followed.
+        '''
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            dirnames = []
+            filenames = []
+            for entry in self.scandir(dirpath):
+                if entry.is_dir(follow_symlinks=False):
+                    dirnames.append(entry.name)
+                else:
+                    filenames.append(entry.name)
+            yield dirpath, dirnames, filenames
+            stack += [posixpath.join(dirpath, name)
+                      for name in reversed(dirnames)]
+
+    def stat(self, path, follow_symlinks=True):
+        '''get an os.stat_result for a path, like os.stat
+        '''
+        return self.get_stat(self.lookup(path, follow_symlinks))
+
+    def lstat(self, path):
+        '''get an os.stat_result for a path, without following a link
+        '''
+        return self.stat(path, follow_symlinks=False)
+
+    def readlink(self, path):
+        '''get the target of a symbolic link, like os.readlink
+        '''
+        inode = self.lookup(path, follow_symlinks=False)
+        if inode.type != SYMLINK:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL), path)
+        return inode.target
+
+    def exists(self, path):
+        '''determine if a path exists (following links)
+        '''
+        try:
+            self.lookup(path)
+        except OSError:
+            return False
+        return True
+
+################################################################################
+# Files
+################################################################################
+
+    def get_fragments(self):
+        '''get the list of fragment blocks, as (position, stored size)
+        '''
+        if self._fragments is None:
+            count = self.superblock.fragments
+            data = self._read_table(self.superblock.fragment_table, count,
+                                    FragmentEntry.size)
+            self._fragments = [entry[:2] for entry in
+                               FragmentEntry.iter_unpack(data)]
+        return self._fragments
+
+    def read_block(self, position, stored, length):
+        '''read (and decompress) a data block, or a fragment block. Blocks
+           are cached, and the least recently used is removed when full.
+
+           Parameters
+           ==========
+           position: the position of the block in the filesystem
+           stored: the stored size, with DATA_UNCOMPRESSED if it is (zero
+                   for a sparse block, of zeros)
+           length: the (least) size of the decompressed block
+        '''
+        size = stored & ~DATA_UNCOMPRESSED
+        if size == 0:
+            return bytes(length)
+
+        found = self._blocks.get(position)
+        if found is not None:
+            return found
+
+        data = self._pread(position, size)
+        if len(data) < size:
+            raise ValueError('%s has a truncated data block at %s' %
+                             (self.name, position))
+        if not stored & DATA_UNCOMPRESSED:
+            data = self.decompress(data, self.block_size)
+        if len(data) < length:
+            raise ValueError('%s has a short data block at %s' %
+                             (self.name, position))
+        return self._blocks.set(position, data)
+
+    def read_stored(self, position, stored):
+        '''read the bytes of a data block as stored (e.g., compressed),
+           without the cache. A sparse block has none.
+
+           Parameters
+           ==========
+           position: the position of the block in the filesystem
+           stored: the stored size, with DATA_UNCOMPRESSED if it is
+        '''
+        size = stored & ~DATA_UNCOMPRESSED
+        data = self._pread(position, size)
+        if len(data) < size:
+            raise ValueError('%s has a truncated data block at %s' %
+                             (self.name, position))
+        return data
+
+    def read_fragment(self, index, offset, length):
+        '''read the tail end of a file, from a fragment block
+
+           Parameters
+           ==========
+           index: the index of the fragment block
+           offset: the offset of the tail end in the (decompressed) block
+           length: the length of the tail end
+        '''
+        fragments = self.get_fragments()
+        if index >= len(fragments):
+            raise ValueError('%s does not have fragment %s' % (self.name, index))
+        position, stored = fragments[index]
+        block = self.read_block(position, stored, offset + length)
+        return block[offset:offset + length]
+
+    def iter_metadata(self, chunk_size=1024 * 1024):
+        '''yield the bytes of the metadata, as stored: from the inode table
+           to the end of the filesystem (the inode, directory, fragment and
+           id tables), a chunk at a time.
+
+           Parameters
+           ==========
+           chunk_size: the bytes to read at once
+        '''
+        position = self.superblock.inode_table
+        while position < self.superblock.bytes_used:
+            size = min(chunk_size, self.superblock.bytes_used - position)
+            data = self._pread(position, size)
+            if len(data) < size:
+                raise ValueError('%s is truncated' % self.name)
+            yield data
+            position += size
+
+    def extract(self, output, workers=None):
+        '''extract the filesystem to a directory, with the data blocks
+           decompressed in a pool of processes (see sif.squashfs.extract).
+           Returns a dictionary of counts, and the bytes written.
+
+           Parameters
+           ==========
+           output: the directory to extract to, which can't exist, or is empty
+           workers: the number of processes (defaults to the number of cpus)
+        '''
+        from sif.squashfs.extract import extract
+        return extract(self, output, workers=workers)
+
+    def open(self, path, mode='rb', encoding=None, errors=None):
+        '''open a file (following links) to read, as a seekable binary file
+           (mode "rb", see SquashFSFile), or as text (mode "r").
+
+           Parameters
+           ==========
+           path: the path of the file in the filesystem
+           mode: the mode, rb (default) or r
+           encoding: the encoding for text (defaults to utf-8)
+           errors: how to handle encoding errors, as for open
+        '''
+        if mode not in ['r', 'rb']:
+            raise ValueError('invalid mode %s, a squashfs is read only' % mode)
+
+        inode = self.lookup(path)
+        if inode.type == DIRECTORY:
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR),
+                                    path)
+        if inode.type != FILE:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL), path)
+
+        filey = SquashFSFile(self, inode, path)
+        if mode == 'rb':
+            return filey
+        return io.TextIOWrapper(io.BufferedReader(filey, self.block_size),
+                                encoding=encoding or 'utf-8', errors=errors)
+
+
+class DirEntry:
+    '''A DirEntry is an entry of a directory, from SquashFS.scandir. The
+       type is known from the listing, and the inode is read (once) for
+       stat, or to follow a link.
+    '''
+    __slots__ = ('squashfs', 'path', 'name', 'ref', 'type', '_inode')
+
+    def __init__(self, squashfs, path, name, ref, kind):
+        self.squashfs = squashfs
+        self.path = path
+        self.name = name
+        self.ref = ref
+        self.type = kind if kind <= 7 else kind - 7
+        self._inode = None
+
+    def __str__(self):
+        return "<DirEntry:%s>" % self.name
+
+    def __repr__(self):
+        return self.__str__()
+
+    def inode(self):
+        '''get the Inode of the entry (not following a link)
+        '''
+        if self._inode is None:
+            self._inode = self.squashfs.get_inode(self.ref)
+        return self._inode
+
+    def _get_type(self, follow_symlinks):
+        if self.type == SYMLINK and follow_symlinks:
+            try:
+                return self.squashfs.lookup(self.path).type
+            except OSError:
+                return None
+        return self.type
+
+    def is_dir(self, follow_symlinks=True):
+        return self._get_type(follow_symlinks) == DIRECTORY
+
+    def is_file(self, follow_symlinks=True):
+        return self._get_type(follow_symlinks) == FILE
+
+    def is_symlink(self):
+        return self.type == SYMLINK
+
+    def stat(self, follow_symlinks=True):
+        if self.type == SYMLINK and follow_symlinks:
+            return self.squashfs.stat(self.path)
+        return self.squashfs.get_stat(self.inode())
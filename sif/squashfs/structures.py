@@ -0,0 +1,123 @@
+'''
+
+Copyright (C) 2018-2019 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+The squashfs (4.0) format is developed and licensed as part of the Linux
+kernel, see fs/squashfs/squashfs_fs.h
+
+'''
+
+from sif.header.records import make_record
+from struct import Struct
+import stat
+
+SQUASHFS_MAGIC = 0x73717368
+
+# The superblock is at the start of the filesystem. Table locations (and
+# bytes_used) are offsets from the start, and are (all ones) if unused
+SuperblockStruct = Struct('<5I6H8Q')
+superblock_fields = ['magic', 'inode_count', 'mkfs_time', 'block_size',
+                     'fragments', 'compressor', 'block_log', 'flags',
+                     'id_count', 'major', 'minor', 'root_inode', 'bytes_used',
+                     'id_table', 'xattr_table', 'inode_table', 'dir_table',
+                     'fragment_table', 'export_table']
+Superblock = make_record('Superblock', superblock_fields)
+
+# Metadata (the inode, directory, fragment and id tables) is in blocks of
+# (up to) 8K, each after a 16 bit header with the stored length. If the
+# high bit is set, the block is stored uncompressed.
+METADATA_SIZE = 8192
+METADATA_UNCOMPRESSED = 0x8000
+
+# Data blocks have a 32 bit length, with the same flag in bit 24. A
+# length of zero is a sparse block (all zeros).
+DATA_UNCOMPRESSED = 1 << 24
+NO_FRAGMENT = 0xFFFFFFFF
+
+# Every inode starts with the same header. uid and gid are indexes into
+# the id table
+InodeHeader = Struct('<4H2I')
+
+# The rest of the inode depends on the type, and is followed by a list of
+# block sizes (files), the target (symlinks), or a directory index
+DIRECTORY = 1
+FILE = 2
+SYMLINK = 3
+BLOCK_DEVICE = 4
+CHAR_DEVICE = 5
+FIFO = 6
+SOCKET = 7
+EXT_DIRECTORY = 8
+EXT_FILE = 9
+EXT_SYMLINK = 10
+EXT_BLOCK_DEVICE = 11
+EXT_CHAR_DEVICE = 12
+EXT_FIFO = 13
+EXT_SOCKET = 14
+
+inode_structs = {
+    DIRECTORY: Struct('<2I2HI'),      # start, nlink, size, offset, parent
+    FILE: Struct('<4I'),              # start, fragment, fragment_offset, size
+    SYMLINK: Struct('<2I'),           # nlink, target size
+    BLOCK_DEVICE: Struct('<2I'),      # nlink, rdev
+    CHAR_DEVICE: Struct('<2I'),
+    FIFO: Struct('<I'),               # nlink
+    SOCKET: Struct('<I'),
+    EXT_DIRECTORY: Struct('<4I2HI'),  # nlink, size, start, parent, index
+                                      # count, offset, xattr
+    EXT_FILE: Struct('<3Q4I'),        # start, size, sparse, nlink, fragment,
+                                      # fragment_offset, xattr
+    EXT_SYMLINK: Struct('<2I'),       # as SYMLINK, xattr after the target
+    EXT_BLOCK_DEVICE: Struct('<3I'),  # nlink, rdev, xattr
+    EXT_CHAR_DEVICE: Struct('<3I'),
+    EXT_FIFO: Struct('<2I'),          # nlink, xattr
+    EXT_SOCKET: Struct('<2I')
+}
+
+# The file type bits (for st_mode) of each inode type, basic or extended
+file_types = {
+    DIRECTORY: stat.S_IFDIR,
+    FILE: stat.S_IFREG,
+    SYMLINK: stat.S_IFLNK,
+    BLOCK_DEVICE: stat.S_IFBLK,
+    CHAR_DEVICE: stat.S_IFCHR,
+    FIFO: stat.S_IFIFO,
+    SOCKET: stat.S_IFSOCK
+}
+
+# A directory is a list of runs of entries, each after a header with
+# the number of entries (minus one), the inode block, and an inode number
+# that entries are relative to. The name size is also minus one.
+DirectoryHeader = Struct('<3I')
+DirectoryEntry = Struct('<HhHH')    # offset, inode number delta, type, size
+
+# An extended directory (a large one) has an index, with an entry for runs
+# that start in a new metadata block: the offset of the run in the listing,
+# the position of the block (in the directory table), and the first name
+DirectoryIndex = Struct('<3I')      # index, start, name size (minus one)
+
+# The fragment table has an entry for each fragment block, and the id
+# table is a list of uid and gid values
+FragmentEntry = Struct('<QII')      # start, size, unused
+IdEntry = Struct('<I')
+
+# An Inode is the decoded inode for any type, with uid and gid resolved,
+# and the file type in mode. Fields that the type doesn't have are None.
+#
+#   ref: the reference (inode block << 16 | offset) the inode was read from
+#   start, offset: the directory listing (directories), or start is the
+#                  first data block (files)
+#   blocks: the stored sizes of the data blocks (files)
+#   fragment, fragment_offset: the tail end of the file (files)
+#   target: the target (symlinks)
+#   rdev: the device number (devices)
+#   index: the index of (index, start, first name) of a large directory
+Inode = make_record('Inode', ['ref', 'type', 'mode', 'uid', 'gid', 'mtime',
+                              'inode_number', 'nlink', 'size', 'start',
+                              'offset', 'parent', 'blocks', 'fragment',
+                              'fragment_offset', 'target', 'rdev', 'xattr',
+                              'index'])
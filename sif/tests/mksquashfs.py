@@ -0,0 +1,408 @@
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# A small squashfs (4.0, gzip) writer for tests, that builds a filesystem
+# from a tree of Dir, File, Link and Node entries in memory, so a test can
+# have names (e.g., "..") that a real folder can't. The layout is the one of
+# mksquashfs: data blocks (and fragments) first, then the inode, directory,
+# fragment and id tables. A directory listing that crosses a metadata block
+# gets a new header there, and an extended inode with an index of those
+# headers. With table_gap, the metadata blocks of the fragment and id tables
+# aren't consecutive, as only the list of their positions says where they
+# are. The same entry (a File) in two places is a hard link.
+#
+# The fixture data/rootfs.sqfs is the tree of get_rootfs, written with:
+#
+#     python -m sif.tests.mksquashfs sif/tests/data/rootfs.sqfs
+
+from sif.squashfs.structures import (
+    SQUASHFS_MAGIC,
+    METADATA_SIZE,
+    METADATA_UNCOMPRESSED,
+    DATA_UNCOMPRESSED,
+    NO_FRAGMENT,
+    DirectoryEntry,
+    DirectoryHeader,
+    FragmentEntry,
+    IdEntry,
+    InodeHeader,
+    SuperblockStruct,
+    inode_structs
+)
+import hashlib
+import struct
+import sys
+import zlib
+
+UNUSED = 0xFFFFFFFFFFFFFFFF
+NO_XATTR = 0xFFFFFFFF
+
+
+class Dir:
+    '''a directory, with a dictionary of entries by name, or a list of
+       (name, entry), which can have a name twice
+    '''
+    def __init__(self, entries=None, mode=0o755, uid=0, gid=0):
+        self.entries = entries or dict()
+        self.mode, self.uid, self.gid = mode, uid, gid
+
+    def items(self):
+        '''the (name, entry) pairs, sorted by name (as bytes)
+        '''
+        items = self.entries
+        if isinstance(items, dict):
+            items = items.items()
+        return sorted(items, key=lambda item: item[0].encode('utf-8'))
+
+
+class File:
+    def __init__(self, data=b'', mode=0o644, uid=0, gid=0):
+        self.data = data
+        self.mode, self.uid, self.gid = mode, uid, gid
+
+
+class Link:
+    def __init__(self, target, uid=0, gid=0):
+        self.target = target
+        self.mode, self.uid, self.gid = 0o777, uid, gid
+
+
+class Node:
+    '''a fifo (type 6), or a block (4) or character (5) device
+    '''
+    def __init__(self, kind=6, rdev=0, mode=0o644, uid=0, gid=0):
+        self.kind, self.rdev = kind, rdev
+        self.mode, self.uid, self.gid = mode, uid, gid
+
+
+def _compress(data):
+    compressed = zlib.compress(data, 9)
+    return compressed if len(compressed) < len(data) else None
+
+
+class _MetadataWriter:
+    '''write metadata (e.g., inodes) in blocks of METADATA_SIZE
+    '''
+    def __init__(self):
+        self.blocks = []
+        self.size = 0
+        self.buffer = bytearray()
+
+    def position(self):
+        '''the (stored) position of the current block, and the offset in it
+        '''
+        return self.size, len(self.buffer)
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= METADATA_SIZE:
+            self._flush(bytes(self.buffer[:METADATA_SIZE]))
+            del self.buffer[:METADATA_SIZE]
+
+    def _flush(self, data):
+        compressed = _compress(data)
+        if compressed is None:
+            block = struct.pack('<H', len(data) | METADATA_UNCOMPRESSED) + data
+        else:
+            block = struct.pack('<H', len(compressed)) + compressed
+        self.blocks.append(block)
+        self.size += len(block)
+
+    def finish(self):
+        if self.buffer:
+            self._flush(bytes(self.buffer))
+            self.buffer = bytearray()
+        return self.blocks
+
+
+def build_squashfs(root, block_size=4096, mtime=1500000000, ids=(),
+                   table_gap=0):
+    '''build a squashfs filesystem from a Dir, and return the bytes.
+
+       Parameters
+       ==========
+       root: the Dir at the root
+       block_size: the block size (a power of two, at least 4096)
+       mtime: the modification time of every inode
+       ids: uid and gid values to add to the id table (e.g., to fill it)
+       table_gap: bytes to put between the blocks of the fragment and id
+                  tables
+    '''
+    builder = _Builder(block_size, mtime, table_gap)
+    for value in ids:
+        builder.get_id(value)
+    return builder.build(root)
+
+
+class _Builder:
+
+    def __init__(self, block_size, mtime, table_gap):
+        self.block_size = block_size
+        self.mtime = mtime
+        self.table_gap = table_gap
+        self.data = bytearray(SuperblockStruct.size)
+        self.inodes = _MetadataWriter()
+        self.directories = _MetadataWriter()
+        self.fragments = []
+        self.fragment = bytearray()
+        self.ids = []
+        self.numbers = dict()
+        self.refs = dict()
+        self.links = dict()
+
+    def get_id(self, value):
+        if value not in self.ids:
+            self.ids.append(value)
+        return self.ids.index(value)
+
+    def _number(self, entry):
+        '''number the inodes, parents before children (the root is 1),
+           and count the links to each
+        '''
+        self.links[id(entry)] = self.links.get(id(entry), 0) + 1
+        if id(entry) in self.numbers:
+            return
+        self.numbers[id(entry)] = len(self.numbers) + 1
+        if isinstance(entry, Dir):
+            for name, child in entry.items():
+                self._number(child)
+
+    def build(self, root):
+        self._number(root)
+        root_ref = self._write(root, len(self.numbers) + 1)
+        self._flush_fragment()
+
+        inode_table = len(self.data)
+        self.data += b''.join(self.inodes.finish())
+        dir_table = len(self.data)
+        self.data += b''.join(self.directories.finish())
+
+        entries = b''.join(FragmentEntry.pack(start, size, 0)
+                           for start, size in self.fragments)
+        fragment_table = self._write_table(entries) if entries else UNUSED
+        id_table = self._write_table(b''.join(IdEntry.pack(value)
+                                              for value in self.ids))
+
+        superblock = SuperblockStruct.pack(
+            SQUASHFS_MAGIC, len(self.numbers), self.mtime, self.block_size,
+            len(self.fragments), 1, self.block_size.bit_length() - 1, 0,
+            len(self.ids), 4, 0, root_ref, len(self.data), id_table, UNUSED,
+            inode_table, dir_table, fragment_table, UNUSED)
+        self.data[:SuperblockStruct.size] = superblock
+        self.data += bytes(-len(self.data) % 4096)
+        return bytes(self.data)
+
+    def _write_table(self, data):
+        '''write a table in metadata blocks, and the list of their positions
+        '''
+        writer = _MetadataWriter()
+        writer.write(data)
+        positions = []
+        for block in writer.finish():
+            if positions:
+                self.data += b'\xff' * self.table_gap
+            positions.append(len(self.data))
+            self.data += block
+        start = len(self.data)
+        self.data += struct.pack('<%sQ' % len(positions), *positions)
+        return start
+
+    def _header(self, kind, entry):
+        return InodeHeader.pack(kind, entry.mode, self.get_id(entry.uid),
+                                self.get_id(entry.gid), self.mtime,
+                                self.numbers[id(entry)])
+
+    def _write(self, entry, parent):
+        '''write an entry (and for a directory, its children), and return
+           the reference of its inode
+        '''
+        if id(entry) in self.refs:
+            return self.refs[id(entry)]
+
+        if isinstance(entry, Dir):
+            children = []
+            for name, child in entry.items():
+                ref = self._write(child, self.numbers[id(entry)])
+                children.append((name.encode('utf-8'), ref,
+                                 self.numbers[id(child)], _get_type(child)))
+            inode = self._write_directory(entry, parent, children)
+        elif isinstance(entry, File):
+            inode = self._write_file(entry)
+        elif isinstance(entry, Link):
+            target = entry.target.encode('utf-8')
+            inode = self._header(3, entry) + \
+                    inode_structs[3].pack(1, len(target)) + target
+        else:
+            body = inode_structs[entry.kind].pack(1, entry.rdev) \
+                   if entry.kind in [4, 5] else inode_structs[6].pack(1)
+            inode = self._header(entry.kind, entry) + body
+
+        block, offset = self.inodes.position()
+        self.inodes.write(inode)
+        self.refs[id(entry)] = block << 16 | offset
+        return self.refs[id(entry)]
+
+    def _write_directory(self, entry, parent, children):
+        '''write the listing of a directory, with a new header for each run
+           of entries in one inode block, and in one directory block
+        '''
+        start, offset = self.directories.position()
+
+        # Runs of (directory block, inode block, inode number, names, entries)
+        runs = []
+        position = offset
+        for name, ref, number, kind in children:
+            run = runs[-1] if runs else None
+            if run is None or len(run[4]) == 256 or ref >> 16 != run[1] or \
+               not -32768 <= number - run[2] <= 32767 or \
+               position // METADATA_SIZE != run[0]:
+                run = (position // METADATA_SIZE, ref >> 16, number, [], [])
+                runs.append(run)
+                position += DirectoryHeader.size
+            item = DirectoryEntry.pack(ref & 0xFFFF, number - run[2], kind,
+                                       len(name) - 1) + name
+            run[3].append(name)
+            run[4].append(item)
+            position += len(item)
+
+        # A run that starts in another directory block is in the index
+        length = 0
+        index = []
+        for block, inode_block, number, names, items in runs:
+            if length and block != previous:
+                index.append((length, self.directories.position()[0],
+                              names[0]))
+            previous = block
+            self.directories.write(DirectoryHeader.pack(len(items) - 1,
+                                                        inode_block, number))
+            self.directories.write(b''.join(items))
+            length += DirectoryHeader.size + sum(len(item) for item in items)
+
+        nlink = 2 + sum(1 for child in children if child[3] == 1)
+        if index:
+            inode = self._header(8, entry) + inode_structs[8].pack(
+                nlink, length + 3, start, parent, len(index), offset,
+                NO_XATTR)
+            for position, block, name in index:
+                inode += struct.pack('<3I', position, block,
+                                     len(name) - 1) + name
+            return inode
+        return self._header(1, entry) + inode_structs[1].pack(
+            start, nlink, length + 3, offset, parent)
+
+    def _write_file(self, entry):
+        '''write the data blocks of a file, and the tail end in a fragment.
+           A block of zeros is sparse, and a file in two places (or with
+           sparse blocks) has an extended inode.
+        '''
+        data = entry.data
+        count, tail = divmod(len(data), self.block_size)
+        start = len(self.data)
+        blocks = []
+        sparse = 0
+        for index in range(count):
+            block = data[index * self.block_size:(index + 1) * self.block_size]
+            if not block.strip(b'\0'):
+                blocks.append(0)
+                sparse += len(block)
+                continue
+            compressed = _compress(block)
+            if compressed is None:
+                self.data += block
+                blocks.append(len(block) | DATA_UNCOMPRESSED)
+            else:
+                self.data += compressed
+                blocks.append(len(compressed))
+
+        fragment, fragment_offset = NO_FRAGMENT, 0
+        if tail:
+            if len(self.fragment) + tail > self.block_size:
+                self._flush_fragment()
+            fragment, fragment_offset = len(self.fragments), len(self.fragment)
+            self.fragment += data[-tail:]
+
+        sizes = struct.pack('<%sI' % len(blocks), *blocks)
+        nlink = self.links.get(id(entry), 1)
+        if nlink > 1 or sparse:
+            return self._header(9, entry) + inode_structs[9].pack(
+                start, len(data), sparse, nlink, fragment, fragment_offset,
+                NO_XATTR) + sizes
+        return self._header(2, entry) + inode_structs[2].pack(
+            start, fragment, fragment_offset, len(data)) + sizes
+
+    def _flush_fragment(self):
+        if not self.fragment:
+            return
+        data = bytes(self.fragment)
+        compressed = _compress(data)
+        self.fragments.append((len(self.data), len(compressed) if compressed
+                               else len(data) | DATA_UNCOMPRESSED))
+        self.data += compressed or data
+        self.fragment = bytearray()
+
+
+def _get_type(entry):
+    if isinstance(entry, Dir):
+        return 1
+    if isinstance(entry, File):
+        return 2
+    if isinstance(entry, Link):
+        return 3
+    return entry.kind
+
+
+def get_bytes(name, size):
+    '''get size bytes that don't compress, the same for the same name
+    '''
+    data = bytearray()
+    digest = name.encode('utf-8')
+    while len(data) < size:
+        digest = hashlib.sha256(digest).digest()
+        data += digest
+    return bytes(data[:size])
+
+
+def get_rootfs():
+    '''get the tree of the fixture (data/rootfs.sqfs): a file of three
+       (uncompressed) blocks with a tail in a fragment, small files in
+       fragments, a sparse file, a hard link, links, a device and a fifo,
+       and a directory (many) with a listing of more than one metadata
+       block, so it has an index. The id table (with 2100 more ids) and the
+       fragment table (with a fragment for each file in many) are more
+       than one block.
+    '''
+    release = File(b'NAME="sif"\nID=sif\n')
+    block = b'sif ' * 1024
+    many = dict(('file-%03d' % index,
+                 File((b'%03d ' % index) * 525, uid=1000, gid=1000))
+                for index in range(520))
+    return Dir({
+        'bin': Dir({'busybox': File(get_bytes('busybox', 3 * 4096 + 100),
+                                    mode=0o4755),
+                    'sh': Link('busybox')}),
+        'data': Dir({'empty': File(),
+                     'exact': File(block),
+                     'sparse': File(block + bytes(4096) + block, mode=0o600,
+                                    uid=1000, gid=1000)}, mode=0o750),
+        'dev': Dir({'fifo': Node(6),
+                    'null': Node(5, rdev=1 << 8 | 3, mode=0o666)}),
+        'etc': Dir({'bin': Link('/bin'),
+                    'hostname': File(b'sif\n'),
+                    'os-release': release}),
+        'many': Dir(many),
+        'usr': Dir({'lib': Dir({'os-release': release})})
+    })
+
+
+def build_rootfs():
+    '''build the fixture (see get_rootfs)
+    '''
+    return build_squashfs(get_rootfs(), ids=range(10000, 12100), table_gap=16)
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1], 'wb') as filey:
+        filey.write(build_rootfs())
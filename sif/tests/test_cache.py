@@ -0,0 +1,166 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Caching entries and parsed headers keyed by a stat of the image, in a
+# Singularity cache in a temporary folder
+
+from sif.header import get_structure
+from sif.main import cache
+from sif.main.cache import ( HeaderCache, StatCache, get_header_cache )
+from sif.main.decode import decode_image
+from sif.main.writer import SIFWriter
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.environ = dict((name, os.environ.get(name)) for name in
+                            ['SINGULARITY_CACHEDIR', 'SINGULARITY_DISABLE_CACHE'])
+        os.environ['SINGULARITY_CACHEDIR'] = os.path.join(self.tmpdir, 'cache')
+        os.environ.pop('SINGULARITY_DISABLE_CACHE', None)
+        cache._caches.clear()
+
+        self.SIF = get_structure()
+        self.image = os.path.join(self.tmpdir, 'image.sif')
+        writer = SIFWriter(self.image)
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        writer.add_partition(os.urandom(10000), name='rootfs')
+        writer.write()
+
+    def tearDown(self):
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        cache._caches.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def decode(self):
+        with open(self.image, 'rb') as filey:
+            data = filey.read()
+        return decode_image(lambda offset, length, phase:
+                            data[offset:offset + length], self.SIF)
+
+    def test_hit(self):
+        '''an entry is loaded for the same image, and a header is the same
+           as the one parsed
+        '''
+        entries = StatCache('sif-test')
+        key = entries.get_key(self.image, 'v1')
+        self.assertTrue(key.startswith('v1-'))
+        self.assertIsNone(entries.load(key))
+        entries.save(key, {'answer': 42})
+        self.assertEqual(entries.load(entries.get_key(self.image, 'v1')),
+                         {'answer': 42})
+        self.assertIsNone(entries.load(entries.get_key(self.image, 'v2')))
+
+        # An entry that isn't JSON is not cached
+        entries.save(key, {'answer': b'42'})
+        self.assertEqual(entries.load(key), {'answer': 42})
+
+        meta, table = self.decode()
+        headers = get_header_cache()
+        self.assertIsInstance(headers, HeaderCache)
+        self.assertIs(get_header_cache(), headers)
+        key = headers.get_key(self.image)
+        self.assertIsNone(headers.get(key, self.SIF))
+        headers.set(key, meta, table)
+
+        cached_meta, cached_table = headers.get(key, self.SIF)
+        self.assertEqual(dict(cached_meta), dict(meta))
+        self.assertEqual([dict(d) for d in cached_table],
+                         [dict(d) for d in table])
+        self.assertEqual(cached_table.slots, table.slots)
+
+        # An entry without the fields of a header is parsed again
+        headers.save(key, {'meta': dict(meta)})
+        self.assertIsNone(headers.get(key, self.SIF))
+
+    def test_miss(self):
+        '''a changed modification time or size is a miss
+        '''
+        entries = StatCache('sif-test')
+        key = entries.get_key(self.image)
+        entries.save(key, {'answer': 42})
+
+        st = os.stat(self.image)
+        os.utime(self.image, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        changed = entries.get_key(self.image)
+        self.assertNotEqual(changed, key)
+        self.assertIsNone(entries.load(changed))
+
+        # The same time, and a byte more
+        with open(self.image, 'ab') as filey:
+            filey.write(b'\0')
+        os.utime(self.image, ns=(st.st_atime_ns, st.st_mtime_ns))
+        changed = entries.get_key(self.image)
+        self.assertNotEqual(changed, key)
+        self.assertIsNone(entries.load(changed))
+
+    def test_disable(self):
+        '''SINGULARITY_DISABLE_CACHE, or a cache that can't be created,
+           runs uncached
+        '''
+        os.environ['SINGULARITY_DISABLE_CACHE'] = 'yes'
+        for entries in [StatCache('sif-test'), HeaderCache()]:
+            self.assertTrue(entries.disable)
+            self.assertIsNone(entries.get_key(self.image))
+            entries.save(None, {'answer': 42})
+            self.assertIsNone(entries.load(None))
+            entries.evict()
+            entries.clear()
+        self.assertIsNone(get_header_cache().get(None, self.SIF))
+        self.assertFalse(os.path.exists(os.environ['SINGULARITY_CACHEDIR']))
+
+        del os.environ['SINGULARITY_DISABLE_CACHE']
+        self.assertFalse(StatCache('sif-test').disable)
+        self.assertTrue(StatCache('sif-test', disable=True).disable)
+
+        # A file where the cache folder should be
+        os.environ['SINGULARITY_CACHEDIR'] = self.image
+        entries = StatCache('sif-test')
+        self.assertTrue(entries.disable)
+        self.assertIsNone(entries.get_key(self.image))
+
+    def test_evict(self):
+        '''the oldest entries are removed when the cache is over max_size
+        '''
+        entries = StatCache('sif-test', max_size=1000)
+        paths = []
+        for index in range(10):
+            key = 'entry-%s' % index
+            entries.save(key, {'data': 'x' * 180})
+            paths.append(entries._get_path(key))
+            os.utime(paths[-1], ns=(index * 10 ** 9, index * 10 ** 9))
+
+        entries.evict()
+        kept = [os.path.exists(path) for path in paths]
+        self.assertEqual(kept, [False] * 5 + [True] * 5)
+        self.assertEqual(entries.load('entry-9'), {'data': 'x' * 180})
+        self.assertIsNone(entries.load('entry-0'))
+
+        # Writes evict now and then, without a call to evict
+        entries.writes = 64
+        for index in range(10, 15):
+            entries.save('entry-%s' % index, {'data': 'x' * 180})
+        self.assertEqual(len([name for name in os.listdir(entries.cache_dir)
+                              if name.endswith('.json')]), 9)
+
+        entries.clear()
+        self.assertEqual([name for name in os.listdir(entries.cache_dir)
+                          if name.endswith('.json')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Decoding headers and descriptor tables, of whole and truncated images
+
+from sif.header import get_structure
+from sif.main import SIFHeader
+from sif.main.decode import decode_image
+from sif.main.scan import scan_image
+from sif.main.writer import SIFWriter
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestDecode(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.SIF = get_structure()
+        self.image = os.path.join(self.tmpdir, 'image.sif')
+        writer = SIFWriter(self.image)
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        writer.add_partition(os.urandom(10000), name='rootfs')
+        writer.write()
+        with open(self.image, 'rb') as filey:
+            self.data = filey.read()
+
+        # Cut in the descriptor table, after the first descriptors
+        self.truncated = os.path.join(self.tmpdir, 'truncated.sif')
+        with open(self.truncated, 'wb') as filey:
+            filey.write(self.data[:5000])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, data):
+        return lambda offset, length, phase: data[offset:offset + length]
+
+    def test_decode_image(self):
+        '''an image is decoded, and a truncated table is an error
+        '''
+        meta, table = decode_image(self.read(self.data), self.SIF)
+        self.assertEqual([d['ID'] for d in table], [1, 2])
+        self.assertEqual(meta['dtotal'], self.SIF.HeaderBase.DescrNumEntries)
+
+        with self.assertRaises(ValueError):
+            decode_image(self.read(self.data[:5000]), self.SIF)
+        with self.assertRaises(ValueError):
+            decode_image(self.read(self.data[:100]), self.SIF)
+        self.assertIsNone(decode_image(self.read(b'\0' * 5000), self.SIF))
+
+    def test_truncated(self):
+        '''a truncated table fails a header, and a scan of the image
+        '''
+        self.assertEqual(len(SIFHeader(self.image, cache=False).descriptors), 2)
+        with self.assertRaises(SystemExit):
+            SIFHeader(self.truncated, cache=False)
+        with self.assertRaises(SystemExit):
+            SIFHeader(self.truncated, lazy=True, cache=False).descriptors
+
+        result = scan_image(self.truncated, cache=False)
+        self.assertIn('truncated SIF descriptor table', result['error'])
+        self.assertNotIn('error', scan_image(self.image, cache=False))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_arrays(self):
+        '''a truncated image is skipped when loading arrays
+        '''
+        from sif.main.arrays import load_arrays
+        arrays = load_arrays([self.image, self.truncated])
+        self.assertEqual(arrays.images, [self.image])
+        self.assertEqual(len(arrays.descriptors), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Comparing the fixture rootfs (see mksquashfs.get_rootfs) to a rebuild
+# with changes, as filesystems and as the partitions of two images
+
+from sif.main import cache
+from sif.main.diff import ( diff, diff_files, has_changes )
+from sif.main.readers import BytesReader
+from sif.main.writer import SIFWriter
+from sif.squashfs.reader import SquashFS
+from sif.tests.mksquashfs import ( build_squashfs, get_rootfs, Dir, File )
+from sif.tests.test_squashfs import ( BUSYBOX, ROOTFS )
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class CountingReader(BytesReader):
+    '''a reader of bytes that keeps the offset of each read
+    '''
+    def __init__(self, data):
+        BytesReader.__init__(self, data)
+        self.offsets = []
+
+    def pread(self, offset, length):
+        self.offsets.append(offset)
+        return BytesReader.pread(self, offset, length)
+
+
+class TestDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.environ = os.environ.get('SINGULARITY_CACHEDIR')
+        os.environ['SINGULARITY_CACHEDIR'] = os.path.join(self.tmpdir, 'cache')
+        cache._caches.clear()
+
+        with open(ROOTFS, 'rb') as filey:
+            self.rootfs = filey.read()
+
+        # A rebuild: a byte of the (uncompressed) busybox and the hostname
+        # change without changing a size, and files are added and removed
+        root = get_rootfs()
+        busybox = bytearray(BUSYBOX)
+        busybox[5000] ^= 0xff
+        self.busybox = bytes(busybox)
+        root.entries['bin'].entries['busybox'].data = self.busybox
+        root.entries['etc'].entries['hostname'] = File(b'box\n')
+        root.entries['etc'].entries['motd'] = File(b'hello\n')
+        root.entries['etc'].entries['os-release'].mode = 0o600
+        root.entries['data'] = Dir({'exact': File(b'sif ' * 1000),
+                                    'empty': Dir()}, mode=0o750)
+        del root.entries['dev']
+        self.rebuild = build_squashfs(root, ids=range(10000, 12100),
+                                      table_gap=16)
+
+    def tearDown(self):
+        if self.environ is None:
+            del os.environ['SINGULARITY_CACHEDIR']
+        else:
+            os.environ['SINGULARITY_CACHEDIR'] = self.environ
+        cache._caches.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, partition):
+        writer = SIFWriter(os.path.join(self.tmpdir, name))
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        writer.add_partition(partition, name='rootfs')
+        return writer.write()
+
+    def check_files(self, result, content=False):
+        '''check the differences of the fixture and the rebuild
+        '''
+        self.assertEqual(result['added'], ['/etc/motd'])
+        self.assertEqual(result['removed'], ['/data/sparse', '/dev',
+                                             '/dev/fifo', '/dev/null'])
+
+        changed = dict((item.pop('path'), item) for item in result['changed'])
+        expected = ['/data/empty', '/data/exact', '/etc/hostname',
+                    '/etc/os-release', '/usr/lib/os-release']
+        if content:
+            expected.insert(0, '/bin/busybox')
+            self.assertEqual(changed['/bin/busybox']['digest'],
+                             [hashlib.sha256(BUSYBOX).hexdigest(),
+                              hashlib.sha256(self.busybox).hexdigest()])
+        self.assertEqual(sorted(changed), expected)
+
+        self.assertEqual(changed['/data/exact'], {'size': [4096, 4000]})
+        self.assertEqual(changed['/etc/hostname']['digest'],
+                         [hashlib.sha256(b'sif\n').hexdigest(),
+                          hashlib.sha256(b'box\n').hexdigest()])
+        self.assertEqual(changed['/etc/os-release'], {'mode': [0o100644,
+                                                               0o100600]})
+        self.assertEqual(changed['/data/empty'], {'mode': [0o100644,
+                                                           0o040755]})
+
+    def test_diff_files(self):
+        '''files are compared by metadata, and by content with content=True
+        '''
+        self.check_files(diff_files(SquashFS(self.rootfs),
+                                    SquashFS(self.rebuild)))
+        self.check_files(diff_files(SquashFS(self.rootfs),
+                                    SquashFS(self.rebuild), content=True),
+                         content=True)
+
+    def test_no_data_read(self):
+        '''without content, only the blocks of changed files are read
+        '''
+        squashfs1 = SquashFS(CountingReader(self.rootfs))
+        squashfs2 = SquashFS(CountingReader(self.rebuild))
+        diff_files(squashfs1, squashfs2)
+
+        # The blocks of busybox and many files of the same size aren't read
+        for squashfs in [squashfs1, squashfs2]:
+            busybox = squashfs.lookup('/bin/busybox')
+            end = busybox.start + sum(size & 0xffffff
+                                      for size in busybox.blocks)
+            reads = [offset for offset in squashfs.reader.offsets
+                     if busybox.start <= offset < end]
+            self.assertEqual(reads, [])
+
+    def test_same_metadata(self):
+        '''filesystems with the same metadata aren't walked, unless the
+           content is compared
+        '''
+        same = SquashFS(CountingReader(self.rootfs))
+        result = diff_files(SquashFS(self.rootfs), same)
+        self.assertEqual(result, {'added': [], 'removed': [], 'changed': []})
+        self.assertTrue(all(offset >= same.superblock.inode_table
+                            for offset in same.reader.offsets[1:]))
+        self.assertEqual(same._directories, {})
+
+        # A byte of busybox is only found by content
+        inode = SquashFS(self.rootfs).lookup('/bin/busybox')
+        changed = bytearray(self.rootfs)
+        changed[inode.start + 5000] ^= 0xff
+        self.assertEqual(diff_files(SquashFS(self.rootfs),
+                                    SquashFS(bytes(changed)))['changed'], [])
+        result = diff_files(SquashFS(self.rootfs), SquashFS(bytes(changed)),
+                            content=True)
+        self.assertEqual([item['path'] for item in result['changed']],
+                         ['/bin/busybox'])
+
+    def test_diff(self):
+        '''two images are compared by headers, descriptors and files
+        '''
+        image1 = self.write('image-1.sif', self.rootfs)
+        image2 = self.write('image-2.sif', self.rebuild)
+        result = diff(image1, image2)
+        self.assertTrue(has_changes(result))
+        self.assertIn('uuid', result['meta'])
+        self.assertEqual(result['descriptors'], {'added': [], 'removed': [],
+                                                 'changed': {}})
+        self.check_files(result['files'])
+        self.check_files(diff(image1, image2, content=True)['files'],
+                         content=True)
+
+        self.assertIsNone(diff(image1, image2, files=False)['files'])
+        result = diff(image1, self.write('image-3.sif', self.rootfs))
+        self.assertEqual(result['files'], {'added': [], 'removed': [],
+                                           'changed': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Changes to the descriptors of an existing image, in place
+
+from sif.header import get_structure
+from sif.main import SIFHeader
+from sif.main.editor import SIFEditor
+from sif.main.writer import SIFWriter
+from struct import calcsize
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestEditor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, 'image.sif')
+        writer = SIFWriter(self.image)
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        writer.add_partition(os.urandom(10000), name='rootfs')
+        writer.write()
+
+        self.SIF = get_structure()
+        self.meta = SIFHeader(self.image, cache=False).meta
+        self.size = self.SIF.DescriptorStruct.size
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_entry(self, slot):
+        with open(self.image, 'rb') as filey:
+            filey.seek(self.meta['descroff'] + slot * self.size)
+            return filey.read(self.size)
+
+    def test_update_keeps_entry(self):
+        '''an update only changes the given fields (and Mtime), and keeps
+           a name that isn't utf-8, and the bytes past the extra fields
+        '''
+        base = self.SIF.HeaderBase
+        name_offset = calcsize(self.SIF.Partition.fmt)
+        extra_offset = name_offset + base.DescrNameLen
+        tail_offset = extra_offset + self.SIF.Partition.ExtraStruct.size
+
+        entry = bytearray(self.read_entry(1))
+        entry[name_offset:name_offset + 4] = b'\xff\xfe\x00\x00'
+        entry[tail_offset:tail_offset + 4] = b'tail'
+        with open(self.image, 'r+b') as filey:
+            filey.seek(self.meta['descroff'] + self.size)
+            filey.write(entry)
+
+        descriptor = SIFEditor(self.image).update(2, Link=1, Mtime=42)
+        self.assertTrue(descriptor['name'].startswith(b'\xff\xfe'))
+
+        changed = self.read_entry(1)
+        self.assertEqual(changed[name_offset:], bytes(entry[name_offset:]))
+        partition = SIFHeader(self.image, cache=False).descriptors.get(2)
+        self.assertEqual(partition['Link'], 1)
+        self.assertEqual(partition['Mtime'], 42)
+        self.assertEqual(partition['fstype'], 1)
+
+        # Only the bytes of Link and Mtime differ
+        differ = [i for i in range(self.size) if changed[i] != entry[i]]
+        self.assertTrue(differ)
+        self.assertTrue(all(i < name_offset for i in differ))
+
+    def test_update_name(self):
+        '''a new name is written, and the extra fields are kept
+        '''
+        SIFEditor(self.image).update(2, name='system', arch='01')
+        partition = SIFHeader(self.image, cache=False).descriptors.get(2)
+        self.assertEqual(partition['name'], 'system')
+        self.assertEqual(partition['arch'], '01')
+        self.assertEqual(partition['fstype'], 1)
+
+    def test_add_after_end(self):
+        '''new data goes after the end of the file, if it is past the data
+        '''
+        trailing = b'tail' * 1000
+        with open(self.image, 'ab') as filey:
+            filey.write(trailing)
+        size = os.stat(self.image).st_size
+
+        signature = b'-----BEGIN PGP SIGNED MESSAGE-----\n' * 10
+        descriptor_id = SIFEditor(self.image).add_signature(signature, link=2)
+        header = SIFHeader(self.image, cache=False)
+        descriptor = header.descriptors.get(descriptor_id)
+        self.assertGreaterEqual(descriptor['Fileoff'], size)
+        self.assertEqual(descriptor['Fileoff'] % 4096, 0)
+        self.assertEqual(header.read_data(descriptor), signature)
+        self.assertEqual(header.meta['datalen'] + header.meta['dataoff'],
+                         os.stat(self.image).st_size)
+
+        with open(self.image, 'rb') as filey:
+            filey.seek(size - len(trailing))
+            self.assertEqual(filey.read(len(trailing)), trailing)
+
+
+if __name__ == '__main__':
+    unittest.main()
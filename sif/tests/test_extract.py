@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Extracting the fixture rootfs (see mksquashfs.get_rootfs), and crafted
+# filesystems, to a temporary folder
+
+from sif.squashfs.extract import ( _create, write_blocks )
+from sif.squashfs.reader import SquashFS
+from sif.squashfs.structures import DIRECTORY, SYMLINK, FILE
+from sif.tests.mksquashfs import ( build_squashfs, Dir, File, Link )
+from sif.tests.test_squashfs import ROOTFS
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+
+class TestExtract(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, 'rootfs')
+
+    def tearDown(self):
+        for dirpath, dirnames, filenames in os.walk(self.tmpdir):
+            for name in dirnames:
+                os.chmod(os.path.join(dirpath, name), 0o700)
+        shutil.rmtree(self.tmpdir)
+
+    def check_tree(self, squashfs, output):
+        '''compare an extracted tree to the filesystem: the types, modes,
+           times, link targets and content
+        '''
+        for dirpath, dirnames, filenames in squashfs.walk():
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                inode = squashfs.lookup(path, follow_symlinks=False)
+                target = os.path.join(output, path.lstrip('/'))
+                if inode.type not in [DIRECTORY, FILE, SYMLINK] and \
+                   not os.path.lexists(target):
+                    continue
+
+                st = os.lstat(target)
+                self.assertEqual(stat.S_IFMT(st.st_mode),
+                                 stat.S_IFMT(inode.mode), path)
+                if inode.type == SYMLINK:
+                    self.assertEqual(os.readlink(target), inode.target)
+                    continue
+                self.assertEqual(stat.S_IMODE(st.st_mode), inode.mode & 0o7777,
+                                 path)
+                self.assertEqual(st.st_mtime, inode.mtime, path)
+                if inode.type == FILE:
+                    with open(target, 'rb') as filey:
+                        self.assertEqual(filey.read(),
+                                         squashfs.open(path).read(), path)
+
+    def test_extract(self):
+        '''the fixture is extracted in a pool of processes, or in this one
+        '''
+        for workers in [2, 1]:
+            output = os.path.join(self.tmpdir, 'rootfs-%s' % workers)
+            squashfs = SquashFS(ROOTFS)
+            counts = squashfs.extract(output, workers=workers)
+            self.assertEqual(counts['directories'], 8)
+            self.assertEqual(counts['files'], 526)
+            self.assertEqual(counts['symlinks'], 2)
+            self.assertEqual(counts['hardlinks'], 1)
+            self.check_tree(squashfs, output)
+
+            # A hard link is one file, and a sparse file is kept sparse
+            self.assertTrue(os.path.samefile(
+                os.path.join(output, 'etc', 'os-release'),
+                os.path.join(output, 'usr', 'lib', 'os-release')))
+            sparse = os.stat(os.path.join(output, 'data', 'sparse'))
+            self.assertLess(sparse.st_blocks * 512, sparse.st_size)
+
+            # Devices need root, a fifo doesn't
+            null = os.path.join(output, 'dev', 'null')
+            if os.geteuid() == 0:
+                self.assertTrue(stat.S_ISCHR(os.lstat(null).st_mode))
+            else:
+                self.assertFalse(os.path.lexists(null))
+                self.assertEqual(counts['skipped'], 1)
+            self.assertTrue(stat.S_ISFIFO(os.lstat(
+                os.path.join(output, 'dev', 'fifo')).st_mode))
+
+    def test_metadata_last(self):
+        '''modes and times are set after the content, children first, so
+           a read only directory has its files
+        '''
+        root = Dir({'locked': Dir({'file': File(b'data' * 2000, mode=0o400),
+                                   'sub': Dir({'file': File(b'x')},
+                                              mode=0o500)}, mode=0o500)})
+        squashfs = SquashFS(build_squashfs(root))
+        squashfs.extract(self.output, workers=1)
+        self.check_tree(squashfs, self.output)
+        self.assertEqual(os.stat(os.path.join(self.output, 'locked')).st_mtime,
+                         1500000000)
+
+    def test_invalid_names(self):
+        '''names that would leave the tree are skipped
+        '''
+        root = Dir([('..', File(b'parent')), ('a/b', File(b'slash')),
+                    ('.', Dir()), ('ok', Dir([('../../escape', File(b'x'))]))])
+        SquashFS(build_squashfs(root)).extract(self.output, workers=1)
+
+        self.assertEqual(os.listdir(self.output), ['ok'])
+        self.assertEqual(os.listdir(os.path.join(self.output, 'ok')), [])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['rootfs'])
+
+    def test_no_follow(self):
+        '''a file isn't created, or written, through a link at its path
+        '''
+        outside = os.path.join(self.tmpdir, 'outside')
+        with open(outside, 'wb') as filey:
+            filey.write(b'unchanged')
+
+        # A name is listed once, so the later (the file) is extracted
+        root = Dir([('file', Link(outside)), ('file', File(b'changed'))])
+        SquashFS(build_squashfs(root)).extract(self.output, workers=1)
+        with open(os.path.join(self.output, 'file'), 'rb') as filey:
+            self.assertEqual(filey.read(), b'changed')
+
+        # A link (e.g., made while extracting) at the path isn't followed
+        squashfs = SquashFS(build_squashfs(Dir({'file': File(b'changed')})))
+        inode = squashfs.lookup('/file')
+        link = os.path.join(self.tmpdir, 'link')
+        os.symlink(outside, link)
+        with self.assertRaises(FileExistsError):
+            _create(link, inode, 'file')
+        with self.assertRaises(OSError):
+            write_blocks([(link, inode, 0, 1)], squashfs)
+        with open(outside, 'rb') as filey:
+            self.assertEqual(filey.read(), b'unchanged')
+
+    def test_not_empty(self):
+        '''an output that isn't an empty directory isn't used
+        '''
+        os.mkdir(self.output)
+        with open(os.path.join(self.output, 'file'), 'w') as filey:
+            filey.write('data')
+        with self.assertRaises(SystemExit):
+            SquashFS(ROOTFS).extract(self.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
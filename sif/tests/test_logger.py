@@ -0,0 +1,114 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Emitting messages, keeping a bounded history, and formatting messages
+# only when they are printed or asked for
+
+from sif.logger.message import ( DEBUG, INFO, SIFMessage, format_message )
+import io
+import os
+import unittest
+
+
+class Counted:
+    '''an argument that counts the times it is formatted
+    '''
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return 'counted'
+
+
+class TestLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = dict((name, os.environ.get(name)) for name in
+                            ['SIF_LOG_HISTORY', 'SINGULARITY_COLORIZE'])
+        os.environ.pop('SIF_LOG_HISTORY', None)
+        os.environ['SINGULARITY_COLORIZE'] = 'no'
+
+    def tearDown(self):
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def get_bot(self, level=INFO, **kwargs):
+        bot = SIFMessage(**kwargs)
+        bot.level = level
+        bot.outputStream = io.StringIO()
+        bot.errorStream = io.StringIO()
+        return bot
+
+    def test_history(self):
+        '''the history keeps the last SIF_LOG_HISTORY messages
+        '''
+        os.environ['SIF_LOG_HISTORY'] = '3'
+        bot = self.get_bot()
+        for index in range(5):
+            bot.info('message %s', index)
+        self.assertEqual(bot.get_logs(join_newline=False),
+                         ['message 2\n', 'message 3\n', 'message 4\n'])
+        self.assertEqual(bot.get_logs(), 'message 2\n\nmessage 3\n\nmessage 4\n')
+        self.assertEqual(bot.outputStream.getvalue(),
+                         ''.join('message %s\n' % index for index in range(5)))
+
+        os.environ['SIF_LOG_HISTORY'] = '0'
+        bot = self.get_bot()
+        bot.info('message')
+        self.assertEqual(bot.get_logs(join_newline=False), [])
+
+        # A value that isn't a number keeps the default, and history wins
+        os.environ['SIF_LOG_HISTORY'] = 'many'
+        self.assertEqual(self.get_bot().history.maxlen, 1000)
+        self.assertEqual(self.get_bot(history=2).history.maxlen, 2)
+
+    def test_percent(self):
+        '''a message without args is not interpolated
+        '''
+        bot = self.get_bot()
+        bot.info('100% done')
+        bot.warning('%s is literal')
+        bot.warning('%d%% of %s', 50, 'images')
+        self.assertEqual(bot.outputStream.getvalue(), '100% done\n')
+        self.assertEqual(bot.errorStream.getvalue(),
+                         'WARNING %s is literal\nWARNING 50% of images\n')
+        self.assertEqual(bot.get_logs(join_newline=False),
+                         ['100% done\n', 'WARNING %s is literal\n',
+                          'WARNING 50% of images\n'])
+
+        self.assertEqual(format_message('100%'), '100%')
+        self.assertEqual(format_message(b'100%', ()), '100%')
+        self.assertEqual(format_message('%s%%', ('100',)), '100%')
+
+    def test_disabled(self):
+        '''args of a message at a disabled level are only formatted when
+           the logs are asked for
+        '''
+        bot = self.get_bot(level=INFO)
+        counted = Counted()
+        bot.debug('debug %s', counted)
+        bot.verbose('verbose %s', counted)
+        self.assertEqual(counted.count, 0)
+        self.assertEqual(bot.errorStream.getvalue(), '')
+
+        self.assertEqual(bot.get_logs(join_newline=False),
+                         ['DEBUG debug counted\n', 'VERBOSE verbose counted\n'])
+        self.assertEqual(counted.count, 2)
+
+        bot = self.get_bot(level=DEBUG)
+        bot.debug('debug %s', counted)
+        self.assertEqual(counted.count, 3)
+        self.assertEqual(bot.errorStream.getvalue(), 'DEBUG debug counted\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
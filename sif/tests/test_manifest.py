@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Building, caching and querying manifests of images with the fixture
+# rootfs (see mksquashfs.get_rootfs) as the partition
+
+from sif.main import cache
+from sif.main import manifest
+from sif.main.manifest import ( get_manifest, make_manifest, query, search )
+from sif.main.writer import SIFWriter
+from sif.tests.test_squashfs import ( BUSYBOX, ROOTFS )
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+RELEASE = b'NAME="sif"\nID=sif\n'
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.environ = os.environ.get('SINGULARITY_CACHEDIR')
+        os.environ['SINGULARITY_CACHEDIR'] = os.path.join(self.tmpdir, 'cache')
+        cache._caches.clear()
+
+        self.images = os.path.join(self.tmpdir, 'images')
+        os.mkdir(self.images)
+        with open(ROOTFS, 'rb') as filey:
+            self.rootfs = filey.read()
+        self.image = self.write('rootfs.sif', self.rootfs)
+
+    def tearDown(self):
+        if self.environ is None:
+            del os.environ['SINGULARITY_CACHEDIR']
+        else:
+            os.environ['SINGULARITY_CACHEDIR'] = self.environ
+        cache._caches.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, partition=None, fstype=1):
+        writer = SIFWriter(os.path.join(self.images, name))
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        if partition is not None:
+            writer.add_partition(partition, fstype=fstype, name='rootfs')
+        return writer.write()
+
+    def test_make_manifest(self):
+        '''a manifest has the files of the partition, and digests of some
+        '''
+        result = make_manifest(self.image, digests='*release')
+        self.assertNotIn('error', result)
+        self.assertEqual(len(result['paths']), 538 + 1)
+        self.assertEqual(result['paths'][0], '/')
+
+        files = dict(zip(result['paths'], zip(result['sizes'], result['modes'],
+                                               result['targets'],
+                                               result['hashes'])))
+        self.assertEqual(files['/bin/busybox'][:2],
+                         (len(BUSYBOX), stat.S_IFREG | 0o4755))
+        self.assertEqual(files['/bin/sh'][2], 'busybox')
+        self.assertIsNone(files['/bin/busybox'][3])
+
+        digest = hashlib.sha256(RELEASE).hexdigest()
+        self.assertEqual(files['/etc/os-release'][3], digest)
+        self.assertEqual(files['/usr/lib/os-release'][3], digest)
+
+        # An image without a (squashfs) partition has no files
+        for image in [self.write('empty.sif'),
+                      self.write('ext3.sif', b'\0' * 4096, fstype=2)]:
+            result = make_manifest(image)
+            self.assertNotIn('error', result)
+            self.assertEqual(result['paths'], [])
+
+    def test_errors(self):
+        '''an image that can't be read is an error, and doesn't exit
+        '''
+        truncated = os.path.join(self.images, 'truncated.sif')
+        with open(truncated, 'wb') as filey:
+            filey.write(open(self.image, 'rb').read()[:5000])
+        bad = self.write('bad.sif', self.rootfs[:20000])
+        other = os.path.join(self.tmpdir, 'other')
+        with open(other, 'wb') as filey:
+            filey.write(b'\0' * 10000)
+
+        expected = {truncated: 'ValueError: truncated SIF descriptor table',
+                    bad: 'ValueError: ',
+                    other: 'ValueError: %s is not a SIF image' % other,
+                    os.path.join(self.tmpdir, 'missing'): 'FileNotFoundError'}
+        for image, error in expected.items():
+            result = make_manifest(image)
+            self.assertTrue(result['error'].startswith(error), result['error'])
+
+    def test_cache(self):
+        '''a manifest is read again only if the image changed, or doesn't
+           have the digests we need
+        '''
+        first = get_manifest(self.image)
+        self.assertEqual(first['digests'], None)
+
+        reads = []
+        def counted(*args):
+            reads.append(args)
+            return make_manifest(*args)
+
+        real = manifest.make_manifest
+        manifest.make_manifest = counted
+        try:
+            self.assertEqual(get_manifest(self.image), first)
+            self.assertEqual(reads, [])
+
+            # Digests are needed, then cached
+            digests = get_manifest(self.image, digests=True)
+            self.assertEqual(len(reads), 1)
+            self.assertEqual(get_manifest(self.image, digests='*.so'), digests)
+            self.assertEqual(get_manifest(self.image), digests)
+            self.assertEqual(len(reads), 1)
+
+            # A changed image is read again
+            os.utime(self.image, ns=(0, 0))
+            get_manifest(self.image)
+            self.assertEqual(len(reads), 2)
+
+            # An error is not cached
+            truncated = os.path.join(self.images, 'truncated.sif')
+            with open(truncated, 'wb') as filey:
+                filey.write(open(self.image, 'rb').read()[:5000])
+            for count in [3, 4]:
+                self.assertIn('error', get_manifest(truncated))
+                self.assertEqual(len(reads), count)
+        finally:
+            manifest.make_manifest = real
+
+    def test_query(self):
+        '''images are found by a path glob, or by the digest of a file
+        '''
+        other = self.write('other.sif', self.rootfs)
+        self.write('empty.sif')
+        with open(os.path.join(self.images, 'notes.txt'), 'w') as filey:
+            filey.write('not an image')
+
+        results = sorted(query(self.images, path='os-release*', workers=2),
+                         key=lambda result: result['image'])
+        self.assertEqual([r['image'] for r in results],
+                         sorted([self.image, other]))
+        self.assertEqual([m['path'] for m in results[0]['matches']],
+                         ['/etc/os-release', '/usr/lib/os-release'])
+        self.assertIsNone(results[0]['matches'][0]['digest'])
+
+        digest = hashlib.sha256(BUSYBOX).hexdigest()
+        results = list(query(self.image, digest=digest.upper()))
+        self.assertEqual(len(results), 1)
+        self.assertEqual([m['path'] for m in results[0]['matches']],
+                         ['/bin/busybox'])
+        self.assertEqual(list(query(self.images, digest='0' * 64)), [])
+
+        # A glob matches the path or the name, and both with a digest
+        result = get_manifest(self.image, digests=True)
+        self.assertEqual(len(search(result, path='/many/file-1*')), 100)
+        self.assertEqual(search(result, path='*/bin/sh', digest=digest), [])
+        self.assertEqual(len(search(result, path='busy*', digest=digest)), 1)
+
+        # A truncated image is an error for that image only
+        with open(os.path.join(self.images, 'truncated.sif'), 'wb') as filey:
+            filey.write(open(self.image, 'rb').read()[:5000])
+        results = list(query(self.images, path='hostname', processes=True,
+                             workers=2))
+        errors = [r for r in results if 'error' in r]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('truncated SIF descriptor table', errors[0]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
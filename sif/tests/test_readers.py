@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Reading an image from a file descriptor, bytes, and a local HTTP server
+
+from sif.main import SIFHeader
+from sif.main.readers import ( BytesReader, FdReader, HTTPReader, get_reader )
+from sif.main.writer import SIFWriter
+from http.server import ( BaseHTTPRequestHandler, ThreadingHTTPServer )
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    '''serve the image of the server, with Range requests (unless the
+       server has ranges = False, then the whole image, with 200)
+    '''
+
+    def do_GET(self):
+        data = self.server.data
+        match = re.match(r'bytes=(\d+)-(\d+)$', self.headers.get('Range', ''))
+        self.server.requests += 1
+
+        if not self.server.ranges or match is None:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        start, end = int(match.group(1)), int(match.group(2))
+        if start >= len(data):
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%s' % len(data))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        chunk = data[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes %s-%s/%s' %
+                         (start, start + len(chunk) - 1, len(data)))
+        self.send_header('Content-Length', str(len(chunk)))
+        self.end_headers()
+        self.wfile.write(chunk)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestReaders(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, 'image.sif')
+        writer = SIFWriter(self.image)
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        writer.add_partition(os.urandom(100000), name='rootfs')
+        writer.add(0x4003, b'{"maintainer": "sif"}', name='labels')
+        writer.write()
+
+        with open(self.image, 'rb') as filey:
+            self.data = filey.read()
+        self.header = SIFHeader(self.image, cache=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def serve(self, ranges=True):
+        '''serve the image on a local port, and return the url
+        '''
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        server.data, server.ranges, server.requests = self.data, ranges, 0
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        return 'http://127.0.0.1:%s/images/image.sif' % server.server_port
+
+    def check_header(self, header):
+        self.assertEqual(dict(header.meta), dict(self.header.meta))
+        self.assertEqual([dict(d) for d in header.descriptors],
+                         [dict(d) for d in self.header.descriptors])
+
+    def test_http(self):
+        '''an image is read with Range requests, the header with one
+        '''
+        url = self.serve()
+        header = SIFHeader(url, lazy=True, cache=False)
+        self.assertEqual(header.meta['dtotal'], self.header.meta['dtotal'])
+        self.assertEqual(self.server.requests, 1)
+        self.check_header(header)
+        self.check_header(SIFHeader(url, cache=False))
+
+        reader = HTTPReader(url)
+        self.assertEqual(reader.pread(50000, 100), self.data[50000:50100])
+        self.assertEqual(reader.get_size(), len(self.data))
+        self.assertEqual(reader.pread(len(self.data), 10), b'')
+        reader.close()
+        self.assertIsInstance(get_reader(url), HTTPReader)
+
+    def test_http_no_ranges(self):
+        '''a server that answers 200 (the whole image) is an error
+        '''
+        url = self.serve(ranges=False)
+        with self.assertRaises(OSError):
+            HTTPReader(url).pread(0, 100)
+        with self.assertRaises(OSError):
+            SIFHeader(url, cache=False).meta
+
+    def test_fd(self):
+        '''an image is read from an open file descriptor, which is kept open
+        '''
+        fd = os.open(self.image, os.O_RDONLY)
+        try:
+            header = SIFHeader(fd, cache=False)
+            self.check_header(header)
+            reader = get_reader(fd)
+            self.assertIsInstance(reader, FdReader)
+            self.assertEqual(reader.pread(100, 20), self.data[100:120])
+            self.assertEqual(reader.get_size(), len(self.data))
+            self.assertEqual(reader.get_buffer()[:10], self.data[:10])
+            reader.close()
+            self.assertEqual(os.pread(fd, 10, 0), self.data[:10])
+        finally:
+            os.close(fd)
+
+    def test_bytes(self):
+        '''an image is read from bytes in memory
+        '''
+        self.check_header(SIFHeader(self.data, cache=False))
+        self.check_header(SIFHeader(bytearray(self.data), cache=False))
+
+        reader = get_reader(self.data)
+        self.assertIsInstance(reader, BytesReader)
+        self.assertEqual(reader.pread(100, 20), self.data[100:120])
+        self.assertEqual(reader.pread(len(self.data) - 5, 20),
+                         self.data[-5:])
+        self.assertEqual(reader.get_size(), len(self.data))
+        self.assertEqual(bytes(reader.get_buffer()[:10]), self.data[:10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Scanning a folder of images in a pool of threads or processes, with
+# I/O accounting
+
+from sif.main import stats
+from sif.main.scan import scan
+from sif.main.writer import SIFWriter
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.images = []
+        for index in range(6):
+            image = os.path.join(self.tmpdir, 'image-%s.sif' % index)
+            writer = SIFWriter(image)
+            writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+            writer.add_partition(os.urandom(1000 * (index + 1)), name='rootfs')
+            self.images.append(writer.write())
+
+        with open(os.path.join(self.tmpdir, 'notes.txt'), 'w') as filey:
+            filey.write('not an image')
+
+        stats.enable(True)
+        stats.get_stats().reset()
+
+    def tearDown(self):
+        stats.enable(None)
+        stats.get_stats().reset()
+        shutil.rmtree(self.tmpdir)
+
+    def scan(self, processes):
+        '''scan the folder, and return the images and aggregate counts
+        '''
+        stats.get_stats().reset()
+        results = list(scan(self.tmpdir, workers=2, processes=processes,
+                            cache=False))
+        return sorted(r['image'] for r in results), stats.get_stats().to_dict()
+
+    def test_stats(self):
+        '''the counts of a scan are in the aggregate, from threads, or
+           from processes
+        '''
+        images, threads = self.scan(processes=False)
+        self.assertEqual(images, sorted(self.images))
+
+        # Each file is opened once, and a SIF is read again for the header
+        total = threads['total']
+        self.assertEqual(total['opens'], len(self.images) + 1)
+        self.assertEqual(total['reads'], len(self.images) * 2 + 1)
+        self.assertGreater(total['bytes'], 0)
+
+        images, processes = self.scan(processes=True)
+        self.assertEqual(images, sorted(self.images))
+        for key in ['opens', 'reads', 'bytes']:
+            self.assertEqual(processes['total'][key], total[key], key)
+        self.assertEqual(sorted(processes['phases']),
+                         sorted(threads['phases']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Reading the fixture rootfs (see mksquashfs.get_rootfs) without mounting it
+
+from sif.squashfs.reader import SquashFS
+from sif.squashfs.structures import DATA_UNCOMPRESSED, DIRECTORY
+from sif.tests.mksquashfs import get_bytes
+import io
+import os
+import stat
+import unittest
+
+ROOTFS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                      'rootfs.sqfs')
+
+BUSYBOX = get_bytes('busybox', 3 * 4096 + 100)
+BLOCK = b'sif ' * 1024
+
+
+class TestSquashFS(unittest.TestCase):
+
+    def setUp(self):
+        self.squashfs = SquashFS(ROOTFS)
+
+    def tearDown(self):
+        self.squashfs.close()
+
+    def test_superblock(self):
+        '''the superblock is read, and other files are not a squashfs
+        '''
+        superblock = self.squashfs.superblock
+        self.assertEqual(superblock.block_size, 4096)
+        self.assertEqual(superblock.compressor, 1)
+        self.assertEqual(superblock.inode_count, 538)
+        self.assertEqual(superblock.fragments, 520)
+
+        with open(ROOTFS, 'rb') as filey:
+            data = filey.read()
+        with self.assertRaises(ValueError):
+            SquashFS(b'hsqs' + bytes(200))
+        with self.assertRaises(ValueError):
+            SquashFS(b'\0' * 4 + data[4:])
+        with self.assertRaises(ValueError):
+            SquashFS(data, length=1000)
+
+    def test_listdir(self):
+        '''directories are listed in order, and walked top down
+        '''
+        self.assertEqual(self.squashfs.listdir('/'),
+                         ['bin', 'data', 'dev', 'etc', 'many', 'usr'])
+        self.assertEqual(self.squashfs.listdir('/etc'),
+                         ['bin', 'hostname', 'os-release'])
+        self.assertEqual(self.squashfs.listdir('/data'),
+                         ['empty', 'exact', 'sparse'])
+        self.assertEqual(self.squashfs.listdir('/etc/bin'), ['busybox', 'sh'])
+        self.assertEqual(self.squashfs.listdir('many'),
+                         ['file-%03d' % index for index in range(520)])
+
+        paths = [dirpath for dirpath, dirnames, filenames in
+                 self.squashfs.walk()]
+        self.assertEqual(paths, ['/', '/bin', '/data', '/dev', '/etc',
+                                 '/many', '/usr', '/usr/lib'])
+        with self.assertRaises(FileNotFoundError):
+            self.squashfs.listdir('/missing')
+        with self.assertRaises(NotADirectoryError):
+            self.squashfs.listdir('/etc/hostname')
+
+    def test_stat(self):
+        '''each inode type has its file type, mode, owner and size
+        '''
+        expected = {'/': (stat.S_IFDIR | 0o755, 0, 7),
+                    '/bin/busybox': (stat.S_IFREG | 0o4755, 0, 12388),
+                    '/data': (stat.S_IFDIR | 0o750, 0, 55),
+                    '/data/sparse': (stat.S_IFREG | 0o600, 1000, 12288),
+                    '/data/empty': (stat.S_IFREG | 0o644, 0, 0),
+                    '/dev/fifo': (stat.S_IFIFO | 0o644, 0, 0),
+                    '/dev/null': (stat.S_IFCHR | 0o666, 0, 0),
+                    '/many/file-519': (stat.S_IFREG | 0o644, 1000, 2100)}
+        for path, (mode, uid, size) in expected.items():
+            st = self.squashfs.lstat(path)
+            self.assertEqual(st.st_mode, mode, path)
+            self.assertEqual((st.st_uid, st.st_gid), (uid, uid), path)
+            if path != '/':
+                self.assertEqual(st.st_size, size, path)
+            self.assertEqual(st.st_mtime, 1500000000)
+
+        # The root has the subdirectories (and . and ..) as links
+        self.assertEqual(self.squashfs.stat('/').st_nlink, 8)
+        self.assertEqual(self.squashfs.lookup('/dev/null').rdev, 1 << 8 | 3)
+
+        # A link, and the file it links to
+        self.assertTrue(stat.S_ISLNK(self.squashfs.lstat('/bin/sh').st_mode))
+        self.assertEqual(self.squashfs.stat('/bin/sh').st_size, len(BUSYBOX))
+        self.assertEqual(self.squashfs.readlink('/etc/bin'), '/bin')
+
+        # A hard link is the same inode, with two links
+        release = self.squashfs.stat('/etc/os-release')
+        self.assertEqual(release, self.squashfs.stat('/usr/lib/os-release'))
+        self.assertEqual(release.st_nlink, 2)
+
+    def test_read(self):
+        '''files are read from data blocks, fragments, or sparse blocks
+        '''
+        expected = {'/bin/busybox': BUSYBOX,
+                    '/etc/bin/sh': BUSYBOX,
+                    '/etc/os-release': b'NAME="sif"\nID=sif\n',
+                    '/usr/lib/os-release': b'NAME="sif"\nID=sif\n',
+                    '/etc/hostname': b'sif\n',
+                    '/data/exact': BLOCK,
+                    '/data/sparse': BLOCK + bytes(4096) + BLOCK,
+                    '/data/empty': b'',
+                    '/many/file-000': b'000 ' * 525,
+                    '/many/file-519': b'519 ' * 525}
+        for path, data in expected.items():
+            with self.squashfs.open(path) as filey:
+                self.assertEqual(filey.read(), data, path)
+
+        # Three stored (uncompressed) blocks, and the tail in a fragment
+        inode = self.squashfs.lookup('/bin/busybox')
+        self.assertEqual(inode.blocks, (4096 | DATA_UNCOMPRESSED,) * 3)
+        self.assertIsNotNone(inode.fragment)
+        self.assertEqual(self.squashfs.lookup('/data/sparse').blocks[1], 0)
+        self.assertIsNone(self.squashfs.lookup('/data/exact').fragment)
+
+        # Reads across a block, and into the fragment
+        with self.squashfs.open('/bin/busybox') as filey:
+            filey.seek(4090)
+            self.assertEqual(filey.read(12), BUSYBOX[4090:4102])
+            filey.seek(-150, io.SEEK_END)
+            self.assertEqual(filey.read(), BUSYBOX[-150:])
+
+        with self.squashfs.open('/etc/os-release', 'r') as filey:
+            self.assertEqual(filey.readline(), 'NAME="sif"\n')
+        with self.assertRaises(IsADirectoryError):
+            self.squashfs.open('/etc')
+
+    def test_tables(self):
+        '''the id and fragment tables are more than one (not consecutive)
+           metadata block, and are read from the position of each block
+        '''
+        ids = self.squashfs.get_ids()
+        self.assertEqual(len(ids), 2102)
+        self.assertEqual(ids[:2], [10000, 10001])
+        self.assertEqual(ids[-3:], [12099, 0, 1000])
+        self.assertEqual(len(self.squashfs.get_fragments()), 520)
+
+    def test_directory_index(self):
+        '''a directory with an index finds every name, uncached
+        '''
+        many = self.squashfs.lookup('/many')
+        self.assertEqual(many.type, DIRECTORY)
+        self.assertTrue(many.index)
+
+        for index in range(0, 520, 7):
+            squashfs = SquashFS(ROOTFS)
+            inode = squashfs.lookup('/many/file-%03d' % index)
+            self.assertEqual(inode.size, 2100)
+            self.assertEqual(inode.ref, self.squashfs.lookup(
+                             '/many/file-%03d' % index).ref)
+
+        for name in ['a', 'file-', 'file-5000', 'file-999', 'zzz']:
+            self.assertFalse(SquashFS(ROOTFS).exists('/many/' + name))
+
+
+if __name__ == '__main__':
+    unittest.main()
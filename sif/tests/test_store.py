@@ -0,0 +1,161 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Adding images to a ChunkStore, restoring them, and removing them, with
+# small chunks so a test image has many
+
+from sif.main import store as chunkstore
+from sif.main.store import ( ChunkStore, get_chunks )
+from sif.main.writer import SIFWriter
+from sif.tests.mksquashfs import get_bytes
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = ChunkStore(os.path.join(self.tmpdir, 'store'),
+                                min_size=1024, max_size=16384, bits=12)
+
+        # Two builds of an image, with one region changed in the second
+        self.partition = get_bytes('rootfs', 500000)
+        changed = bytearray(self.partition)
+        changed[250000:250100] = b'x' * 100
+        self.image1 = self.write('image-1.sif', self.partition)
+        self.image2 = self.write('image-2.sif', bytes(changed))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, partition):
+        writer = SIFWriter(os.path.join(self.tmpdir, name))
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        writer.add_partition(partition, name='rootfs')
+        return writer.write()
+
+    def read(self, path):
+        with open(path, 'rb') as filey:
+            return filey.read()
+
+    def chunk(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return [bytes(chunk) for chunk in get_chunks(
+                    fd, 0, os.stat(path).st_size, 1024, 16384, 12)]
+        finally:
+            os.close(fd)
+
+    def test_restore(self):
+        '''an image is restored byte for byte, by sha256 or name
+        '''
+        recipe = self.store.add(self.image1)
+        digest = hashlib.sha256(self.read(self.image1)).hexdigest()
+        self.assertEqual(recipe['digest'], digest)
+        self.assertEqual(recipe['names'], ['image-1.sif'])
+        self.assertEqual(sum(length for key, length in recipe['chunks']),
+                         os.stat(self.image1).st_size)
+        self.assertEqual(recipe['new_chunks'], len(recipe['chunks']))
+
+        for key in [digest, digest[:12], 'image-1.sif']:
+            output = os.path.join(self.tmpdir, 'restored.sif')
+            self.assertEqual(self.store.restore(key, output), output)
+            self.assertEqual(self.read(output), self.read(self.image1))
+            self.assertEqual(os.stat(output).st_mode,
+                             os.stat(self.image1).st_mode)
+            os.remove(output)
+
+        with self.assertRaises(SystemExit):
+            self.store.restore('missing', output)
+
+    def test_dedup(self):
+        '''a second build only adds the chunks around what changed
+        '''
+        first = self.store.add(self.image1)
+        second = self.store.add(self.image2)
+        self.assertNotEqual(first['digest'], second['digest'])
+
+        # The header (with its times and uuid), and the changed region
+        self.assertLessEqual(second['new_chunks'], 4)
+        self.assertLess(second['new_bytes'], 40000)
+        shared = set(key for key, length in first['chunks']) & \
+                 set(key for key, length in second['chunks'])
+        self.assertGreater(len(shared), len(second['chunks']) - 5)
+
+        stats = self.store.stats()
+        self.assertEqual(stats['images'], 2)
+        self.assertEqual(stats['chunks'], len(first['chunks']) +
+                                          second['new_chunks'])
+        self.assertLess(stats['stored'], stats['size'] * 0.6)
+
+        # Chunks are the same with or without NumPy
+        if chunkstore.np is not None:
+            chunks = self.chunk(self.image2)
+            numpy, chunkstore.np = chunkstore.np, None
+            try:
+                self.assertEqual(self.chunk(self.image2), chunks)
+            finally:
+                chunkstore.np = numpy
+
+    def test_gc(self):
+        '''removing an image keeps the chunks another image uses, and gc
+           removes chunks no image uses
+        '''
+        first = self.store.add(self.image1)
+        second = self.store.add(self.image2)
+        orphan = self.store._get_chunk_path('ab' * 32)
+        os.makedirs(os.path.dirname(orphan), exist_ok=True)
+        with open(orphan, 'wb') as filey:
+            filey.write(b'orphan')
+
+        self.assertEqual(self.store.gc(), len(b'orphan'))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(self.store.gc(), 0)
+
+        freed = self.store.remove(first['digest'])
+        self.assertGreater(freed, 0)
+        self.assertLess(freed, 40000)
+        for key, length in second['chunks']:
+            self.assertTrue(os.path.exists(self.store._get_chunk_path(key)))
+
+        output = os.path.join(self.tmpdir, 'restored.sif')
+        self.store.restore('image-2.sif', output)
+        self.assertEqual(self.read(output), self.read(self.image2))
+
+        self.store.remove('image-2.sif')
+        self.assertEqual(self.store.stats(), {'images': 0, 'size': 0,
+                                              'chunks': 0, 'stored': 0})
+
+    def test_names(self):
+        '''an image added with a second name keeps both
+        '''
+        first = self.store.add(self.image1, name='base')
+        second = self.store.add(self.image1, name='latest')
+        self.assertEqual(second['names'], ['base', 'latest'])
+        self.assertEqual(second['new_chunks'], 0)
+        self.assertEqual(len(self.store.get_recipes()), 1)
+
+        for name in ['base', 'latest']:
+            self.assertEqual(self.store.get_recipe(name)['digest'],
+                             first['digest'])
+
+        # Removing one name keeps the image, and the last removes it
+        self.assertEqual(self.store.remove('base'), 0)
+        self.assertEqual(self.store.get_recipe('latest')['names'], ['latest'])
+        with self.assertRaises(SystemExit):
+            self.store.get_recipe('base')
+        self.assertGreater(self.store.remove('latest'), 0)
+        self.assertEqual(self.store.get_recipes(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+#!/usr/bin/python
+
+# Copyright (C) 2018-2019 Vanessa Sochat.
+
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+# with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+# Signature verification, with keys generated by gpg (skipped without it)
+
+from sif.main import SIFHeader
+from sif.main.writer import SIFWriter
+from sif.utils.pgp import ( dearmor, parse_cleartext, parse_packets,
+                            read_keyring, TAG_PUBLIC_SUBKEY )
+import base64
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+GPG = shutil.which('gpg')
+
+
+@unittest.skipIf(GPG is None, 'gpg is not installed')
+class TestVerify(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.home = os.path.join(self.tmpdir, 'gnupg')
+        os.mkdir(self.home, 0o700)
+        self.partition = os.urandom(100000)
+        self.gpg('--quick-gen-key', 'Test <test@example.com>', 'rsa2048',
+                 'sign,cert', 'never')
+        self.fingerprint = self.get_fingerprint()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def gpg(self, *args, data=None):
+        return subprocess.run([GPG, '--homedir', self.home, '--batch',
+                               '--passphrase', '', '--pinentry-mode', 'loopback',
+                               '--yes'] + list(args), input=data, check=True,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL).stdout
+
+    def get_fingerprint(self, *args):
+        return self.get_fingerprints(*args)[0]
+
+    def get_fingerprints(self, *args):
+        '''return the fingerprints of a key (by default, all keys) and its
+           subkeys
+        '''
+        lines = self.gpg('--with-colons', '--list-keys', *args).decode()
+        return [line.split(':')[9] for line in lines.splitlines()
+                if line.startswith('fpr:')]
+
+    def export(self, name='keyring.gpg', *args):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as filey:
+            filey.write(self.gpg('--export', *args))
+        return path
+
+    def sign(self, partition, *args):
+        '''return a clear signed SIFHASH (SHA384) of a partition
+        '''
+        text = 'SIFHASH:\n%s\n' % hashlib.sha384(partition).hexdigest()
+        return self.gpg('--clearsign', '--digest-algo', 'SHA256', *args,
+                        data=text.encode('utf-8')).decode('utf-8')
+
+    def write(self, partition, signature, name='image.sif'):
+        image = os.path.join(self.tmpdir, name)
+        writer = SIFWriter(image)
+        writer.add_deffile(b'bootstrap: docker\nfrom: busybox\n')
+        link = writer.add_partition(partition)
+        writer.add_signature(signature.encode('utf-8'), link)
+        return writer.write()
+
+    def verify(self, image, keyring):
+        results = SIFHeader(image, cache=False).verify(keyring=keyring,
+                                                       cache=False)
+        self.assertEqual(len(results), 1)
+        return results[0]
+
+    def test_verify(self):
+        '''a signed image verifies, and a changed partition does not
+        '''
+        keyring = self.export()
+        signature = self.sign(self.partition)
+        result = self.verify(self.write(self.partition, signature), keyring)
+        self.assertTrue(result['integrity'])
+        self.assertTrue(result['verified'])
+        self.assertEqual(result['fingerprint'], self.fingerprint)
+
+        tampered = bytes([self.partition[0] ^ 0xff]) + self.partition[1:]
+        result = self.verify(self.write(tampered, signature), keyring)
+        self.assertFalse(result['integrity'])
+        self.assertFalse(result['verified'])
+
+    def test_armor_header_sifhash(self):
+        '''a SIFHASH in the (unsigned) armor headers is not used
+        '''
+        keyring = self.export()
+        tampered = bytes([self.partition[0] ^ 0xff]) + self.partition[1:]
+        signature = self.sign(self.partition).replace('Hash: SHA256\n',
+            'Hash: SHA256\nSIFHASH:\n%s\n' % hashlib.sha384(tampered).hexdigest())
+        result = self.verify(self.write(tampered, signature), keyring)
+        self.assertFalse(result['integrity'])
+        self.assertFalse(result['verified'])
+
+    def test_signature_type(self):
+        '''a binary signature (type 0x00) of the text is not accepted
+        '''
+        keyring = self.export()
+        message = self.sign(self.partition)
+        text = parse_cleartext(message)[0]
+        packet = dearmor(self.gpg('--detach-sign', '--armor', '--digest-algo',
+                                  'SHA256', data=text).decode('utf-8'))
+        start = message.index('-----BEGIN PGP SIGNATURE-----')
+        signature = message[:start] + '-----BEGIN PGP SIGNATURE-----\n\n%s\n' \
+                    '-----END PGP SIGNATURE-----\n' % \
+                    base64.b64encode(packet).decode('utf-8')
+        result = self.verify(self.write(self.partition, signature), keyring)
+        self.assertTrue(result['integrity'])
+        self.assertFalse(result['verified'])
+
+    def test_subkey_binding(self):
+        '''a signing subkey is only trusted with its binding signature
+        '''
+        self.gpg('--quick-add-key', self.fingerprint, 'rsa2048', 'sign', 'never')
+        keyring = self.export()
+        image = self.write(self.partition, self.sign(self.partition))
+        result = self.verify(image, keyring)
+        self.assertTrue(result['verified'])
+        self.assertNotEqual(result['fingerprint'], self.fingerprint)
+
+        # Remove the signatures after the subkey (its binding)
+        with open(keyring, 'rb') as filey:
+            packets = list(parse_packets(filey.read()))
+        unbound = os.path.join(self.tmpdir, 'unbound.gpg')
+        with open(unbound, 'wb') as filey:
+            subkey = False
+            for tag, body in packets:
+                subkey = tag == TAG_PUBLIC_SUBKEY or (subkey and tag == 2)
+                if tag != 2 or not subkey:
+                    filey.write(bytes([0xc0 | tag, 0xff]) +
+                                len(body).to_bytes(4, 'big') + body)
+
+        result = self.verify(image, unbound)
+        self.assertFalse(result['verified'])
+        self.assertIn('not in keyring', result['error'])
+
+    def test_revoked(self):
+        '''a revoked subkey, or a revoked key, is not trusted
+        '''
+        self.gpg('--quick-add-key', self.fingerprint, 'rsa2048', 'sign', 'never')
+        primary, subkey = self.get_fingerprints()
+        image = self.write(self.partition, self.sign(self.partition))
+        self.assertTrue(self.verify(image, self.export())['verified'])
+
+        self.gpg('--command-fd', '0', '--edit-key', primary,
+                 data=b'key 1\nrevkey\ny\n0\n\ny\nsave\n')
+        keys = read_keyring(self.export('subkey-revoked.gpg'))
+        self.assertEqual(list(keys), [primary[-16:]])
+        result = self.verify(image, self.export('subkey-revoked.gpg'))
+        self.assertFalse(result['verified'])
+        self.assertIn('not in keyring', result['error'])
+
+        # gpg writes a revocation certificate for each key it generates
+        image = self.write(self.partition, self.sign(self.partition,
+                           '--local-user', primary + '!'), 'primary.sif')
+        self.assertTrue(self.verify(image, self.export())['verified'])
+        path = os.path.join(self.home, 'openpgp-revocs.d', '%s.rev' % primary)
+        with open(path, 'rb') as filey:
+            certificate = filey.read().replace(b':-----BEGIN', b'-----BEGIN')
+        self.gpg('--import', data=certificate)
+        self.assertEqual(read_keyring(self.export('revoked.gpg')), {})
+        result = self.verify(image, self.export('revoked.gpg'))
+        self.assertFalse(result['verified'])
+        self.assertIn('not in keyring', result['error'])
+
+    def test_expired(self):
+        '''a subkey (or key) is not trusted after it expires
+        '''
+        created = time.time() - 3 * 86400
+        faked = ['--ignore-time-conflict', '--faked-system-time',
+                 time.strftime('%Y%m%dT%H%M%S', time.gmtime(created))]
+        self.gpg(*faked, '--quick-gen-key', 'Old <old@example.com>', 'rsa2048',
+                 'sign,cert', '2d')
+        primary = self.get_fingerprint('old@example.com')
+        self.gpg(*faked, '--quick-add-key', primary, 'rsa2048', 'sign', '1d')
+        subkey = self.get_fingerprints('old@example.com')[1]
+
+        image = self.write(self.partition, self.sign(self.partition, *faked,
+                           '--local-user', subkey + '!'))
+        keyring = self.export('old.gpg', primary)
+
+        # The subkey expired two days ago, and the key a day ago
+        self.assertEqual(list(read_keyring(keyring, now=created + 3600)),
+                         [primary[-16:], subkey[-16:]])
+        self.assertEqual(list(read_keyring(keyring, now=created + 86400 * 1.5)),
+                         [primary[-16:]])
+        self.assertEqual(read_keyring(keyring), {})
+
+        result = self.verify(image, keyring)
+        self.assertTrue(result['integrity'])
+        self.assertFalse(result['verified'])
+        self.assertIn('not in keyring', result['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,9 @@ from .terminal import (
     which
 )
 from .cache import ( get_cache, getenv, convert2boolean )
+from .digest import get_digests
 from .fileio import (
+    copy_range,
     get_userhome,
     get_tmpdir,
     get_tmpfile,
@@ -57,23 +57,24 @@ def getenv(variable_key, default=None, required=False, silent=False):
         sys.exit(1)
 
     if silent:
-        bot.verbose2("%s found" % variable_key)
+        bot.verbose2("%s found", variable_key)
     else:
         if variable is not None:
-            bot.verbose2("%s found as %s" % (variable_key, variable))
+            bot.verbose2("%s found as %s", variable_key, variable)
         else:
-            bot.verbose2("%s not defined (None)" % variable_key)
+            bot.verbose2("%s not defined (None)", variable_key)
 
     return variable
 
 
-def get_cache(subfolder=None, quiet=False):
+def get_cache(subfolder=None, quiet=False, create=True):
     '''get_cache will return the user's cache for singularity.
 
        Parameters
        ==========
        subfolder: a subfolder in the cache base to retrieve, specifically
        quiet: an extra controller for verbositry (suppress output)
+       create: create the folder(s), and exit if they can't be created
     '''
 
     DISABLE_CACHE = convert2boolean(getenv("SINGULARITY_DISABLE_CACHE",
@@ -93,8 +94,9 @@ def get_cache(subfolder=None, quiet=False):
         cache_base = "%s/%s" % (cache_base, subfolder)
 
     # Create the cache folder(s), if don't exist
-    mkdir_p(cache_base)
+    if create:
+        mkdir_p(cache_base)
 
     if not quiet:
-        bot.debug("Cache folder set to %s" % cache_base)
+        bot.debug("Cache folder set to %s", cache_base)
     return cache_base
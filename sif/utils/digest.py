@@ -0,0 +1,155 @@
+'''
+
+Copyright (C) 2018-2019 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+
+# hashlib releases the GIL for large updates, so with one thread per digest
+# the digests are computed in parallel, while the next chunk is read
+DEFAULT_ALGORITHMS = ('sha256',)
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def get_digests(path, algorithms=None, ranges=None, offset=0, length=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, threads=True):
+    '''compute one or more digests (e.g., md5, sha256, sha384, blake2b) of
+       a file, or a range of it, in a single pass. Optionally, digests of
+       sub ranges (e.g., the data objects of descriptors) are computed
+       in the same pass. Returns a dictionary of hex digests by algorithm,
+       or if ranges are given, a dictionary with "file" (the digests of
+       the whole range read) and "ranges" (by the key of each range).
+
+       Parameters
+       ==========
+       path: the path to the file (or an open file descriptor)
+       algorithms: a list of hashlib algorithms (defaults to sha256)
+       ranges: an optional dictionary of (offset, length) by a key, e.g.,
+               a descriptor ID, to also compute digests for
+       offset: the offset to start reading at (default 0)
+       length: the number of bytes to read (defaults to the end of file)
+       chunk_size: the size of each of the (two, reused) read buffers
+       threads: update the digests in threads, one per digest
+    '''
+    algorithms = list(algorithms or DEFAULT_ALGORITHMS)
+    if length is None:
+        length = os.stat(path).st_size - offset
+
+    # Each target is a list of segments, and the hasher to update with them
+    hashers = dict()
+    hashers['file'] = [([(offset, length)], hashlib.new(name))
+                       for name in algorithms]
+    for key, segment in (ranges or {}).items():
+        hashers[key] = [([segment], hashlib.new(name)) for name in algorithms]
+
+    targets = [target for covered in hashers.values() for target in covered]
+    update_digests(path, targets, chunk_size=chunk_size, threads=threads)
+
+    digests = dict()
+    for key, covered in hashers.items():
+        digests[key] = dict((name, hasher.hexdigest()) for name, 
+                            (segments, hasher) in zip(algorithms, covered))
+
+    if ranges is None:
+        return digests['file']
+    return {'file': digests.pop('file'), 'ranges': digests}
+
+
+def update_digests(path, targets, chunk_size=DEFAULT_CHUNK_SIZE, threads=True):
+    '''update hashers with segments of a file, with a single sequential read
+       from the first to the last byte needed. Each target is a tuple of
+       a list of segments, (offset, length), and a hasher (e.g., from
+       hashlib.new) that is updated with them, in order. The segments of
+       a target must be in file order, and not overlap.
+
+       Parameters
+       ==========
+       path: the path to the file (or an open file descriptor)
+       targets: a list of (segments, hasher)
+       chunk_size: the size of each of the (two, reused) read buffers
+       threads: update the hashers in threads, one per target
+    '''
+    ranges = []
+    for segments, hasher in targets:
+        ends = [(start, start + size) for start, size in segments if size > 0]
+        for (start, end), (following, _) in zip(ends, ends[1:]):
+            if following < end:
+                raise ValueError('segments must be in file order, and not overlap')
+        ranges.append((ends, hasher))
+
+    starts = [start for ends, hasher in ranges for start, end in ends]
+    if not starts:
+        return
+
+    start = min(starts)
+    end = max(end for ends, hasher in ranges for first, end in ends)
+
+    closefd = not isinstance(path, int)
+    with open(path, 'rb', buffering=0, closefd=closefd) as filey:
+        _update_digests(filey, start, end, ranges, chunk_size, threads)
+
+
+def _update_digests(filey, start, end, ranges, chunk_size, threads):
+    '''read from start to end of an open (unbuffered) file into two reused
+       buffers, and update each hasher with the parts of each chunk in its
+       ranges. With threads, the hashers are updated with one chunk while
+       the next chunk is read into the other buffer.
+    '''
+    buffers = [memoryview(bytearray(chunk_size)) for _ in range(2)]
+    executor = None
+    if threads is True and len(ranges) > 1:
+        executor = ThreadPoolExecutor(max_workers=len(ranges))
+
+    pending = []
+    position = start
+    index = 0
+    filey.seek(start)
+
+    try:
+        while position < end:
+            buffer = buffers[index % 2]
+            count = filey.readinto(buffer[:min(chunk_size, end - position)])
+            if not count:
+                break
+
+            # Wait for the previous chunk, so each hasher is updated in order
+            for future in pending:
+                future.result()
+
+            pending = []
+            chunk = buffer[:count]
+            for ends, hasher in ranges:
+                parts = []
+                for first, last in ends:
+                    low = max(first, position)
+                    high = min(last, position + count)
+                    if low < high:
+                        parts.append(chunk[low - position:high - position])
+                if not parts:
+                    continue
+                if executor is None:
+                    _update(hasher, parts)
+                else:
+                    pending.append(executor.submit(_update, hasher, parts))
+
+            position += count
+            index += 1
+
+        for future in pending:
+            future.result()
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _update(hasher, parts):
+    for part in parts:
+        hasher.update(part)
@@ -199,3 +199,62 @@ def read_json(filename, mode='r'):
     with open(filename, mode) as filey:
         data = json.load(filey)
     return data
+
+
+def copy_range(src_fd, dst_fd, offset, length, chunk_size=1024 * 1024):
+    '''copy a range of bytes from one open file descriptor to another, at
+       the current position of the destination. The copy is done in the
+       kernel where possible, first with os.copy_file_range (file to file),
+       then os.sendfile (e.g., to a pipe), with a buffered copy as the last
+       resort. Returns the number of bytes copied, which is less than
+       length only if the source ends first.
+
+       Parameters
+       ==========
+       src_fd: the file descriptor to copy from
+       dst_fd: the file descriptor to copy to
+       offset: the offset in the source to start at
+       length: the number of bytes to copy
+       chunk_size: the largest number of bytes to copy in one call
+    '''
+    def copy_file_range(count, position):
+        return os.copy_file_range(src_fd, dst_fd, count, position)
+
+    def sendfile(count, position):
+        return os.sendfile(dst_fd, src_fd, position, count)
+
+    def buffered(count, position):
+        data = os.pread(src_fd, count, position)
+        view = memoryview(data)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        return len(data)
+
+    methods = [buffered]
+    if hasattr(os, 'sendfile'):
+        methods.insert(0, sendfile)
+    if hasattr(os, 'copy_file_range'):
+        methods.insert(0, copy_file_range)
+
+    # Errors that mean a method isn't supported for these file descriptors
+    unsupported = (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF,
+                   errno.EOPNOTSUPP, errno.ESPIPE, errno.ENOTSUP)
+
+    copied = 0
+    for method in methods:
+        try:
+            while copied < length:
+                count = min(chunk_size, length - copied)
+                done = method(count, offset + copied)
+                if done == 0:
+                    return copied
+                copied += done
+            return copied
+
+        # Continue from where we are with the next method
+        except OSError as e:
+            if e.errno not in unsupported or method is buffered:
+                raise
+
+    return copied
@@ -9,21 +9,19 @@ with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 '''
 
 from sif.logger import bot
-import hashlib
+from .digest import get_digests
 import os
 import re
 
 
-def get_image_hash(image_path):
-    '''return an md5 hash of the file based on a criteria level. This
-    is intended to give the file a reasonable version.
+def get_image_hash(image_path, algorithm='md5'):
+    '''return a hash (by default md5) of the file. This is intended to give
+    the file a reasonable version. To compute several digests in one pass,
+    use sif.utils.get_digests.
     :param image_path: full path to the singularity image
+    :param algorithm: the hashlib algorithm to use
     '''
-    hasher = hashlib.md5()
-    with open(image_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hasher.update(chunk)
-    return hasher.hexdigest()
+    return get_digests(image_path, [algorithm])[algorithm]
 
 
 
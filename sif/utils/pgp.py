@@ -0,0 +1,596 @@
+'''
+
+Copyright (C) 2018-2019 Vanessa Sochat.
+
+This Source Code Form is subject to the terms of the
+Mozilla Public License, v. 2.0. If a copy of the MPL was not distributed
+with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+A minimal, offline OpenPGP (RFC 4880) verifier for the clear signed
+messages in SIF signature blocks. Only what we need is implemented:
+reading public keys (and subkeys, with a valid binding signature) from a
+keyring file, armored or binary, and checking version 4 RSA signatures
+over canonical text. Keys that are revoked or expired (by their newest
+valid self-signature) are not read. Revocations by a designated revoker
+can't be checked, so a key with one is not read either (fail closed).
+
+'''
+
+import base64
+import hashlib
+import time
+
+# Signature hash algorithms, and the PKCS#1 v1.5 DigestInfo prefix for each
+hash_algorithms = {
+    2: ('sha1', '3021300906052b0e03021a05000414'),
+    8: ('sha256', '3031300d060960864801650304020105000420'),
+    9: ('sha384', '3041300d060960864801650304020205000430'),
+    10: ('sha512', '3051300d060960864801650304020305000440'),
+    11: ('sha224', '302d300d06096086480165030402040500041c')
+}
+
+# Public key algorithms that are RSA (encrypt or sign, and sign only)
+RSA_ALGORITHMS = [1, 3]
+
+# Packet tags
+TAG_SIGNATURE = 2
+TAG_PUBLIC_KEY = 6
+TAG_USER_ID = 13
+TAG_PUBLIC_SUBKEY = 14
+TAG_USER_ATTRIBUTE = 17
+
+# Signature types: of a canonical text document, certifications of a user
+# id, a subkey binding (and the back signature of the subkey), a direct
+# key signature, and revocations of a key or subkey
+SIGNATURE_TEXT = 0x01
+SIGNATURE_CERTIFICATIONS = [0x10, 0x11, 0x12, 0x13]
+SIGNATURE_SUBKEY_BINDING = 0x18
+SIGNATURE_PRIMARY_BINDING = 0x19
+SIGNATURE_DIRECT_KEY = 0x1f
+SIGNATURE_KEY_REVOCATION = 0x20
+SIGNATURE_SUBKEY_REVOCATION = 0x28
+
+# The key flag of keys that can sign data
+KEY_FLAG_SIGN = 0x02
+
+SIGNED_MESSAGE = '-----BEGIN PGP SIGNED MESSAGE-----'
+SIGNATURE_START = '-----BEGIN PGP SIGNATURE-----'
+
+
+################################################################################
+# Armor and Packets
+################################################################################
+
+
+def dearmor(text):
+    '''return the binary data of each ASCII armored block in text,
+       joined together. The checksum line is not checked.
+
+       Parameters
+       ==========
+       text: the armored text
+    '''
+    data = b''
+    lines = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('-----BEGIN PGP'):
+            lines = []
+        elif line.startswith('-----END PGP'):
+            data += base64.b64decode(''.join(_armor_body(lines or [])))
+            lines = None
+        elif lines is not None:
+            lines.append(line)
+    return data
+
+
+def _armor_body(lines):
+    '''remove the armor headers (before the first empty line) and checksum
+    '''
+    if '' in lines:
+        lines = lines[lines.index('') + 1:]
+    return [line for line in lines if line and not line.startswith('=')]
+
+
+def parse_packets(data):
+    '''parse OpenPGP packets, and yield the tag and body of each.
+
+       Parameters
+       ==========
+       data: the binary packet data
+    '''
+    position = 0
+    while position < len(data):
+        header = data[position]
+        if not header & 0x80:
+            raise ValueError('invalid OpenPGP packet header')
+
+        # New format packets
+        if header & 0x40:
+            tag = header & 0x3f
+            first = data[position + 1]
+            if first < 192:
+                length, position = first, position + 2
+            elif first < 224:
+                length = ((first - 192) << 8) + data[position + 2] + 192
+                position += 3
+            elif first == 255:
+                length = int.from_bytes(data[position + 2:position + 6], 'big')
+                position += 6
+            else:
+                raise ValueError('partial OpenPGP packets are not supported')
+
+        # Old format packets
+        else:
+            tag = (header >> 2) & 0x0f
+            size = [1, 2, 4, None][header & 0x03]
+            if size is None:
+                length, position = len(data) - position - 1, position + 1
+            else:
+                start = position + 1
+                length = int.from_bytes(data[start:start + size], 'big')
+                position = start + size
+
+        yield tag, data[position:position + length]
+        position += length
+
+
+def read_mpi(data, position):
+    '''read a multiprecision integer, and return it and the next position
+    '''
+    bits = int.from_bytes(data[position:position + 2], 'big')
+    end = position + 2 + (bits + 7) // 8
+    return int.from_bytes(data[position + 2:end], 'big'), end
+
+
+################################################################################
+# Keys
+################################################################################
+
+
+def read_keyring(path, now=None):
+    '''read the public keys (and subkeys) from a keyring file, armored
+       (gpg --export --armor) or binary (gpg --export), and return a
+       dictionary by key id (the last 16 hex characters of the fingerprint).
+       A key that is revoked, or expired, is not added. A subkey is only
+       added if it has a binding signature by its primary key that verifies
+       (and, if the binding has key flags, can sign), with a back signature
+       by the subkey, and is not revoked or expired itself.
+
+       Parameters
+       ==========
+       path: the path to the keyring file
+       now: the time (seconds since the epoch) to check expiration at
+    '''
+    with open(path, 'rb') as filey:
+        data = filey.read()
+
+    if data.lstrip().startswith(b'-----BEGIN PGP'):
+        data = dearmor(data.decode('utf-8'))
+
+    if now is None:
+        now = time.time()
+
+    keys = dict()
+    for primary, signatures, subkeys in get_certificates(data):
+        if primary is None or not is_valid(primary, signatures, now):
+            continue
+        keys[primary['keyid']] = primary
+        for subkey, bindings in subkeys:
+            if subkey is not None and subkey['keyid'] not in keys and \
+               is_bound(primary, subkey, bindings, now):
+                keys[subkey['keyid']] = subkey
+    return keys
+
+
+def get_certificates(data):
+    '''group the packets of a keyring by primary key, and yield the key
+       (from parse_public_key), its signatures, as a list of (user id data,
+       body), with None for a direct key signature, and a list of
+       (subkey, signature bodies) for the subkeys.
+
+       Parameters
+       ==========
+       data: the binary packet data
+    '''
+    primary = None
+    for tag, body in parse_packets(data):
+        if tag == TAG_PUBLIC_KEY:
+            if primary is not None:
+                yield primary, signatures, subkeys
+            primary = parse_public_key(body)
+            signatures, subkeys = [], []
+            userid = subkey = None
+
+        elif tag in [TAG_USER_ID, TAG_USER_ATTRIBUTE]:
+            prefix = b'\xb4' if tag == TAG_USER_ID else b'\xd1'
+            userid = prefix + len(body).to_bytes(4, 'big') + body
+            subkey = None
+
+        elif tag == TAG_PUBLIC_SUBKEY and primary is not None:
+            subkey = (parse_public_key(body), [])
+            subkeys.append(subkey)
+
+        # The signatures of a key, user id, or subkey follow it
+        elif tag == TAG_SIGNATURE and primary is not None:
+            if subkey is not None:
+                subkey[1].append(body)
+            else:
+                signatures.append((userid, body))
+
+    if primary is not None:
+        yield primary, signatures, subkeys
+
+
+def is_valid(primary, signatures, now):
+    '''determine if a primary key is valid at a time: not revoked, and
+       not expired by its newest self-signature that verifies (on a user
+       id, or directly on the key).
+
+       Parameters
+       ==========
+       primary: the primary key (from parse_public_key)
+       signatures: a list of (user id data, signature body), see
+                   get_certificates
+       now: the time (seconds since the epoch) to check expiration at
+    '''
+    data = get_key_data(primary)
+    newest = None
+    for userid, body in signatures:
+        try:
+            signature = parse_signature(body)
+        except (ValueError, IndexError):
+            continue
+
+        if signature['type'] == SIGNATURE_KEY_REVOCATION:
+            if is_revocation(primary, signature, data):
+                return False
+
+        elif is_self_signature(primary, signature, userid) and \
+             check_signature(primary, signature, data + (userid or b'')) is True:
+            if newest is None or signature['created'] >= newest['created']:
+                newest = signature
+
+    if newest is not None:
+        primary['expires'] = get_expiration(primary, newest)
+    return not is_expired(primary.get('expires'), now)
+
+
+def is_self_signature(primary, signature, userid):
+    '''determine if a signature is a self-signature of a key, that is, a
+       certification of a user id, or a direct key signature, by the key
+    '''
+    if signature['issuer'] != primary['keyid']:
+        return False
+    if userid is None:
+        return signature['type'] == SIGNATURE_DIRECT_KEY
+    return signature['type'] in SIGNATURE_CERTIFICATIONS
+
+
+def is_bound(primary, subkey, bindings, now):
+    '''determine if the signature packets of a subkey include a valid
+       binding of the subkey to its primary key, for signing: the newest
+       binding that verifies has a back signature by the subkey (an
+       embedded primary key binding, 0x19), neither the binding nor the
+       subkey are expired, and the subkey is not revoked.
+
+       Parameters
+       ==========
+       primary: the primary key (from parse_public_key)
+       subkey: the subkey
+       bindings: the bodies of the signature packets after the subkey
+       now: the time (seconds since the epoch) to check expiration at
+    '''
+    data = get_key_data(primary) + get_key_data(subkey)
+    binding = None
+    for body in bindings:
+        try:
+            signature = parse_signature(body)
+        except (ValueError, IndexError):
+            continue
+
+        if signature['type'] == SIGNATURE_SUBKEY_REVOCATION:
+            if is_revocation(primary, signature, data):
+                return False
+
+        elif signature['type'] == SIGNATURE_SUBKEY_BINDING and \
+             check_signature(primary, signature, data) is True:
+            if binding is None or signature['created'] >= binding['created']:
+                binding = signature
+
+    if binding is None:
+        return False
+    if binding['flags'] is not None and not binding['flags'] & KEY_FLAG_SIGN:
+        return False
+    if is_expired(binding['expires'], now):
+        return False
+
+    subkey['expires'] = get_expiration(subkey, binding)
+    if is_expired(subkey['expires'], now):
+        return False
+
+    # The subkey must sign the binding too, so nobody can claim a subkey
+    try:
+        back = parse_signature(binding['embedded'] or b'')
+    except (ValueError, IndexError):
+        return False
+    return back['type'] == SIGNATURE_PRIMARY_BINDING and \
+           check_signature(subkey, back, data) is True
+
+
+def is_revocation(key, signature, data):
+    '''determine if a revocation signature revokes a key. A revocation by
+       another key (a designated revoker), or one that can't be checked,
+       is taken as valid, and only one that fails to verify is ignored.
+
+       Parameters
+       ==========
+       key: the primary key that signs the revocation
+       signature: the parsed revocation signature
+       data: the signed data (the key, and the subkey for a subkey)
+    '''
+    if signature['issuer'] not in [None, key['keyid']]:
+        return True
+    return check_signature(key, signature, data) is not False
+
+
+def get_expiration(key, signature):
+    '''return the time a key expires at, from the key expiration time of
+       a self-signature (or binding), or None if it doesn't expire.
+    '''
+    if signature['key_expires']:
+        return key['created'] + signature['key_expires']
+
+
+def is_expired(expires, now):
+    '''determine if an expiration time (or None, never) has passed
+    '''
+    return expires is not None and expires <= now
+
+
+def parse_public_key(body):
+    '''parse a version 4 public key packet, and return a dictionary with
+       the fingerprint, key id, creation time, algorithm and (for RSA) the
+       modulus and exponent. The expiration time (expires) is set from the
+       self-signatures, see read_keyring. Older key versions are skipped (None is returned).
+
+       Parameters
+       ==========
+       body: the body of the packet
+    '''
+    if body[0] != 4:
+        return None
+
+    header = b'\x99' + len(body).to_bytes(2, 'big')
+    fingerprint = hashlib.sha1(header + body).hexdigest().upper()
+    key = {'fingerprint': fingerprint,
+           'keyid': fingerprint[-16:],
+           'created': int.from_bytes(body[1:5], 'big'),
+           'expires': None,
+           'algorithm': body[5],
+           'body': body}
+
+    if key['algorithm'] in RSA_ALGORITHMS:
+        key['n'], position = read_mpi(body, 6)
+        key['e'], position = read_mpi(body, position)
+    return key
+
+
+def get_key_data(key):
+    '''get the data of a key as it is hashed by signatures on it
+    '''
+    return b'\x99' + len(key['body']).to_bytes(2, 'big') + key['body']
+
+
+################################################################################
+# Signatures
+################################################################################
+
+
+def parse_cleartext(message):
+    '''parse a clear signed message, and return the signed text (as it is
+       hashed, with canonical line endings) and the signature packet data.
+
+       Parameters
+       ==========
+       message: the clear signed message
+    '''
+    lines = message.splitlines()
+    if SIGNED_MESSAGE not in lines or SIGNATURE_START not in lines:
+        raise ValueError('not a clear signed message')
+
+    # The armor headers (e.g., Hash) end at the first empty line
+    start = lines.index(SIGNED_MESSAGE) + 1
+    while start < len(lines) and lines[start] != '':
+        start += 1
+    end = lines.index(SIGNATURE_START)
+
+    # Remove dash escapes, and trailing whitespace, with CRLF line endings
+    text = []
+    for line in lines[start + 1:end]:
+        if line.startswith('- '):
+            line = line[2:]
+        text.append(line.rstrip(' \t'))
+    text = '\r\n'.join(text).encode('utf-8')
+
+    return text, dearmor('\n'.join(lines[end:]))
+
+
+def parse_signature(body):
+    '''parse a version 4 signature packet, and return a dictionary with
+       the types, the issuer, the creation and expiration times (of the
+       signature, and of the key it binds), key flags, any embedded
+       signature, the hashed data (to add to the hash), the left 16 bits
+       of the hash, and the signature integers.
+
+       Parameters
+       ==========
+       body: the body of the packet
+    '''
+    if body[0] != 4:
+        raise ValueError('signature version %s is not supported' % body[0])
+
+    signature = {'type': body[1],
+                 'algorithm': body[2],
+                 'hash_algorithm': body[3],
+                 'issuer': None,
+                 'created': 0,
+                 'expires': None,
+                 'key_expires': None,
+                 'flags': None,
+                 'embedded': None}
+
+    hashed_length = int.from_bytes(body[4:6], 'big')
+    hashed_end = 6 + hashed_length
+    unhashed_length = int.from_bytes(body[hashed_end:hashed_end + 2], 'big')
+    unhashed_end = hashed_end + 2 + unhashed_length
+
+    # The issuer can be in either (hashed or unhashed) subpackets
+    for subpackets in [body[6:hashed_end], body[hashed_end + 2:unhashed_end]]:
+        for kind, value in parse_subpackets(subpackets):
+            if kind == 16:
+                signature['issuer'] = value.hex().upper()
+            elif kind == 33 and signature['issuer'] is None:
+                signature['issuer'] = value[1:].hex().upper()[-16:]
+
+            # An embedded (back) signature is verified on its own
+            elif kind == 32 and signature['embedded'] is None:
+                signature['embedded'] = value
+
+    # Times and key flags are only trusted from the hashed subpackets
+    expires = None
+    for kind, value in parse_subpackets(body[6:hashed_end]):
+        if kind == 2:
+            signature['created'] = int.from_bytes(value, 'big')
+        elif kind == 3:
+            expires = int.from_bytes(value, 'big')
+        elif kind == 9:
+            signature['key_expires'] = int.from_bytes(value, 'big')
+        elif kind == 27 and value:
+            signature['flags'] = value[0]
+    if expires:
+        signature['expires'] = signature['created'] + expires
+
+    # The hashed part, and the trailer, are added to the text hash
+    hashed = body[:hashed_end]
+    signature['trailer'] = hashed + b'\x04\xff' + len(hashed).to_bytes(4, 'big')
+    signature['left16'] = body[unhashed_end:unhashed_end + 2]
+
+    mpis = []
+    position = unhashed_end + 2
+    while position < len(body):
+        value, position = read_mpi(body, position)
+        mpis.append(value)
+    signature['mpis'] = mpis
+    return signature
+
+
+def parse_subpackets(data):
+    '''parse signature subpackets, and yield the type and value of each.
+    '''
+    position = 0
+    while position < len(data):
+        first = data[position]
+        if first < 192:
+            length, position = first, position + 1
+        elif first < 255:
+            length = ((first - 192) << 8) + data[position + 1] + 192
+            position += 2
+        else:
+            length = int.from_bytes(data[position + 1:position + 5], 'big')
+            position += 5
+        yield data[position] & 0x7f, data[position + 1:position + length]
+        position += length
+
+
+def verify_cleartext(message, keys):
+    '''verify a clear signed message against a dictionary of public keys
+       (from read_keyring). Returns a dictionary with "verified" (True or
+       False), the "keyid" and "fingerprint" of the signer, and the signed
+       "text", or an "error" if the signature can't be checked. Only a
+       signature of a canonical text document (type 0x01) is accepted.
+
+       Parameters
+       ==========
+       message: the clear signed message
+       keys: a dictionary of keys by key id
+    '''
+    result = {'verified': False, 'keyid': None, 'fingerprint': None,
+              'text': None}
+    try:
+        text, data = parse_cleartext(message)
+        packets = [body for tag, body in parse_packets(data)
+                   if tag == TAG_SIGNATURE]
+        if not packets:
+            raise ValueError('no signature packet found')
+        signature = parse_signature(packets[0])
+    except (ValueError, IndexError) as e:
+        result['error'] = str(e)
+        return result
+
+    result['keyid'] = signature['issuer']
+    if signature['type'] != SIGNATURE_TEXT:
+        result['error'] = 'signature type %s is not a text signature' % \
+                          signature['type']
+        return result
+
+    key = keys.get(signature['issuer'])
+    if key is None:
+        result['error'] = 'signing key %s not in keyring' % signature['issuer']
+        return result
+
+    result['fingerprint'] = key['fingerprint']
+    checked = check_signature(key, signature, text)
+    if checked is not True and checked is not False:
+        result['error'] = checked
+        return result
+
+    result['verified'] = checked
+    if checked:
+        result['text'] = text.decode('utf-8')
+    return result
+
+
+def check_signature(key, signature, data):
+    '''check a signature (from parse_signature) of data with a key.
+       Returns True or False, or an error (a string) if the signature
+       can't be checked.
+
+       Parameters
+       ==========
+       key: the public key, from parse_public_key
+       signature: the parsed signature
+       data: the signed data (e.g., canonical text)
+    '''
+    if signature['hash_algorithm'] not in hash_algorithms:
+        return 'hash algorithm %s is not supported' % \
+               signature['hash_algorithm']
+
+    if key['algorithm'] not in RSA_ALGORITHMS or \
+       signature['algorithm'] not in RSA_ALGORITHMS:
+        return 'key algorithm %s is not supported' % key['algorithm']
+
+    name, prefix = hash_algorithms[signature['hash_algorithm']]
+    digest = hashlib.new(name, data + signature['trailer']).digest()
+    if digest[:2] != signature['left16'] or not signature['mpis']:
+        return False
+    return verify_rsa(key, signature['mpis'][0], prefix, digest)
+
+
+def verify_rsa(key, value, prefix, digest):
+    '''verify a PKCS#1 v1.5 RSA signature of a digest.
+
+       Parameters
+       ==========
+       key: the public key, with the modulus (n) and exponent (e)
+       value: the signature, as an integer
+       prefix: the hex DigestInfo prefix for the hash algorithm
+       digest: the digest that was signed
+    '''
+    size = (key['n'].bit_length() + 7) // 8
+    encoded = bytes.fromhex(prefix) + digest
+    if size < len(encoded) + 11:
+        return False
+    padding = b'\xff' * (size - len(encoded) - 3)
+    expected = b'\x00\x01' + padding + b'\x00' + encoded
+    return pow(value, key['e'], key['n']).to_bytes(size, 'big') == expected
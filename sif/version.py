@@ -6,7 +6,7 @@
 # with this file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
-__version__ = "0.0.11"
+__version__ = "0.0.36"
 AUTHOR = 'Vanessa Sochat'
 AUTHOR_EMAIL = 'vsochat@stanford.edu'
 NAME = 'sif'
@@ -17,3 +17,8 @@ LICENSE = "LICENSE"
 
 INSTALL_REQUIRES = (
 )
+
+# Optional, for NumPy arrays of many headers (sif.main.arrays)
+INSTALL_NUMPY = (
+    ('numpy', {'min_version': None}),
+)